@@ -0,0 +1,146 @@
+import argparse
+import keyword
+import os
+import re
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+ROUTER_PATH = os.path.join(ROOT, "web_server", "router.php")
+CONTROLLER_PATH = os.path.join(ROOT, "web_server", "controller.php")
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ordayna_client", "routes.py")
+
+# Python type of the fields checked by each of the controller's validators
+VALIDATOR_TYPES = {
+    "Integer": "int",
+    "Boolean": "bool",
+    "String": "str",
+    "Email": "str",
+    "PhoneNumber": "str",
+    "Time": "str",
+    "Cursor": "str",
+    "FileName": "str",
+    "FileContents": "str",
+}
+# Validators whose second positional argument is $null_allowed
+POSITIONAL_NULL_ALLOWED = {"Email", "PhoneNumber", "FileName", "FileContents"}
+
+
+def loadRoutes():
+    """Returns the (path, method, controller function) triples of the match table in router.php in the order they are declared"""
+    with open(ROUTER_PATH, encoding="utf-8") as router:
+        return re.findall(r"'(/[^']*)' => route\('(\w+)', \[\$controller, '(\w+)'\]\)", router.read())
+
+
+def loadFunctions() -> dict:
+    """Returns the body of every static function of the controller by name"""
+    with open(CONTROLLER_PATH, encoding="utf-8") as controller:
+        source = controller.read()
+    matches = list(re.finditer(r"^    (?:public|private) static function (\w+)\(", source, re.MULTILINE))
+    functions = dict()
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(source)
+        functions[match.group(1)] = source[match.end():end]
+    return functions
+
+
+def parseFields(body: str) -> list:
+    """Returns the (name, type, required) triples of the request fields the function reads in the order it reads them"""
+    fields = dict()
+    if "validateIntezmenyData(" in body:
+        fields["intezmeny_id"] = ("int", True)
+    for validator, name, args in re.findall(r"Controller::validate(\w+)\(@?\$data->(\w+)([^;]*?)\);", body):
+        if validator not in VALIDATOR_TYPES or name in fields:
+            continue
+        optional = "null_allowed: true" in args or validator == "Boolean"
+        if validator in POSITIONAL_NULL_ALLOWED and re.match(r"\s*,\s*true", args):
+            optional = True
+        fields[name] = (VALIDATOR_TYPES[validator], not optional)
+    # Fields that are checked by hand, e.g. the operations of /intezmeny/batch
+    for name in re.findall(r"isset\(\$data->(\w+)\) === false", body):
+        if name not in fields:
+            fields[name] = ("list" if f"is_array($data->{name})" in body else "Any", True)
+    return [(name, type_, required) for name, (type_, required) in fields.items()]
+
+
+def argumentName(field: str) -> str:
+    """Fields that are python keywords (e.g. pass and from) get a trailing underscore as argument names"""
+    return field + "_" if keyword.iskeyword(field) else field
+
+
+def generateMethod(path: str, method: str, function: str, body: str) -> str:
+    fields = parseFields(body)
+    auth = "validateAccessToken(" in body or "validateIntezmenyData(" in body
+    query = "$_GET" in body
+    # The body of a POST with query fields is the raw upload, a GET has none
+    upload = query and method != "GET"
+    binary = "Content-Type: application/octet-stream" in body
+    versioned = "respondVersioned(" in body
+
+    params = ["self"]
+    if upload:
+        # The body is the raw upload and every field is a query parameter
+        params.append("content: bytes")
+    if fields:
+        params.append("*")
+    required = [f"{argumentName(name)}: {type_}" for name, type_, is_required in fields if is_required]
+    optional = [f"{argumentName(name)}: {type_} | None = None" for name, type_, is_required in fields if not is_required]
+    params.extend(required + optional)
+    payload = "{" + ", ".join(f'"{name}": {argumentName(name)}' for name, _, _ in fields) + "}"
+
+    options = []
+    if auth:
+        options.append("auth=True")
+    if upload:
+        options.append("query=True, content=content")
+    elif query:
+        options.append("query=True")
+    if binary:
+        options.append("binary=True")
+    if versioned:
+        options.append("versioned=True")
+    call_args = ", ".join([f'"{method}"', f'"{path}"', payload] + options)
+    return (f"    async def {function}({', '.join(params)}) -> Any:\n"
+            f'        """{method} {path}"""\n'
+            f"        return await self.call({call_args})\n")
+
+
+def generate() -> str:
+    functions = loadFunctions()
+    methods = []
+    for path, method, function in loadRoutes():
+        if function not in functions:
+            raise RuntimeError(f"{path} is routed to Controller::{function} which does not exist")
+        methods.append(generateMethod(path, method, function, functions[function]))
+    return ("# Generated by client/generate_routes.py from web_server/router.php and web_server/controller.php, do not edit\n"
+            "# Regenerate it after changing a route or the fields an endpoint reads: python3 client/generate_routes.py\n"
+            "\n"
+            "from typing import Any\n"
+            "\n"
+            "\n"
+            "class Routes:\n"
+            '    """One method per route of the web server, the fields are the ones the endpoint reads, None fields are left out"""\n'
+            "\n"
+            "    async def call(self, method: str, path: str, payload: dict, auth: bool = False, query: bool = False, content: bytes | None = None, binary: bool = False, versioned: bool = False) -> Any:\n"
+            "        raise NotImplementedError\n"
+            "\n"
+            + "\n".join(methods))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the endpoint methods of the python client from the web server's route table")
+    parser.add_argument("--check", action="store_true", help="only check that the generated file is up to date, exits with 1 if it is not")
+    args = parser.parse_args()
+
+    generated = generate()
+    if args.check:
+        with open(OUTPUT_PATH, encoding="utf-8") as routes:
+            if routes.read() != generated:
+                print(f"{OUTPUT_PATH} is out of date, run python3 client/generate_routes.py", file=sys.stderr)
+                sys.exit(1)
+        return
+    with open(OUTPUT_PATH, "w", encoding="utf-8", newline="\n") as routes:
+        routes.write(generated)
+
+
+if __name__ == "__main__":
+    main()
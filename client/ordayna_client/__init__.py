@@ -0,0 +1,3 @@
+from .client import URL, ApiError, Client, gatherLimited
+
+__all__ = ["URL", "ApiError", "Client", "gatherLimited"]
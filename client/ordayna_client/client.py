@@ -0,0 +1,192 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Awaitable, Iterable
+
+import httpx
+
+from .routes import Routes
+
+URL = "https://127.0.0.1:443"
+# The access token is renewed this many seconds before it expires so a request never goes out with an expired one
+RENEW_MARGIN = 60
+# The refresh token is rotated once this part of its lifetime has passed, like the website does on every page load
+ROTATE_AFTER = 0.5
+MAX_AGE = re.compile(r"^(AccessToken|RefreshToken)=([^;]*).*?;\s*Max-Age=(-?\d+)", re.IGNORECASE)
+
+
+class ApiError(Exception):
+    """The web server answered with an error status, body is the response's text (e.g. "Unauthorised")"""
+
+    def __init__(self, method: str, path: str, status: int, body: str):
+        super().__init__(f"{method} {path} returned {status}: {body}")
+        self.method = method
+        self.path = path
+        self.status = status
+        self.body = body
+
+
+def encode(value: Any) -> Any:
+    """The web server only accepts integers as numeric strings, booleans and everything else are sent as they are"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    return value
+
+
+async def gatherLimited(limit: int, aws: Iterable[Awaitable], return_exceptions: bool = False) -> list:
+    """Like asyncio.gather but at most limit of the awaitables run at once, the results are in the order of aws"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*(run(aw) for aw in aws), return_exceptions=return_exceptions)
+
+
+class Client(Routes):
+    """
+    Async client of the web server, one method per route (see routes.py) on a pooled keep-alive connection
+    The tokens are kept in the client's cookie jar like the browser keeps them, after login() the access token is renewed
+    before it expires and the refresh token is rotated halfway through its lifetime without the caller doing anything
+    The responses of the intezmeny/get/ endpoints are kept and revalidated with their ETag like fetchVersioned does
+    """
+
+    def __init__(self, url: str = URL, *, max_connections: int = 10, timeout: float = 30, verify: bool = False):
+        self.url = url.rstrip("/")
+        self.max_connections = max_connections
+        self.http = httpx.AsyncClient(
+            base_url=self.url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            verify=verify,
+        )
+        # Renewals are serialised, two requests rotating the same refresh token would revoke the whole token family
+        self.token_lock = asyncio.Lock()
+        self.access_expires = 0.0
+        self.refresh_expires = 0.0
+        self.refresh_rotate_at = 0.0
+        self.versioned = dict()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def login(self, email: str, password: str):
+        await self.getRefreshToken(email=email, pass_=password)
+        await self.renewAccessToken()
+
+    def loggedIn(self) -> bool:
+        return time.monotonic() < self.refresh_expires
+
+    async def renewAccessToken(self):
+        async with self.token_lock:
+            await self.renewTokens()
+
+    async def ensureAccessToken(self):
+        if time.monotonic() < self.access_expires - RENEW_MARGIN:
+            return
+        async with self.token_lock:
+            # Another request may have renewed it while this one waited for the lock
+            if time.monotonic() < self.access_expires - RENEW_MARGIN:
+                return
+            await self.renewTokens()
+
+    async def renewTokens(self):
+        # Without a refresh token the request goes out as it is and the server answers it
+        if self.loggedIn() is False:
+            return
+        if time.monotonic() >= self.refresh_rotate_at:
+            await self.refreshRefreshToken()
+        await self.getAccessToken()
+
+    async def gather(self, aws: Iterable[Awaitable], limit: int | None = None, return_exceptions: bool = False) -> list:
+        """Runs the calls concurrently, by default at most as many at once as the client has connections"""
+        return await gatherLimited(limit or self.max_connections, aws, return_exceptions)
+
+    async def call(self, method: str, path: str, payload: dict, auth: bool = False, query: bool = False, content: bytes | None = None, binary: bool = False, versioned: bool = False) -> Any:
+        return (await self.send(method, path, payload, auth, query, content, binary, versioned))[0]
+
+    async def pages(self, path: str, **fields) -> AsyncIterator[list]:
+        """Yields the pages of a paged endpoint (e.g. /intezmeny/get/homeworks) by following their X-Next-Cursor header"""
+        cursor = None
+        while True:
+            page, cursor = await self.send("POST", path, {**fields, "cursor": cursor}, auth=True, versioned=True)
+            yield page
+            if cursor is None:
+                return
+
+    async def waitForJob(self, job_id: int, interval: float = 1, timeout: float | None = None) -> dict:
+        """Polls a job queued by an endpoint that answered 202 (e.g. deleteIntezmeny) until it's done or has failed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await self.getJob(job_id=job_id)
+            if job["status"] in ("done", "failed"):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} is still {job['status']}")
+            await asyncio.sleep(interval)
+
+    async def send(self, method: str, path: str, payload: dict, auth: bool = False, query: bool = False, content: bytes | None = None, binary: bool = False, versioned: bool = False) -> tuple[Any, str | None]:
+        """Returns the response's body and the cursor of the next page if the response is a page that is not the last one"""
+        if auth:
+            await self.ensureAccessToken()
+        fields = encode(payload)
+
+        headers = dict()
+        key = None
+        if versioned:
+            key = path + ":" + json.dumps(fields, sort_keys=True)
+            if key in self.versioned:
+                headers["If-None-Match"] = self.versioned[key][0]
+        if query:
+            response = await self.http.request(method, path, params=fields, content=content, headers=headers)
+        elif fields:
+            response = await self.http.request(method, path, json=fields, headers=headers)
+        else:
+            response = await self.http.request(method, path, headers=headers)
+        self.rememberTokens(response)
+
+        if response.status_code == 304 and key in self.versioned:
+            return self.versioned[key][1:]
+        if response.status_code >= 400:
+            raise ApiError(method, path, response.status_code, response.text)
+        if binary:
+            return response.content, None
+        if len(response.content) == 0:
+            return None, None
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            body = response.json()
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if key is not None and "ETag" in response.headers:
+                self.versioned[key] = (response.headers["ETag"], body, next_cursor)
+            return body, next_cursor
+        return response.text, None
+
+    def rememberTokens(self, response: httpx.Response):
+        """Tracks when the tokens the response set expire, the cookies themselves are kept by the cookie jar"""
+        now = time.monotonic()
+        for cookie in response.headers.get_list("Set-Cookie"):
+            match = MAX_AGE.match(cookie)
+            if match is None:
+                continue
+            name, value, max_age = match.group(1), match.group(2), int(match.group(3))
+            # Logging out, deleting the user and changing the password clear both cookies
+            expires = now + max_age if value != "" and max_age > 0 else 0.0
+            if name == "AccessToken":
+                self.access_expires = expires
+            else:
+                self.refresh_expires = expires
+                self.refresh_rotate_at = now + max_age * ROTATE_AFTER if expires > 0 else 0.0
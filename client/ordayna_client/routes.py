@@ -0,0 +1,271 @@
+# Generated by client/generate_routes.py from web_server/router.php and web_server/controller.php, do not edit
+# Regenerate it after changing a route or the fields an endpoint reads: python3 client/generate_routes.py
+
+from typing import Any
+
+
+class Routes:
+    """One method per route of the web server, the fields are the ones the endpoint reads, None fields are left out"""
+
+    async def call(self, method: str, path: str, payload: dict, auth: bool = False, query: bool = False, content: bytes | None = None, binary: bool = False, versioned: bool = False) -> Any:
+        raise NotImplementedError
+
+    async def getRefreshToken(self, *, email: str, pass_: str) -> Any:
+        """POST /token/get_refresh_token"""
+        return await self.call("POST", "/token/get_refresh_token", {"email": email, "pass": pass_})
+
+    async def refreshRefreshToken(self) -> Any:
+        """GET /token/refresh_refresh_token"""
+        return await self.call("GET", "/token/refresh_refresh_token", {})
+
+    async def getAccessToken(self) -> Any:
+        """GET /token/get_access_token"""
+        return await self.call("GET", "/token/get_access_token", {})
+
+    async def createUser(self, *, disp_name: str, email: str, pass_: str, phone_number: str | None = None) -> Any:
+        """POST /user/create"""
+        return await self.call("POST", "/user/create", {"disp_name": disp_name, "email": email, "pass": pass_, "phone_number": phone_number})
+
+    async def getProfile(self) -> Any:
+        """GET /user/profile"""
+        return await self.call("GET", "/user/profile", {}, auth=True)
+
+    async def getRole(self, *, intezmeny_id: int) -> Any:
+        """POST /user/get_role"""
+        return await self.call("POST", "/user/get_role", {"intezmeny_id": intezmeny_id}, auth=True)
+
+    async def logout(self) -> Any:
+        """GET /user/logout"""
+        return await self.call("GET", "/user/logout", {}, auth=True)
+
+    async def deleteUser(self, *, pass_: str) -> Any:
+        """DELETE /user/delete"""
+        return await self.call("DELETE", "/user/delete", {"pass": pass_}, auth=True)
+
+    async def changeDisplayName(self, *, new_disp_name: str) -> Any:
+        """POST /user/change/display_name"""
+        return await self.call("POST", "/user/change/display_name", {"new_disp_name": new_disp_name}, auth=True)
+
+    async def changePhoneNumber(self, *, new_phone_number: str | None = None) -> Any:
+        """POST /user/change/phone_number"""
+        return await self.call("POST", "/user/change/phone_number", {"new_phone_number": new_phone_number}, auth=True)
+
+    async def changePassword(self, *, pass_: str, new_pass: str) -> Any:
+        """POST /user/change/password"""
+        return await self.call("POST", "/user/change/password", {"pass": pass_, "new_pass": new_pass}, auth=True)
+
+    async def createIntezmeny(self, *, intezmeny_name: str) -> Any:
+        """POST /create_intezmeny"""
+        return await self.call("POST", "/create_intezmeny", {"intezmeny_name": intezmeny_name}, auth=True)
+
+    async def deleteIntezmeny(self, *, intezmeny_id: int) -> Any:
+        """DELETE /delete_intezmeny"""
+        return await self.call("DELETE", "/delete_intezmeny", {"intezmeny_id": intezmeny_id}, auth=True)
+
+    async def getIntezmenys(self) -> Any:
+        """GET /get_intezmenys"""
+        return await self.call("GET", "/get_intezmenys", {}, auth=True)
+
+    async def getJob(self, *, job_id: int) -> Any:
+        """POST /get_job"""
+        return await self.call("POST", "/get_job", {"job_id": job_id}, auth=True)
+
+    async def inviteToIntezmeny(self, *, intezmeny_id: int, email: str) -> Any:
+        """POST /intezmeny/user/invite"""
+        return await self.call("POST", "/intezmeny/user/invite", {"intezmeny_id": intezmeny_id, "email": email}, auth=True)
+
+    async def fireUser(self, *, intezmeny_id: int, uid: int) -> Any:
+        """POST /intezmeny/user/fire"""
+        return await self.call("POST", "/intezmeny/user/fire", {"intezmeny_id": intezmeny_id, "uid": uid}, auth=True)
+
+    async def acceptInviteToIntezmeny(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/user/accept_invite"""
+        return await self.call("POST", "/intezmeny/user/accept_invite", {"intezmeny_id": intezmeny_id}, auth=True)
+
+    async def getInvites(self) -> Any:
+        """GET /intezmeny/user/get_invites"""
+        return await self.call("GET", "/intezmeny/user/get_invites", {}, auth=True)
+
+    async def getAllIntezmenyUsers(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/user/get_all"""
+        return await self.call("POST", "/intezmeny/user/get_all", {"intezmeny_id": intezmeny_id}, auth=True)
+
+    async def createClass(self, *, intezmeny_id: int, name: str, headcount: int) -> Any:
+        """POST /intezmeny/create/class"""
+        return await self.call("POST", "/intezmeny/create/class", {"intezmeny_id": intezmeny_id, "name": name, "headcount": headcount}, auth=True)
+
+    async def createLesson(self, *, intezmeny_id: int, name: str) -> Any:
+        """POST /intezmeny/create/lesson"""
+        return await self.call("POST", "/intezmeny/create/lesson", {"intezmeny_id": intezmeny_id, "name": name}, auth=True)
+
+    async def createGroup(self, *, intezmeny_id: int, name: str, headcount: int, class_id: int | None = None) -> Any:
+        """POST /intezmeny/create/group"""
+        return await self.call("POST", "/intezmeny/create/group", {"intezmeny_id": intezmeny_id, "name": name, "headcount": headcount, "class_id": class_id}, auth=True)
+
+    async def createGroupMember(self, *, intezmeny_id: int, group_id: int, member_uid: int) -> Any:
+        """POST /intezmeny/create/group_member"""
+        return await self.call("POST", "/intezmeny/create/group_member", {"intezmeny_id": intezmeny_id, "group_id": group_id, "member_uid": member_uid}, auth=True)
+
+    async def createRoom(self, *, intezmeny_id: int, name: str, space: int, type: str | None = None) -> Any:
+        """POST /intezmeny/create/room"""
+        return await self.call("POST", "/intezmeny/create/room", {"intezmeny_id": intezmeny_id, "name": name, "type": type, "space": space}, auth=True)
+
+    async def createTeacher(self, *, intezmeny_id: int, name: str, job: str, teacher_uid: int | None = None) -> Any:
+        """POST /intezmeny/create/teacher"""
+        return await self.call("POST", "/intezmeny/create/teacher", {"intezmeny_id": intezmeny_id, "name": name, "job": job, "teacher_uid": teacher_uid}, auth=True)
+
+    async def createTimetableElement(self, *, intezmeny_id: int, start: str, duration: str, day: int, from_: str, until: str, group_id: int | None = None, lesson_id: int | None = None, teacher_id: int | None = None, room_id: int | None = None, allow_clash: bool | None = None) -> Any:
+        """POST /intezmeny/create/timetable_element"""
+        return await self.call("POST", "/intezmeny/create/timetable_element", {"intezmeny_id": intezmeny_id, "start": start, "duration": duration, "day": day, "from": from_, "until": until, "group_id": group_id, "lesson_id": lesson_id, "teacher_id": teacher_id, "room_id": room_id, "allow_clash": allow_clash}, auth=True)
+
+    async def createHomework(self, *, intezmeny_id: int, description: str, due: str, group_id: int, lesson_id: int, teacher_id: int) -> Any:
+        """POST /intezmeny/create/homework"""
+        return await self.call("POST", "/intezmeny/create/homework", {"intezmeny_id": intezmeny_id, "description": description, "due": due, "group_id": group_id, "lesson_id": lesson_id, "teacher_id": teacher_id}, auth=True)
+
+    async def createAttachment(self, *, intezmeny_id: int, homework_id: int, file_name: str, file_contents: str) -> Any:
+        """POST /intezmeny/create/attachment"""
+        return await self.call("POST", "/intezmeny/create/attachment", {"intezmeny_id": intezmeny_id, "homework_id": homework_id, "file_name": file_name, "file_contents": file_contents}, auth=True)
+
+    async def uploadAttachment(self, content: bytes, *, intezmeny_id: int, homework_id: int, file_name: str, sha256: str | None = None) -> Any:
+        """POST /intezmeny/upload/attachment"""
+        return await self.call("POST", "/intezmeny/upload/attachment", {"intezmeny_id": intezmeny_id, "homework_id": homework_id, "file_name": file_name, "sha256": sha256}, auth=True, query=True, content=content)
+
+    async def deleteClass(self, *, intezmeny_id: int, class_id: int) -> Any:
+        """DELETE /intezmeny/delete/class"""
+        return await self.call("DELETE", "/intezmeny/delete/class", {"intezmeny_id": intezmeny_id, "class_id": class_id}, auth=True)
+
+    async def deleteLesson(self, *, intezmeny_id: int, lesson_id: int) -> Any:
+        """DELETE /intezmeny/delete/lesson"""
+        return await self.call("DELETE", "/intezmeny/delete/lesson", {"intezmeny_id": intezmeny_id, "lesson_id": lesson_id}, auth=True)
+
+    async def deleteGroup(self, *, intezmeny_id: int, group_id: int) -> Any:
+        """DELETE /intezmeny/delete/group"""
+        return await self.call("DELETE", "/intezmeny/delete/group", {"intezmeny_id": intezmeny_id, "group_id": group_id}, auth=True)
+
+    async def deleteGroupMember(self, *, intezmeny_id: int, group_id: int, member_uid: int) -> Any:
+        """DELETE /intezmeny/delete/group_member"""
+        return await self.call("DELETE", "/intezmeny/delete/group_member", {"intezmeny_id": intezmeny_id, "group_id": group_id, "member_uid": member_uid}, auth=True)
+
+    async def deleteRoom(self, *, intezmeny_id: int, room_id: int) -> Any:
+        """DELETE /intezmeny/delete/room"""
+        return await self.call("DELETE", "/intezmeny/delete/room", {"intezmeny_id": intezmeny_id, "room_id": room_id}, auth=True)
+
+    async def deleteTeacher(self, *, intezmeny_id: int, teacher_id: int) -> Any:
+        """DELETE /intezmeny/delete/teacher"""
+        return await self.call("DELETE", "/intezmeny/delete/teacher", {"intezmeny_id": intezmeny_id, "teacher_id": teacher_id}, auth=True)
+
+    async def deleteTimetableElement(self, *, intezmeny_id: int, timetable_element_id: int) -> Any:
+        """DELETE /intezmeny/delete/timetable_element"""
+        return await self.call("DELETE", "/intezmeny/delete/timetable_element", {"intezmeny_id": intezmeny_id, "timetable_element_id": timetable_element_id}, auth=True)
+
+    async def deleteHomework(self, *, intezmeny_id: int, homework_id: int) -> Any:
+        """DELETE /intezmeny/delete/homework"""
+        return await self.call("DELETE", "/intezmeny/delete/homework", {"intezmeny_id": intezmeny_id, "homework_id": homework_id}, auth=True)
+
+    async def deleteAttachment(self, *, intezmeny_id: int, attachment_id: int) -> Any:
+        """DELETE /intezmeny/delete/attachment"""
+        return await self.call("DELETE", "/intezmeny/delete/attachment", {"intezmeny_id": intezmeny_id, "attachment_id": attachment_id}, auth=True)
+
+    async def updateClass(self, *, intezmeny_id: int, class_id: int, name: str) -> Any:
+        """POST /intezmeny/update/class"""
+        return await self.call("POST", "/intezmeny/update/class", {"intezmeny_id": intezmeny_id, "class_id": class_id, "name": name}, auth=True)
+
+    async def updateLesson(self, *, intezmeny_id: int, lesson_id: int, name: str) -> Any:
+        """POST /intezmeny/update/lesson"""
+        return await self.call("POST", "/intezmeny/update/lesson", {"intezmeny_id": intezmeny_id, "lesson_id": lesson_id, "name": name}, auth=True)
+
+    async def updateGroup(self, *, intezmeny_id: int, group_id: int, name: str, headcount: int, class_id: int | None = None) -> Any:
+        """POST /intezmeny/update/group"""
+        return await self.call("POST", "/intezmeny/update/group", {"intezmeny_id": intezmeny_id, "group_id": group_id, "name": name, "headcount": headcount, "class_id": class_id}, auth=True)
+
+    async def updateRoom(self, *, intezmeny_id: int, room_id: int, name: str, space: int, type: str | None = None) -> Any:
+        """POST /intezmeny/update/room"""
+        return await self.call("POST", "/intezmeny/update/room", {"intezmeny_id": intezmeny_id, "room_id": room_id, "name": name, "type": type, "space": space}, auth=True)
+
+    async def updateTeacher(self, *, intezmeny_id: int, teacher_id: int, name: str, job: str, teacher_uid: int | None = None) -> Any:
+        """POST /intezmeny/update/teacher"""
+        return await self.call("POST", "/intezmeny/update/teacher", {"intezmeny_id": intezmeny_id, "teacher_id": teacher_id, "name": name, "job": job, "teacher_uid": teacher_uid}, auth=True)
+
+    async def updateTimetableElement(self, *, intezmeny_id: int, element_id: int, start: str, duration: str, day: int, from_: str, until: str, group_id: int | None = None, lesson_id: int | None = None, teacher_id: int | None = None, room_id: int | None = None, allow_clash: bool | None = None) -> Any:
+        """POST /intezmeny/update/timetable_element"""
+        return await self.call("POST", "/intezmeny/update/timetable_element", {"intezmeny_id": intezmeny_id, "element_id": element_id, "start": start, "duration": duration, "day": day, "from": from_, "until": until, "group_id": group_id, "lesson_id": lesson_id, "teacher_id": teacher_id, "room_id": room_id, "allow_clash": allow_clash}, auth=True)
+
+    async def updateHomework(self, *, intezmeny_id: int, homework_id: int, description: str, due: str, group_id: int, lesson_id: int, teacher_id: int) -> Any:
+        """POST /intezmeny/update/homework"""
+        return await self.call("POST", "/intezmeny/update/homework", {"intezmeny_id": intezmeny_id, "homework_id": homework_id, "description": description, "due": due, "group_id": group_id, "lesson_id": lesson_id, "teacher_id": teacher_id}, auth=True)
+
+    async def batch(self, *, intezmeny_id: int, operations: list) -> Any:
+        """POST /intezmeny/batch"""
+        return await self.call("POST", "/intezmeny/batch", {"intezmeny_id": intezmeny_id, "operations": operations}, auth=True)
+
+    async def getClasses(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/classes"""
+        return await self.call("POST", "/intezmeny/get/classes", {"intezmeny_id": intezmeny_id}, auth=True, versioned=True)
+
+    async def getLessons(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/lessons"""
+        return await self.call("POST", "/intezmeny/get/lessons", {"intezmeny_id": intezmeny_id}, auth=True, versioned=True)
+
+    async def getGroups(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/groups"""
+        return await self.call("POST", "/intezmeny/get/groups", {"intezmeny_id": intezmeny_id}, auth=True, versioned=True)
+
+    async def getGroupMembers(self, *, intezmeny_id: int, group_id: int) -> Any:
+        """POST /intezmeny/get/group_members"""
+        return await self.call("POST", "/intezmeny/get/group_members", {"intezmeny_id": intezmeny_id, "group_id": group_id}, auth=True, versioned=True)
+
+    async def getRooms(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/rooms"""
+        return await self.call("POST", "/intezmeny/get/rooms", {"intezmeny_id": intezmeny_id}, auth=True, versioned=True)
+
+    async def getTeachers(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/teachers"""
+        return await self.call("POST", "/intezmeny/get/teachers", {"intezmeny_id": intezmeny_id}, auth=True, versioned=True)
+
+    async def getTimetable(self, *, intezmeny_id: int, from_: str | None = None, until: str | None = None, group_id: int | None = None, teacher_id: int | None = None, room_id: int | None = None, day: int | None = None) -> Any:
+        """POST /intezmeny/get/timetable"""
+        return await self.call("POST", "/intezmeny/get/timetable", {"intezmeny_id": intezmeny_id, "from": from_, "until": until, "group_id": group_id, "teacher_id": teacher_id, "room_id": room_id, "day": day}, auth=True, versioned=True)
+
+    async def getTimetableClashes(self, *, intezmeny_id: int) -> Any:
+        """POST /intezmeny/get/timetable_clashes"""
+        return await self.call("POST", "/intezmeny/get/timetable_clashes", {"intezmeny_id": intezmeny_id}, auth=True)
+
+    async def getOccurrences(self, *, intezmeny_id: int, from_: str, until: str, group_id: int | None = None, teacher_id: int | None = None, room_id: int | None = None, mine: bool | None = None) -> Any:
+        """POST /intezmeny/get/occurrences"""
+        return await self.call("POST", "/intezmeny/get/occurrences", {"intezmeny_id": intezmeny_id, "from": from_, "until": until, "group_id": group_id, "teacher_id": teacher_id, "room_id": room_id, "mine": mine}, auth=True, versioned=True)
+
+    async def getCalendarFeed(self, *, intezmeny_id: int, group_id: int | None = None, teacher_id: int | None = None, room_id: int | None = None) -> Any:
+        """POST /intezmeny/get/calendar_feed"""
+        return await self.call("POST", "/intezmeny/get/calendar_feed", {"intezmeny_id": intezmeny_id, "group_id": group_id, "teacher_id": teacher_id, "room_id": room_id}, auth=True)
+
+    async def getHomeworks(self, *, intezmeny_id: int, limit: int | None = None, cursor: str | None = None, group_id: int | None = None, lesson_id: int | None = None, teacher_id: int | None = None, due_from: str | None = None, due_until: str | None = None) -> Any:
+        """POST /intezmeny/get/homeworks"""
+        return await self.call("POST", "/intezmeny/get/homeworks", {"intezmeny_id": intezmeny_id, "limit": limit, "cursor": cursor, "group_id": group_id, "lesson_id": lesson_id, "teacher_id": teacher_id, "due_from": due_from, "due_until": due_until}, auth=True, versioned=True)
+
+    async def getMyHomeworks(self, *, intezmeny_id: int, limit: int | None = None, cursor: str | None = None) -> Any:
+        """POST /intezmeny/get/my_homeworks"""
+        return await self.call("POST", "/intezmeny/get/my_homeworks", {"intezmeny_id": intezmeny_id, "limit": limit, "cursor": cursor}, auth=True, versioned=True)
+
+    async def getMyTimetable(self, *, intezmeny_id: int, from_: str | None = None, until: str | None = None, day: int | None = None) -> Any:
+        """POST /intezmeny/get/my_timetable"""
+        return await self.call("POST", "/intezmeny/get/my_timetable", {"intezmeny_id": intezmeny_id, "from": from_, "until": until, "day": day}, auth=True, versioned=True)
+
+    async def getSnapshot(self, *, intezmeny_id: int, collections: list, stream: bool | None = None) -> Any:
+        """POST /intezmeny/get/snapshot"""
+        return await self.call("POST", "/intezmeny/get/snapshot", {"intezmeny_id": intezmeny_id, "stream": stream, "collections": collections}, auth=True)
+
+    async def getAttachment(self, *, intezmeny_id: int, attachment_id: int) -> Any:
+        """POST /intezmeny/get/attachment"""
+        return await self.call("POST", "/intezmeny/get/attachment", {"intezmeny_id": intezmeny_id, "attachment_id": attachment_id}, auth=True, binary=True)
+
+    async def getCalendar(self, *, feed: str) -> Any:
+        """GET /calendar.ics"""
+        return await self.call("GET", "/calendar.ics", {"feed": feed}, query=True)
+
+    async def getStats(self) -> Any:
+        """GET /stats"""
+        return await self.call("GET", "/stats", {})
+
+    async def getMetrics(self) -> Any:
+        """GET /metrics"""
+        return await self.call("GET", "/metrics", {})
@@ -3,6 +3,7 @@ echo Make sure that docker desktop is installed
 
 cd ../web_server
 docker build . -t ordayna-backend
+docker build . -f Dockerfile.fpm -t ordayna-backend-fpm
 del config.php
 echo ^<?php >> config.php
 echo: >> config.php
@@ -15,6 +16,7 @@ echo     public static ?string $database_address = "database:3306"; >> config.ph
 echo     public static ?string $database_username = "ordayna_main"; >> config.php
 echo     public static ?string $database_password = "very secret"; >> config.php
 echo     public static ?string $database_name = null; >> config.php
+echo     public static bool $database_persistent = true; >> config.php
 echo: >> config.php
 echo     public static string $jwt_secret = "very secretvery secretvery secret"; >> config.php
 echo } >> config.php
@@ -5,6 +5,7 @@ sudo apt-get --update install docker\* -y
 
 cd ../web_server
 sudo docker build . -t ordayna-backend
+sudo docker build . -f Dockerfile.fpm -t ordayna-backend-fpm
 rm -f config.php
 printf "<?php\n\n" | tee -a config.php > /dev/null
 printf "declare(strict_types=1);\n\n" | tee -a config.php > /dev/null
@@ -14,7 +15,8 @@ printf "{\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_address = \"database:3306\";\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_username = \"ordayna_main\";\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_password = \"very secret\";\n" | tee -a config.php > /dev/null
-printf "    public static ?string \$database_name = null;\n\n" | tee -a config.php > /dev/null
+printf "    public static ?string \$database_name = null;\n" | tee -a config.php > /dev/null
+printf "    public static bool \$database_persistent = true;\n\n" | tee -a config.php > /dev/null
 printf "    public static string \$jwt_secret = \"very secretvery secretvery secret\";\n" | tee -a config.php > /dev/null
 printf "}\n" | tee -a config.php > /dev/null
 cd ../config
@@ -2,7 +2,7 @@
 set -euo pipefail
 
 sudo apt-get --update full-upgrade -y
-sudo apt-get install mariadb-server nginx php-fpm php-mysql 7zip composer -y
+sudo apt-get install mariadb-server nginx php-fpm php-mysql php-apcu 7zip composer -y
 
 db_password=$(openssl rand -base64 48)
 
@@ -15,6 +15,8 @@ curl https://ssl-config.mozilla.org/ffdhe2048.txt > ../dhparam
 sudo rm -rf /etc/nginx/
 sudo mkdir /etc/nginx
 sudo cp -r ./nginx_config/* /etc/nginx/
+# OPcache and preloading of the web server, see php/ordayna.ini
+sudo cp ./php/ordayna.ini /etc/php/8.4/fpm/conf.d/90-ordayna.ini
 # Generate the random secret used for jwt hashing
 jwt_secret=$(openssl rand -base64 32)
 # Generate the certificate and secret used for https
@@ -26,6 +28,8 @@ sudo systemctl restart nginx php8.4-fpm
 
 cd ../web_server
 composer require lcobucci/jwt lcobucci/clock ramsey/uuid
+# The class map lets preload.php find the library classes
+composer dump-autoload --optimize
 rm -f config.php
 printf "<?php\n\n" | tee -a config.php > /dev/null
 printf "declare(strict_types=1);\n\n" | tee -a config.php > /dev/null
@@ -35,15 +39,19 @@ printf "{\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_address = \"localhost\";\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_username = \"ordayna_main\";\n" | tee -a config.php > /dev/null
 printf "    public static ?string \$database_password = \"%s\";\n" "$db_password" | tee -a config.php > /dev/null
-printf "    public static ?string \$database_name = null;\n\n" | tee -a config.php > /dev/null
+printf "    public static ?string \$database_name = null;\n" | tee -a config.php > /dev/null
+printf "    public static bool \$database_persistent = true;\n\n" | tee -a config.php > /dev/null
 printf "    public static string \$jwt_secret = \"%s\";\n" "$jwt_secret" | tee -a config.php > /dev/null
 printf "}\n" | tee -a config.php > /dev/null
 cd ../config
 
-# This is intentionally not recursive
-sudo rm -f ../web_server/error_logs.txt
-touch ../web_server/error_logs.txt
-sudo chown -R www-data:www-data ../web_server/error_logs.txt
+# php-fpm preloads config.php and the libraries so it is restarted once they exist
+sudo systemctl restart php8.4-fpm
+
+# The json lines logs (see README.md), the web server has to be able to write them
+sudo rm -rf ../web_server/logs
+mkdir ../web_server/logs
+sudo chown -R www-data:www-data ../web_server/logs
 
 sudo rm -rf ../web_server/user_data
 mkdir ../web_server/user_data
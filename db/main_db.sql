@@ -10,7 +10,19 @@ USE ordayna_main_db;
 -- If you delete an intezmeny delete the intezmeny's id from this table
 CREATE OR REPLACE TABLE intezmeny ( 
 	id INT UNSIGNED NOT NULL PRIMARY KEY AUTO_INCREMENT,
-	name VARCHAR(200) NOT NULL
+	name VARCHAR(200) NOT NULL,
+	-- Bumped by every procedure of the intezmeny's schema that changes its data, see bumpDataVersion
+	data_version BIGINT UNSIGNED NOT NULL DEFAULT 0
+ );
+
+-- Empty intezmenys whose schema is already created, claimed by /create_intezmeny (see fill_intezmeny_pool.php)
+-- template_version is NULL until the schema is complete
+CREATE OR REPLACE TABLE intezmeny_pool (
+	intezmeny_id INT UNSIGNED NOT NULL PRIMARY KEY,
+	template_version CHAR(16),
+	created DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	CONSTRAINT FOREIGN KEY ( intezmeny_id ) REFERENCES intezmeny( id ) ON DELETE CASCADE ON UPDATE CASCADE,
+	INDEX (template_version, intezmeny_id)
  );
 
 CREATE OR REPLACE TABLE users ( 
@@ -18,7 +30,9 @@ CREATE OR REPLACE TABLE users (
 	display_name VARCHAR(200) NOT NULL,
 	email VARCHAR(254) UNIQUE NOT NULL,
 	phone_number VARCHAR(15),
-	password_hash VARCHAR(255) NOT NULL
+	password_hash VARCHAR(255) NOT NULL,
+	-- Tokens are only accepted if they were issued in the current generation, bumped to revoke every token of the user
+	token_generation INT UNSIGNED NOT NULL DEFAULT 0
  );
 
 CREATE OR REPLACE TABLE intezmeny_users (
@@ -31,16 +45,70 @@ CREATE OR REPLACE TABLE intezmeny_users (
 	PRIMARY KEY (intezmeny_id, users_id)
  );
 
-CREATE OR REPLACE TABLE tokens (
-	id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
-	uid INT UNSIGNED NOT NULL,
-	token_uuid UUID NOT NULL,
+-- Attachment contents stored once by their sha256 in web_server/user_data/blobs/ (see web_server/models/blob.php)
+-- ref_count is the number of attachments of every intezmeny with these contents, kept by the intezmeny procedures and
+-- recounted by web_server/check_blobs.php, blobs are only removed once they have been unreferenced for a while
+CREATE OR REPLACE TABLE blobs (
+	sha256 CHAR(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL PRIMARY KEY,
+	size BIGINT UNSIGNED NOT NULL,
+	ref_count INT UNSIGNED NOT NULL,
+	-- When a reference to the blob was last dropped
+	released DATETIME,
+	INDEX (ref_count, released)
+ );
+
+-- Slow work taken out of the requests (e.g. dropping a deleted intezmeny's schema), run by web_server/job_worker.php
+-- run_after is when a queued job may run next and for a running job when its worker is taken to have died
+-- uid is the user who queued the job, only they can see its status
+CREATE OR REPLACE TABLE jobs (
+	id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+	type VARCHAR(50) NOT NULL,
+	payload JSON NOT NULL,
+	uid INT UNSIGNED,
+	status ENUM("queued","running","done","failed") NOT NULL DEFAULT "queued",
+	attempts TINYINT UNSIGNED NOT NULL DEFAULT 0,
+	run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	-- The error of the last failed attempt
+	error VARCHAR(1000),
+	created DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	finished DATETIME,
+	CONSTRAINT FOREIGN KEY ( uid ) REFERENCES users( id ) ON DELETE SET NULL ON UPDATE CASCADE,
+	INDEX (status, run_after),
+	INDEX (type, status),
+	INDEX (finished)
+ );
+
+-- Refresh tokens that were rotated, access tokens are never stored
+-- Every token of a user is revoked at once by bumping users.token_generation
+CREATE OR REPLACE TABLE revoked_tokens (
+	token_uuid UUID NOT NULL PRIMARY KEY,
+	expires_after DATETIME NOT NULL,
+	INDEX (expires_after)
+ );
+
+-- Families (the refresh tokens rotated from the same login) that were revoked because one of their tokens was used twice
+CREATE OR REPLACE TABLE revoked_token_families (
+	family UUID NOT NULL PRIMARY KEY,
 	expires_after DATETIME NOT NULL,
-	is_revoked BOOLEAN NOT NULL DEFAULT FALSE,
-	CONSTRAINT FOREIGN KEY ( uid ) REFERENCES users( id ) ON DELETE CASCADE ON UPDATE CASCADE
+	INDEX (expires_after)
  );
 
-CREATE OR REPLACE EVENT token_cleanup
+DELIMITER //
+CREATE OR REPLACE EVENT revoked_tokens_cleanup
   ON SCHEDULE EVERY 5 MINUTE DO
-    DELETE FROM tokens
+  BEGIN
+    DELETE FROM revoked_tokens
+    WHERE expires_after < UTC_TIMESTAMP();
+    DELETE FROM revoked_token_families
     WHERE expires_after < UTC_TIMESTAMP();
+  END;
+//
+
+CREATE OR REPLACE EVENT jobs_cleanup
+  ON SCHEDULE EVERY 1 HOUR DO
+  BEGIN
+    DELETE FROM jobs
+    WHERE finished < NOW() - INTERVAL 7 DAY;
+  END;
+//
+DELIMITER ;
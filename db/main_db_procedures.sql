@@ -16,6 +16,8 @@ BEGIN
 	FROM intezmeny
 	LEFT JOIN intezmeny_users
 	ON intezmeny.id = intezmeny_users.intezmeny_id
+	-- The pooled intezmenys have no users until they are claimed
+	WHERE intezmeny.id NOT IN (SELECT intezmeny_id FROM intezmeny_pool)
 	GROUP BY intezmeny.id
 	HAVING COUNT(IF(role_="admin",1,NULL))=0;
 END;
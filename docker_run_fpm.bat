@@ -0,0 +1,2 @@
+docker compose -f docker-compose.fpm.yml up
+docker compose -f docker-compose.fpm.yml down
@@ -0,0 +1,5 @@
+#!/bin/bash
+set -euo pipefail
+
+sudo docker compose -f docker-compose.fpm.yml up
+sudo docker compose -f docker-compose.fpm.yml down
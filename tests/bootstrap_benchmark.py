@@ -0,0 +1,100 @@
+import argparse
+import csv
+import re
+import statistics
+import time
+
+import requests
+
+from load_test import setupCall
+
+# https://stackoverflow.com/a/28002687
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+URL = "https://127.0.0.1:443"
+PASSWORD = "tester_pass+"
+SERVER_TIMING = re.compile(r"(\w+);dur=([\d.]+)")
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(session: requests.Session, url: str, method: str, route: str, cookies, expected_code: int, repeat: int) -> dict:
+    """Latency seen by the client and the boot and total durations the server reported in its Server-Timing header"""
+    # Warm up the connection and the web server's caches
+    session.request(method, url + route, cookies=cookies, verify=False)
+
+    latencies = []
+    timings = {"boot": [], "total": []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = session.request(method, url + route, cookies=cookies, verify=False)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != expected_code:
+            raise RuntimeError(f"{method} {route} returned {response.status_code}: {response.text}")
+        reported = dict(SERVER_TIMING.findall(response.headers.get("Server-Timing", "")))
+        for name in timings:
+            if name in reported:
+                timings[name].append(float(reported[name]))
+    return {
+        "url": url,
+        "route": route,
+        "median_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        # Servers from before the boot timing don't report it
+        "boot_ms": statistics.median(timings["boot"]) if timings["boot"] else None,
+        "server_ms": statistics.median(timings["total"]) if timings["total"] else None,
+    }
+
+
+def benchmarkUrl(url: str, run_id: str, repeat: int) -> list:
+    session = requests.Session()
+    email = f"bootstrap_bench_{run_id}@test.com"
+    # Loads the router, the controller and the libraries but touches neither the database nor a token
+    results = [measure(session, url, "GET", "/token/get_access_token", "", 400, repeat)]
+
+    setupCall(session, "POST", "/user/create", "", {"disp_name": "bootstrap_bench", "email": email, "pass": PASSWORD}, 201, url=url)
+    try:
+        refresh_jar = setupCall(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200, url=url).cookies
+        access_jar = setupCall(session, "GET", "/token/get_access_token", refresh_jar, {}, 200, url=url).cookies
+        # Also validates an access token and reads from the database
+        results.append(measure(session, url, "GET", "/user/profile", access_jar, 200, repeat))
+    finally:
+        access_jar = setupCall(session, "GET", "/token/get_access_token",
+                               setupCall(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200, url=url).cookies, {}, 200, url=url).cookies
+        setupCall(session, "DELETE", "/user/delete", access_jar, {"pass": PASSWORD}, 204, url=url)
+    return results
+
+
+def formatMs(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the per request cost of loading the web server, e.g. of the built in php server against the php-fpm setup with preloading")
+    parser.add_argument("--url", nargs="+", default=[URL], help=f"base urls of the websites to compare (default: {URL})")
+    parser.add_argument("--repeat", type=int, default=200, help="measured requests per route (default: 200)")
+    parser.add_argument("--csv", help="also write the results to this csv file")
+    args = parser.parse_args()
+
+    run_id = f"{int(time.time())}"
+    print(f"{'url':<28} {'route':<24} {'median ms':>10} {'p95 ms':>10} {'boot ms':>10} {'server ms':>10}")
+    results = []
+    for url in args.url:
+        for result in benchmarkUrl(url.rstrip("/"), run_id, args.repeat):
+            print(f"{result['url']:<28} {result['route']:<24} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+                  f"{formatMs(result['boot_ms']):>10} {formatMs(result['server_ms']):>10}", flush=True)
+            results.append(result)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=["url", "route", "median_ms", "p95_ms", "boot_ms", "server_ms"])
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import datetime
+import hashlib
+import os
+import random
+import re
+import sys
+
+INTEZMENY_SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web_server", "intezmeny_sql.php")
+# The password for this password hash is "tester_pass", same as in db/test_data.sql
+PASSWORD_HASH = "$2a$10$lHTqGEfVCdw1J22lcgeYneqZlOSNbbk6rjilNGgb1hyLzGjtCwR2y"
+# Rows per INSERT statement
+BATCH_SIZE = 1000
+
+# Volumes at scale 1
+STUDENTS = 2000
+TEACHERS = 150
+CLASSES = 80
+EXTRA_GROUPS = 40
+LESSONS = 30
+ROOMS = 60
+TIMETABLE_ELEMENTS = 5000
+HOMEWORKS = 20000
+
+SCHOOL_YEAR_START = datetime.date(2025, 9, 1)
+SCHOOL_YEAR_END = datetime.date(2026, 6, 15)
+
+
+def loadTableLayout():
+    """Returns the columns of every table in $intezmeny_tables of intezmeny_sql.php as {table: {column: definition}}"""
+    with open(INTEZMENY_SQL_PATH, encoding="utf-8") as intezmeny_sql:
+        tables_sql = re.search(r"\$intezmeny_tables = '(.*?)';", intezmeny_sql.read(), re.S).group(1)
+    layout = dict()
+    for table, body in re.findall(r"CREATE OR REPLACE TABLE (\w+) \((.*?)\n\);", tables_sql, re.S):
+        layout[table] = dict()
+        for line in body.split("\n"):
+            line = line.strip().rstrip(",")
+            if line == "" or line.split()[0] in ("CONSTRAINT", "PRIMARY", "INDEX", "KEY", "UNIQUE"):
+                continue
+            layout[table][line.split()[0]] = line
+    return layout
+
+
+def checkColumns(layout: dict, table: str, columns: list):
+    """Fails loudly if the generator drifted from the schema instead of generating a fixture that doesn't load"""
+    if table not in layout:
+        raise RuntimeError(f"Table {table} is not in intezmeny_sql.php")
+    unknown = [column for column in columns if column not in layout[table]]
+    if unknown:
+        raise RuntimeError(f"Columns {unknown} of table {table} are not in intezmeny_sql.php")
+    for column, definition in layout[table].items():
+        if column not in columns and "NOT NULL" in definition and "DEFAULT" not in definition and "AUTO_INCREMENT" not in definition:
+            raise RuntimeError(f"Column {column} of table {table} is required but is not generated")
+
+
+def sqlValue(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return f"{value}"
+    return "'" + f"{value}".replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def likePrefix(prefix: str) -> str:
+    """LIKE pattern matching everything that starts with prefix, to be used with ESCAPE '!'"""
+    return sqlValue(prefix.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%")
+
+
+def insert(out, table: str, columns: list, rows, layout: dict = None):
+    """Writes the rows as multi row INSERT statements of at most BATCH_SIZE rows"""
+    if layout is not None:
+        checkColumns(layout, table, columns)
+    head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES\n"
+    batch = []
+    for row in rows:
+        batch.append("(" + ", ".join(sqlValue(value) for value in row) + ")")
+        if len(batch) == BATCH_SIZE:
+            out.write(head + ",\n".join(batch) + ";\n")
+            batch = []
+    if batch:
+        out.write(head + ",\n".join(batch) + ";\n")
+
+
+def randomDateTime(rng: random.Random, start: datetime.date, end: datetime.date) -> datetime.datetime:
+    seconds = rng.randrange(int((end - start).total_seconds()))
+    return datetime.datetime.combine(start, datetime.time()) + datetime.timedelta(seconds=seconds)
+
+
+def userEmail(prefix: str, role: str, i: int) -> str:
+    return f"{prefix}{role}_{i}@test.com"
+
+
+def generate(out, intezmeny_id: int, prefix: str, scale: int, seed: int):
+    """
+    Writes the sql that fills ordayna_intezmeny_<intezmeny_id> and links its users in ordayna_main_db
+    The intezmeny has to exist already (e.g. created via /create_intezmeny), every row it has is replaced
+    The generated users' emails start with prefix so they can be removed with cleanup()
+    """
+    rng = random.Random(seed)
+    layout = loadTableLayout()
+
+    students = STUDENTS * scale
+    teachers = TEACHERS * scale
+    classes = CLASSES * scale
+    groups = classes + EXTRA_GROUPS * scale
+    lessons = LESSONS * scale
+    rooms = ROOMS * scale
+    timetable_elements = TIMETABLE_ELEMENTS * scale
+    homeworks = HOMEWORKS * scale
+
+    out.write("SET FOREIGN_KEY_CHECKS = 0;\nSET UNIQUE_CHECKS = 0;\nSET autocommit = 0;\n")
+
+    out.write("USE ordayna_main_db;\n")
+    insert(out, "users", ["display_name", "email", "phone_number", "password_hash"],
+           ((f"{role}_{i}", userEmail(prefix, role, i), f"36{rng.randrange(10 ** 9):09}" if rng.random() < 0.8 else None, PASSWORD_HASH)
+            for role, count in (("student", students), ("teacher", teachers)) for i in range(count)))
+    for role in ("student", "teacher"):
+        out.write(f"INSERT INTO intezmeny_users (intezmeny_id, users_id, role_, invite_accepted)\n"
+                  f"SELECT {intezmeny_id}, id, '{role}', TRUE FROM users WHERE email LIKE {likePrefix(prefix + role + '_')} ESCAPE '!';\n")
+
+    out.write(f"USE ordayna_intezmeny_{intezmeny_id};\n")
+    for table in ("attachments", "homework", "timetable", "teacher_availability", "teacher_lesson", "teacher", "room", "lesson", "group_", "class"):
+        out.write(f"DELETE FROM {table};\nALTER TABLE {table} AUTO_INCREMENT = 1;\n")
+
+    insert(out, "class", ["id", "name"], ((i + 1, f"class_{i}") for i in range(classes)), layout)
+    insert(out, "group_", ["id", "name", "headcount", "class_id"],
+           ((i + 1, f"group_{i}", rng.randint(10, 35), i + 1 if i < classes else rng.randint(1, classes)) for i in range(groups)), layout)
+    insert(out, "lesson", ["id", "name"], ((i + 1, f"lesson_{i}") for i in range(lessons)), layout)
+    insert(out, "room", ["id", "name", "type", "space"],
+           ((i + 1, f"room_{i}", rng.choice(["classroom", "lab", "gym", None]), rng.randint(15, 40)) for i in range(rooms)), layout)
+
+    # The teacher rows are linked to the generated teacher users by email as their ids are only known to the database
+    checkColumns(layout, "teacher", ["id", "name", "job", "user_id"])
+    out.write(f"INSERT INTO teacher (id, name, job, user_id)\n"
+              f"SELECT CAST(SUBSTRING_INDEX(SUBSTRING_INDEX(email, '_', -1), '@', 1) AS UNSIGNED) + 1, display_name, 'teacher', id\n"
+              f"FROM ordayna_main_db.users WHERE email LIKE {likePrefix(prefix + 'teacher_')} ESCAPE '!';\n")
+    insert(out, "teacher_lesson", ["teacher_id", "lesson_id"],
+           ((teacher + 1, lesson) for teacher in range(teachers) for lesson in rng.sample(range(1, lessons + 1), rng.randint(1, 3))), layout)
+    insert(out, "teacher_availability",
+           ["teacher_id", "available_from_day", "available_from_time", "available_until_day", "available_until_time"],
+           ((teacher + 1, day, f"{rng.randint(7, 9):02}:00:00", day, f"{rng.randint(13, 16):02}:00:00")
+            for teacher in range(teachers) for day in range(5)), layout)
+
+    insert(out, "timetable", ["id", "start", "duration", "day", "from_", "until", "group_id", "lesson_id", "teacher_id", "room_id"],
+           ((i + 1, f"{rng.randint(7, 15):02}:{rng.choice([0, 15, 30, 45]):02}:00", "00:45:00", rng.randrange(5),
+             SCHOOL_YEAR_START.isoformat(), SCHOOL_YEAR_END.isoformat(),
+             rng.randint(1, groups), rng.randint(1, lessons), rng.randint(1, teachers), rng.randint(1, rooms))
+            for i in range(timetable_elements)), layout)
+
+    def homeworkRows():
+        for i in range(homeworks):
+            published = randomDateTime(rng, SCHOOL_YEAR_START, SCHOOL_YEAR_END)
+            due = published + datetime.timedelta(days=rng.randint(1, 14))
+            yield (i + 1, f"homework_{i} " + "lorem ipsum " * rng.randint(1, 20), published.isoformat(" "), due.isoformat(" "),
+                   rng.randint(1, groups), rng.randint(1, lessons), rng.randint(1, teachers))
+
+    insert(out, "homework", ["id", "description", "published", "due", "group_id", "lesson_id", "teacher_id"], homeworkRows(), layout)
+    # Averages one attachment per homework, the files themselves are not generated (nor their blobs, see web_server/models/blob.php)
+    insert(out, "attachments", ["homework_id", "file_name", "sha256"],
+           ((i + 1, f"worksheet_{i}_{j}.pdf", hashlib.sha256(f"worksheet_{i}_{j}".encode()).hexdigest())
+            for i in range(homeworks) for j in range(rng.choice([0, 0, 1, 1, 1, 2, 3]))), layout)
+
+    out.write("COMMIT;\nSET autocommit = 1;\nSET UNIQUE_CHECKS = 1;\nSET FOREIGN_KEY_CHECKS = 1;\n")
+
+
+def cleanup(out, prefix: str):
+    """Writes the sql that deletes the users generated with prefix"""
+    out.write(f"DELETE FROM ordayna_main_db.users WHERE email LIKE {likePrefix(prefix)} ESCAPE '!';\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes sql that fills an existing intezmeny with a large, seeded, synthetic data set")
+    parser.add_argument("intezmeny_id", type=int, help="id of the intezmeny to fill, its ordayna_intezmeny_<id> database must already exist")
+    parser.add_argument("--scale", type=int, default=1, help="multiplier for every volume (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: 0)")
+    parser.add_argument("--prefix", default="generated_", help="prefix of the generated users' emails (default: generated_)")
+    parser.add_argument("--cleanup", action="store_true", help="write the sql that deletes the generated users instead")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup(sys.stdout, args.prefix)
+    else:
+        generate(sys.stdout, args.intezmeny_id, args.prefix, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
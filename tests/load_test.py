@@ -0,0 +1,196 @@
+import argparse
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# https://stackoverflow.com/a/28002687
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+URL = "https://127.0.0.1:443"
+ROUTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web_server", "router.php")
+PASSWORD = "tester_pass+"
+# Upper bounds of the latency histogram buckets in milliseconds, the last bucket is everything above
+LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+samples = dict()
+samples_lock = threading.Lock()
+
+
+def loadRoutes():
+    """Returns the (path, method) pairs of the match table in router.php in the order they are declared"""
+    with open(ROUTER_PATH, encoding="utf-8") as router:
+        return re.findall(r"'(/[^']*)' => route\('(\w+)'", router.read())
+
+
+def record(route: str, latency: float, ok: bool):
+    with samples_lock:
+        samples.setdefault(route, []).append((latency, ok))
+
+
+def call(session: requests.Session, method: str, route: str, cookies, payload: dict, expected_code: int):
+    start = time.perf_counter()
+    try:
+        response = session.request(method, URL + route, json=payload, cookies=cookies, verify=False)
+        ok = response.status_code == expected_code
+    except requests.RequestException:
+        response = None
+        ok = False
+    record(route, time.perf_counter() - start, ok)
+    return response
+
+
+def setupCall(session: requests.Session, method: str, route: str, cookies, payload: dict, expected_code: int, url: str = URL):
+    """Setup and teardown calls are not part of the measurement and abort the run on failure, the benchmarks share it"""
+    response = session.request(method, url + route, json=payload, cookies=cookies, verify=False)
+    if response.status_code != expected_code:
+        raise RuntimeError(f"{method} {route} returned {response.status_code}: {response.text}")
+    return response
+
+
+def login(session: requests.Session, email: str):
+    refresh_jar = setupCall(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200).cookies
+    return setupCall(session, "GET", "/token/get_access_token", refresh_jar, {}, 200).cookies
+
+
+def setup(user_count: int, run_id: str):
+    """
+    Creates an intezmeny owned by a load test admin with one teacher user and one homework per virtual user
+    Returns the admin's email, the intezmeny's id and the emails of the virtual users
+    """
+    session = requests.Session()
+    admin_email = f"load_admin_{run_id}@test.com"
+    setupCall(session, "POST", "/user/create", "", {"disp_name": "load_admin", "email": admin_email, "pass": PASSWORD}, 201)
+    admin_jar = login(session, admin_email)
+    setupCall(session, "POST", "/create_intezmeny", admin_jar, {"intezmeny_name": f"load_test_{run_id}"}, 201)
+    intezmeny_id = setupCall(session, "GET", "/get_intezmenys", admin_jar, {}, 200).json()[-1]["id"]
+    base = {"intezmeny_id": f"{intezmeny_id}"}
+
+    setupCall(session, "POST", "/intezmeny/create/class", admin_jar, base | {"name": "load_class", "headcount": "30"}, 201)
+    setupCall(session, "POST", "/intezmeny/create/lesson", admin_jar, base | {"name": "load_lesson"}, 201)
+
+    emails = []
+    for i in range(user_count):
+        email = f"load_user_{run_id}_{i}@test.com"
+        setupCall(session, "POST", "/user/create", "", {"disp_name": f"load_user_{i}", "email": email, "pass": PASSWORD}, 201)
+        user_jar = login(session, email)
+        setupCall(session, "POST", "/intezmeny/user/invite", admin_jar, base | {"email": email}, 204)
+        setupCall(session, "POST", "/intezmeny/user/accept_invite", user_jar, base, 204)
+        uid = setupCall(session, "GET", "/user/profile", user_jar, {}, 200).json()["id"]
+        setupCall(session, "POST", "/intezmeny/create/teacher", admin_jar, base | {"name": f"load_teacher_{i}", "job": "load", "teacher_uid": f"{uid}"}, 201)
+        # The tenant is fresh so the teacher and homework ids follow the creation order
+        setupCall(session, "POST", "/intezmeny/create/timetable_element", admin_jar, base | {
+            "start": f"{8 + i % 8:02}:00:00", "duration": "00:45:00", "day": f"{i % 5}", "from": "2025-09-01", "until": "2026-06-15",
+            "lesson_id": "1", "teacher_id": f"{i + 1}"}, 201)
+        setupCall(session, "POST", "/intezmeny/create/homework", admin_jar, base | {
+            "description": f"load_homework_{i}", "due": "2026-06-15 08:00:00", "group_id": "1", "lesson_id": "1", "teacher_id": f"{i + 1}"}, 201)
+        emails.append(email)
+
+    return admin_email, intezmeny_id, emails
+
+
+def teardown(admin_email: str, emails: list):
+    session = requests.Session()
+    for email in emails:
+        user_jar = login(session, email)
+        setupCall(session, "DELETE", "/user/delete", user_jar, {"pass": PASSWORD}, 204)
+    # Deleting the admin also deletes the now orphaned intezmeny
+    setupCall(session, "DELETE", "/user/delete", login(session, admin_email), {"pass": PASSWORD}, 204)
+
+
+def virtualUser(index: int, email: str, intezmeny_id: int, deadline: float, interval: float, iterations: int):
+    """Replays the morning flow of a teacher: login, access token, timetable, homeworks and then a homework update"""
+    session = requests.Session()
+    base = {"intezmeny_id": f"{intezmeny_id}"}
+    # Spread the first logins so that the virtual users don't all start in the same millisecond
+    time.sleep(random.uniform(0, interval))
+    done = 0
+    while time.perf_counter() < deadline and (iterations == 0 or done < iterations):
+        started = time.perf_counter()
+        response = call(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200)
+        if response is not None and response.status_code == 200:
+            response = call(session, "GET", "/token/get_access_token", response.cookies, {}, 200)
+        if response is not None and response.status_code == 200:
+            access_jar = response.cookies
+            call(session, "POST", "/intezmeny/get/timetable", access_jar, base, 200)
+            call(session, "POST", "/intezmeny/get/homeworks", access_jar, base, 200)
+            call(session, "POST", "/intezmeny/update/homework", access_jar, base | {
+                "homework_id": f"{index + 1}", "description": f"load_homework_{index}_{done}", "due": "2026-06-15 08:00:00",
+                "group_id": "1", "lesson_id": "1", "teacher_id": f"{index + 1}"}, 204)
+        done += 1
+        time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+def percentile(sorted_latencies: list, p: float) -> float:
+    """Nearest rank percentile"""
+    return sorted_latencies[max(0, math.ceil(p / 100 * len(sorted_latencies)) - 1)]
+
+
+def report(elapsed: float):
+    header = f"{'route':<40} {'method':<6} {'count':>7} {'req/s':>8} {'err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}"
+    print(header)
+    print("-" * len(header))
+    histograms = []
+    for route, method in loadRoutes():
+        if route not in samples:
+            continue
+        latencies = sorted(latency * 1000 for latency, _ in samples[route])
+        errors = sum(1 for _, ok in samples[route] if not ok)
+        print(f"{route:<40} {method:<6} {len(latencies):>7} {len(latencies) / elapsed:>8.1f} {errors / len(latencies) * 100:>6.1f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} {latencies[-1]:>8.1f}")
+        buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        for latency in latencies:
+            buckets[next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))] += 1
+        histograms.append((route, buckets))
+
+    total = sum(len(route_samples) for route_samples in samples.values())
+    total_errors = sum(1 for route_samples in samples.values() for _, ok in route_samples if not ok)
+    print(f"\nTotal: {total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s, {total_errors} errors")
+
+    print("\nLatency histograms (requests per bucket, upper bound in ms):")
+    print(f"{'route':<40} " + " ".join(f"{'<=' + str(bound):>7}" for bound in LATENCY_BUCKETS) + f" {'>' + str(LATENCY_BUCKETS[-1]):>7}")
+    for route, buckets in histograms:
+        print(f"{route:<40} " + " ".join(f"{count:>7}" for count in buckets))
+
+
+def main():
+    global URL
+
+    parser = argparse.ArgumentParser(description="Replays concurrent teacher logins and reads against the api and reports latencies per route")
+    parser.add_argument("--url", default=URL, help=f"base url of the website (default: {URL})")
+    parser.add_argument("--users", type=int, default=20, help="number of concurrent virtual users (default: 20)")
+    parser.add_argument("--duration", type=float, default=60, help="length of the measurement in seconds (default: 60)")
+    parser.add_argument("--iterations", type=int, default=0, help="stop every virtual user after this many flows, 0 means no limit (default: 0)")
+    parser.add_argument("--rate", type=float, default=0, help="target flows per second over all virtual users, 0 means as fast as possible (default: 0)")
+    args = parser.parse_args()
+    URL = args.url.rstrip("/")
+
+    run_id = f"{int(time.time())}"
+    print(f"Setting up {args.users} virtual users...")
+    admin_email, intezmeny_id, emails = setup(args.users, run_id)
+
+    interval = args.users / args.rate if args.rate > 0 else 0.0
+    print(f"Running for {args.duration}s" + (f" at {args.rate} flows/s" if args.rate > 0 else "") + "...")
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            futures = [pool.submit(virtualUser, i, email, intezmeny_id, start + args.duration, interval, args.iterations) for i, email in enumerate(emails)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        print("Tearing down...")
+        teardown(admin_email, emails)
+
+    print()
+    report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from load_test import setupCall
+
+# https://stackoverflow.com/a/28002687
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+URL = "https://127.0.0.1:443"
+PASSWORD = "tester_pass+"
+
+latencies = []
+failures = 0
+results_lock = threading.Lock()
+
+
+def worker(email: str, deadline: float):
+    global failures
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            ok = session.post(URL + "/token/get_refresh_token", json={"email": email, "pass": PASSWORD}, verify=False).status_code == 200
+        except requests.RequestException:
+            ok = False
+        with results_lock:
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures += 1
+
+
+def main():
+    global URL
+
+    parser = argparse.ArgumentParser(description="Measures how many logins per second the web server can handle")
+    parser.add_argument("--url", default=URL, help=f"base url of the website (default: {URL})")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count(), help="logins in flight at once (default: the number of cpus here)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run for (default: 30)")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(),
+                        help="cpu cores of the web server, for the per core rate (default: the number of cpus here)")
+    args = parser.parse_args()
+    URL = args.url.rstrip("/")
+
+    session = requests.Session()
+    email = f"login_bench_{int(time.time())}@test.com"
+    setupCall(session, "POST", "/user/create", "", {"disp_name": "login_bench", "email": email, "pass": PASSWORD}, 201)
+    try:
+        # Warm up, the first login may also rehash the password
+        setupCall(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for _ in range(args.concurrency):
+                executor.submit(worker, email, started + args.duration)
+        elapsed = time.perf_counter() - started
+    finally:
+        access_jar = setupCall(session, "GET", "/token/get_access_token",
+                               setupCall(session, "POST", "/token/get_refresh_token", "", {"email": email, "pass": PASSWORD}, 200).cookies, {}, 200).cookies
+        setupCall(session, "DELETE", "/user/delete", access_jar, {"pass": PASSWORD}, 204)
+
+    if not latencies:
+        raise RuntimeError(f"Every login failed ({failures})")
+    ordered = sorted(latencies)
+    rate = len(latencies) / elapsed
+    print(f"{len(latencies)} logins in {elapsed:.1f}s with {args.concurrency} in flight, {failures} failed")
+    print(f"{rate:.1f} logins/s, {rate / args.cores:.1f} logins/s per core ({args.cores} cores)")
+    print(f"latency median {statistics.median(ordered) * 1000:.1f} ms, p95 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import csv
+import shlex
+import statistics
+import subprocess
+import time
+
+import requests
+
+import generate_tenant
+from load_test import setupCall
+
+# https://stackoverflow.com/a/28002687
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+URL = "https://127.0.0.1:443"
+PASSWORD = "tester_pass+"
+MARIADB = "sudo mariadb -u root"
+ENDPOINTS = ["/intezmeny/get/teachers", "/intezmeny/get/homeworks", "/intezmeny/get/timetable", "/intezmeny/user/get_all"]
+
+mariadb_command = shlex.split(MARIADB)
+
+
+def runSql(sql: str) -> str:
+    return subprocess.run(mariadb_command + ["--batch", "--skip-column-names"], input=sql, capture_output=True, text=True, check=True).stdout
+
+
+def queryCount() -> int:
+    """Number of statements the database server executed so far, including the ones run by stored procedures"""
+    return int(runSql("SHOW GLOBAL STATUS LIKE 'Queries';").split()[1])
+
+
+def probeOverhead() -> int:
+    """Number of statements a single queryCount() adds on its own (the client's startup queries and the SHOW itself)"""
+    before = queryCount()
+    return queryCount() - before
+
+
+def fillIntezmeny(intezmeny_id: int, prefix: str, scale: int, seed: int):
+    with subprocess.Popen(mariadb_command, stdin=subprocess.PIPE, text=True) as mariadb:
+        generate_tenant.generate(mariadb.stdin, intezmeny_id, prefix, scale, seed)
+        mariadb.stdin.close()
+        if mariadb.wait() != 0:
+            raise RuntimeError(f"Loading the generated data into intezmeny {intezmeny_id} failed")
+
+
+def measure(session: requests.Session, refresh_jar, intezmeny_id: int, endpoint: str, repeat: int, overhead: int) -> dict:
+    # A fresh access token per endpoint as the larger scales can take longer than an access token lives
+    access_jar = setupCall(session, "GET", "/token/get_access_token", refresh_jar, {}, 200).cookies
+    payload = {"intezmeny_id": f"{intezmeny_id}"}
+    # Warm up the connection and the database's caches
+    session.post(URL + endpoint, json=payload, cookies=access_jar, verify=False)
+
+    latencies = []
+    queries = []
+    for _ in range(repeat):
+        before = queryCount()
+        start = time.perf_counter()
+        response = session.post(URL + endpoint, json=payload, cookies=access_jar, verify=False)
+        latencies.append(time.perf_counter() - start)
+        queries.append(queryCount() - before - overhead)
+    return {
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "median_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "bytes": len(response.content),
+        # The minimum filters out statements run by anything else during the measurement (e.g. the token cleanup event)
+        "queries": min(queries),
+    }
+
+
+def benchmarkScale(scale: int, run_id: str, repeat: int, seed: int, overhead: int) -> list:
+    session = requests.Session()
+    prefix = f"bench_{run_id}_{scale}x_"
+    admin_email = f"{prefix}admin@test.com"
+    setupCall(session, "POST", "/user/create", "", {"disp_name": "bench_admin", "email": admin_email, "pass": PASSWORD}, 201)
+    try:
+        refresh_jar = setupCall(session, "POST", "/token/get_refresh_token", "", {"email": admin_email, "pass": PASSWORD}, 200).cookies
+        access_jar = setupCall(session, "GET", "/token/get_access_token", refresh_jar, {}, 200).cookies
+        setupCall(session, "POST", "/create_intezmeny", access_jar, {"intezmeny_name": f"bench_{scale}x"}, 201)
+        intezmeny_id = setupCall(session, "GET", "/get_intezmenys", access_jar, {}, 200).json()[-1]["id"]
+
+        print(f"Generating {scale}x data into intezmeny {intezmeny_id}...", flush=True)
+        started = time.perf_counter()
+        fillIntezmeny(intezmeny_id, prefix, scale, seed)
+        print(f"Loaded in {time.perf_counter() - started:.1f}s", flush=True)
+
+        results = []
+        for endpoint in ENDPOINTS:
+            result = measure(session, refresh_jar, intezmeny_id, endpoint, repeat, overhead)
+            result["scale"] = scale
+            print(f"{scale:>4}x {endpoint:<28} {result['status']:>4} {result['median_ms']:>10.1f} {result['max_ms']:>10.1f} "
+                  f"{result['bytes']:>12} {result['queries']:>8}", flush=True)
+            results.append(result)
+        return results
+    finally:
+        # Deleting the admin also deletes the now orphaned intezmeny, the generated users are deleted directly
+        access_jar = setupCall(session, "GET", "/token/get_access_token",
+                               setupCall(session, "POST", "/token/get_refresh_token", "", {"email": admin_email, "pass": PASSWORD}, 200).cookies, {}, 200).cookies
+        setupCall(session, "DELETE", "/user/delete", access_jar, {"pass": PASSWORD}, 204)
+        with subprocess.Popen(mariadb_command, stdin=subprocess.PIPE, text=True) as mariadb:
+            generate_tenant.cleanup(mariadb.stdin, prefix)
+
+
+def main():
+    global URL
+    global mariadb_command
+
+    parser = argparse.ArgumentParser(description="Measures how the read endpoints scale with the size of an intezmeny")
+    parser.add_argument("--url", default=URL, help=f"base url of the website (default: {URL})")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="data set multipliers to measure (default: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=5, help="measured requests per endpoint and scale (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the data generator (default: 0)")
+    parser.add_argument("--mariadb", default=MARIADB, help=f"command that opens a privileged mariadb client (default: {MARIADB})")
+    parser.add_argument("--csv", help="also write the results to this csv file")
+    args = parser.parse_args()
+    URL = args.url.rstrip("/")
+    mariadb_command = shlex.split(args.mariadb)
+
+    run_id = f"{int(time.time())}"
+    overhead = probeOverhead()
+    print(f"{'scale':>5} {'endpoint':<28} {'code':>4} {'median ms':>10} {'max ms':>10} {'bytes':>12} {'queries':>8}")
+    results = []
+    for scale in args.scales:
+        results.extend(benchmarkScale(scale, run_id, args.repeat, args.seed, overhead))
+
+    print("\nScaling per endpoint (median ms / queries):")
+    print(f"{'endpoint':<28} " + " ".join(f"{f'{scale}x':>18}" for scale in args.scales))
+    for endpoint in ENDPOINTS:
+        row = {result["scale"]: result for result in results if result["endpoint"] == endpoint}
+        cells = [f"{row[scale]['median_ms']:.1f} / {row[scale]['queries']}" for scale in args.scales]
+        print(f"{endpoint:<28} " + " ".join(f"{cell:>18}" for cell in cells))
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=["scale", "endpoint", "status", "median_ms", "max_ms", "bytes", "queries"])
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,11 @@
+import hashlib
+import http.cookiejar
+import multiprocessing
+import os
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # https://stackoverflow.com/a/28002687
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -20,42 +27,55 @@ student_refresh_jar = dict()
 student_access_jar = dict()
 URL = "https://127.0.0.1:443"
 
+# Every suite runs in its own worker process so the globals above are never shared between suites
+# The users of a suite are prefixed with the suite's name and the run's id so that suites (and runs) don't collide
+email_prefix = ""
+session = None
+output = []
+
+def getSession():
+    """Returns the worker's keep-alive session, it never stores cookies so every test still only sends the jar it was given"""
+    global session
+
+    if (session is None):
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
 def handleApiError(message: str, response: requests.Response, expected_res_code, expected_res_body: str):
     global test_count
     global tests_passed
 
     test_count += 1
-    # Delete line and move cursor to collumn 0
-    print("\x1b[2K\x1b[G", end="")
 
     passed = True
     if (response.status_code != expected_res_code or response.text != expected_res_body):
         text = "\n        ".join(response.text.split("\n"))
         expected_text = "\n        ".join(expected_res_body.split("\n"))
         if (text.__len__() == 0): text = "[No Content]"
-        print(f"{test_count:>4} {message}: ❌")
-        print(f"        Test failed with status code: {response.status_code}")
-        print(f"        Received body: {text}\n        Expected body: {expected_text}")
+        output.append(f"{test_count:>4} {message}: ❌")
+        output.append(f"        Test failed with status code: {response.status_code}")
+        output.append(f"        Received body: {text}\n        Expected body: {expected_text}")
         passed = False
         if (response.cookies.__len__() != 0 and response.status_code >= 400):
-            print("        Endpoint returned cookies!!!")
+            output.append("        Endpoint returned cookies!!!")
             passed = False
     else:
         if (response.cookies.__len__() != 0 and response.status_code >= 400):
-            print(f"{test_count:>4} {message}: ❌")
-            print("        Endpoint returned cookies!!!")
+            output.append(f"{test_count:>4} {message}: ❌")
+            output.append("        Endpoint returned cookies!!!")
             passed = False
 
     if (passed): tests_passed += 1
-    print(f"Next test: {test_count + 1}", end="", flush=True)
 
 def testEndpoint(message: str, method: str, endpoint_path: str, cookies, payload: dict(), expected_res_code, expected_res_body):
-    response = requests.request(method, URL + endpoint_path, json=payload, cookies=cookies, verify=False)
+    response = getSession().request(method, URL + endpoint_path, json=payload, cookies=cookies, verify=False)
     handleApiError(message, response, expected_res_code, expected_res_body)
     return response
 
 def testEndpointNoErrorHandling(method: str, endpoint_path: str, cookies, payload: dict()):
-    return requests.request(method, URL + endpoint_path, json=payload, cookies=cookies, verify=False)
+    return getSession().request(method, URL + endpoint_path, json=payload, cookies=cookies, verify=False)
 
 def testId(base_message: str, method: str, endpoint_path: str, base_payload: dict(), jar: dict, id_name: str, null_allowed: bool, success_code: int, is_sensitive: bool):
     if (null_allowed):
@@ -156,41 +176,47 @@ def testDateTime(base_message: str, method: str, endpoint_path: str, base_payloa
     testEndpoint(f"{base_message}, {date_name} overflow", method, endpoint_path, access_jar, base_payload, 400, "Bad request")
 
 
-def main():
-    global test_count
-    global tests_passed
+def runSuite(name: str, run_id: str):
+    """Runs the stages of a suite in the current worker process and returns its results"""
+    global email_prefix
+
+    email_prefix = f"{name}_{run_id}_"
+    started = time.perf_counter()
+    for stage in SUITES[name]:
+        stage()
+    return name, tests_passed, test_count, output, time.perf_counter() - started
+
 
-    print(f"Next test: {test_count + 1}", end="", flush=True)
-    createUser()
-    tokens()
-    changeUserData()
-    createIntezmeny()
-    intezmenyUserEndpoints()
-    intezmenyCreateEndpoints()
-    intezmenyUpdateEndpoints()
-    intezmenyGetEndpoints()
-    intezmenyDeleteEndpoints()
-    deleteIntezmeny()
-    deleteUser()
+def main():
+    run_id = f"{int(time.time())}_{os.getpid()}"
+    all_tests_passed = 0
+    all_test_count = 0
 
-    cleanup()
+    with multiprocessing.Pool(len(SUITES)) as pool:
+        results = [pool.apply_async(runSuite, (name, run_id)) for name in SUITES]
+        for result in results:
+            name, suite_tests_passed, suite_test_count, suite_output, elapsed = result.get()
+            print(f"Suite {name}: {suite_tests_passed}/{suite_test_count} in {elapsed:.1f}s")
+            for line in suite_output:
+                print(line)
+            all_tests_passed += suite_tests_passed
+            all_test_count += suite_test_count
 
-    # Delete line and move cursor to start of collumn 0
-    print("\x1b[2K\x1b[G", end="")
-    print(f"Tests passed: {tests_passed}/{test_count}")
+    print(f"Tests passed: {all_tests_passed}/{all_test_count}")
+    return all_tests_passed == all_test_count
 
 
 def createUser():
-    testString("Create user", "POST", "/user/create", {"email": "tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, {}, "disp_name", False, 201)
+    testString("Create user", "POST", "/user/create", {"email": f"{email_prefix}tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, {}, "disp_name", False, 201)
     testEmail("Create user", "POST", "/user/create", {"disp_name": "tester", "phone_number": "123456789012345", "pass": "tester_pass+"}, {}, False, 201)
-    testPassword("Create user", "POST", "/user/create", {"disp_name": "tester", "email": "tester@test.com", "phone_number": "123456789012345"}, {}, "pass", True)
-    testPhoneNumber("Create user", "POST", "/user/create", {"disp_name": "tester", "email": "tester_no_phone@test.com", "pass": "tester_pass+"}, {}, "phone_number", True, 201)
+    testPassword("Create user", "POST", "/user/create", {"disp_name": "tester", "email": f"{email_prefix}tester@test.com", "phone_number": "123456789012345"}, {}, "pass", True)
+    testPhoneNumber("Create user", "POST", "/user/create", {"disp_name": "tester", "email": f"{email_prefix}tester_no_phone@test.com", "pass": "tester_pass+"}, {}, "phone_number", True, 201)
     testEndpoint("Create user, method is not POST", "PATCH", "/user/create", "",
-                 {"disp_name": "tester", "email": "tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 405, "")
+                 {"disp_name": "tester", "email": f"{email_prefix}tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 405, "")
     testEndpoint("Create user", "POST", "/user/create", "",
-                 {"disp_name": "tester", "email": "tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
+                 {"disp_name": "tester", "email": f"{email_prefix}tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
     testEndpoint("Create user, user already exists", "POST", "/user/create", "",
-                 {"disp_name": "tester", "email": "tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 400, "Already exists")
+                 {"disp_name": "tester", "email": f"{email_prefix}tester@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 400, "Already exists")
 
 
 def tokens():
@@ -201,11 +227,11 @@ def tokens():
     global reuse_refresh_jar
 
     refresh_jar = testEndpoint("Get refresh token", "POST", "/token/get_refresh_token", "",
-                 {"email": "tester@test.com", "pass": "tester_pass+"}, 200, "").cookies
+                 {"email": f"{email_prefix}tester@test.com", "pass": "tester_pass+"}, 200, "").cookies
     testEmail("Get refresh_token", "POST", "/token/get_refresh_token", {"pass": "tester_pass+"}, {}, False, 200)
-    testPassword("Get refresh token", "POST", "/token/get_refresh_token", {"email": "tester@test.com"}, {}, "pass", False)
+    testPassword("Get refresh token", "POST", "/token/get_refresh_token", {"email": f"{email_prefix}tester@test.com"}, {}, "pass", False)
     testEndpoint("Get refresh token, method is not POST", "PATCH", "/token/get_refresh_token", "",
-                 {"email": "tester@test.com", "pass": "tester_pass+"}, 405, "")
+                 {"email": f"{email_prefix}tester@test.com", "pass": "tester_pass+"}, 405, "")
 
     reuse_refresh_jar = refresh_jar.copy()
     refresh_jar = testEndpoint("Refresh refresh token", "GET", "/token/refresh_refresh_token", refresh_jar, {}, 200, "").cookies
@@ -226,6 +252,9 @@ def tokens():
 
     testToken("Refresh refresh token", "GET", "/token/refresh_refresh_token", {}, wrong_refresh_jar, reuse_refresh_jar)
     testToken("Get access token", "GET", "/token/get_access_token", {}, wrong_refresh_jar, reuse_refresh_jar)
+    # Reusing a rotated refresh token revokes every refresh token rotated from the same login
+    testEndpoint("Refresh refresh token, token of a revoked family", "GET", "/token/refresh_refresh_token", refresh_jar, {}, 403, "Unauthorised")
+    testEndpoint("Get access token, token of a revoked family", "GET", "/token/get_access_token", refresh_jar, {}, 403, "Unauthorised")
 
 
 def changeUserData():
@@ -247,11 +276,11 @@ def changeUserData():
 
     testEndpoint("Change password", "POST", "/user/change/password", access_jar, {"pass": "tester_pass+", "new_pass": "tmp_tester_pass"}, 204, "")
     refresh_jar = testEndpoint("Get refresh token", "POST", "/token/get_refresh_token", "",
-                 {"email": "tester@test.com", "pass": "tmp_tester_pass"}, 200, "").cookies
+                 {"email": f"{email_prefix}tester@test.com", "pass": "tmp_tester_pass"}, 200, "").cookies
     access_jar = testEndpoint("Get access token", "GET", "/token/get_access_token", refresh_jar, {}, 200, "").cookies
     testEndpoint("Change password back", "POST", "/user/change/password", access_jar, {"pass": "tmp_tester_pass", "new_pass": "tester_pass+"}, 204, "")
     refresh_jar = testEndpoint("Get refresh token", "POST", "/token/get_refresh_token", "",
-                 {"email": "tester@test.com", "pass": "tester_pass+"}, 200, "").cookies
+                 {"email": f"{email_prefix}tester@test.com", "pass": "tester_pass+"}, 200, "").cookies
     reuse_refresh_jar = refresh_jar.copy()
     refresh_jar = testEndpoint("Refresh refresh token", "GET", "/token/refresh_refresh_token", refresh_jar, {}, 200, "").cookies
     wrong_access_jar = refresh_jar.copy()
@@ -303,25 +332,25 @@ def intezmenyUserEndpoints():
     global intezmeny_id
 
     testEndpoint("Create teacher user", "POST", "/user/create", {},
-                 {"disp_name": "tester", "email": "tester_teacher@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
+                 {"disp_name": "tester", "email": f"{email_prefix}tester_teacher@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
     teacher_refresh_jar = testEndpoint("Get teacher refresh token", "POST", "/token/get_refresh_token", {},
-                 {"email": "tester_teacher@test.com", "pass": "tester_pass+"}, 200, "").cookies
+                 {"email": f"{email_prefix}tester_teacher@test.com", "pass": "tester_pass+"}, 200, "").cookies
     teacher_access_jar = testEndpoint("Get teacher access token", "GET", "/token/get_access_token", teacher_refresh_jar, {}, 200, "").cookies
 
     testEndpoint("Create student user", "POST", "/user/create", {},
-                 {"disp_name": "tester", "email": "tester_student@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
+                 {"disp_name": "tester", "email": f"{email_prefix}tester_student@test.com", "phone_number": "123456789012345", "pass": "tester_pass+"}, 201, "")
     student_refresh_jar = testEndpoint("Get student refresh token", "POST", "/token/get_refresh_token", {},
-                 {"email": "tester_student@test.com", "pass": "tester_pass+"}, 200, "").cookies
+                 {"email": f"{email_prefix}tester_student@test.com", "pass": "tester_pass+"}, 200, "").cookies
     student_access_jar = testEndpoint("Get student access token", "GET", "/token/get_access_token", student_refresh_jar, {}, 200, "").cookies
 
-    testId("Invite user", "POST", "/intezmeny/user/invite", {"email": "tester_teacher@test.com"}, access_jar, "intezmeny_id", False, 204, True)
+    testId("Invite user", "POST", "/intezmeny/user/invite", {"email": f"{email_prefix}tester_teacher@test.com"}, access_jar, "intezmeny_id", False, 204, True)
     testEmail("Invite user", "POST", "/intezmeny/user/invite", {"intezmeny_id": f"{intezmeny_id}"}, access_jar, False, 204)
-    testToken("Invite user", "POST", "/intezmeny/user/invite", {"intezmeny_id": f"{intezmeny_id}", "email": "tester_teacher@test.com"}, wrong_access_jar)
+    testToken("Invite user", "POST", "/intezmeny/user/invite", {"intezmeny_id": f"{intezmeny_id}", "email": f"{email_prefix}tester_teacher@test.com"}, wrong_access_jar)
     testEndpoint("Invite user, method is not POST", "PATCH", "/intezmeny/user/invite", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "email": "tester_teacher@test.com"}, 405, "")
-    testEndpoint("Invite user", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": "tester_teacher@test.com"}, 204, "")
-    testEndpoint("Invite user, already invited", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": "tester_teacher@test.com"}, 400, "Already exists")
-    testEndpoint("Invite user", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": "tester_student@test.com"}, 204, "")
+                 {"intezmeny_id": f"{intezmeny_id}", "email": f"{email_prefix}tester_teacher@test.com"}, 405, "")
+    testEndpoint("Invite user", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": f"{email_prefix}tester_teacher@test.com"}, 204, "")
+    testEndpoint("Invite user, already invited", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": f"{email_prefix}tester_teacher@test.com"}, 400, "Already exists")
+    testEndpoint("Invite user", "POST", "/intezmeny/user/invite", access_jar, {"intezmeny_id": f"{intezmeny_id}", "email": f"{email_prefix}tester_student@test.com"}, 204, "")
 
     testToken("Get invites", "GET", "/intezmeny/user/get_invites", {}, wrong_access_jar)
     testEndpoint("Get invites, method is not GET", "PATCH", "/intezmeny/user/get_invites", teacher_access_jar, {}, 405, "")
@@ -340,10 +369,10 @@ def intezmenyUserEndpoints():
     testToken("Get profile", "GET", "/user/profile", {}, wrong_access_jar)
     testEndpoint("Get profile, method is not GET", "PATCH", "/user/profile", teacher_access_jar, {}, 405, "")
     response = testEndpointNoErrorHandling("GET", "/user/profile", teacher_access_jar, {})
-    handleApiError("Get profile", response, 200, '{"id":' + f'{response.json()["id"]}' + ',"display_name":"tester","email":"tester_teacher@test.com","phone_number":"123456789012345","role":null}')
+    handleApiError("Get profile", response, 200, '{"id":' + f'{response.json()["id"]}' + ',"display_name":"tester","email":"' + email_prefix + 'tester_teacher@test.com","phone_number":"123456789012345","role":null}')
     teacher_uid = response.json()["id"]
     response = testEndpointNoErrorHandling("GET", "/user/profile", student_access_jar, {})
-    handleApiError("Get profile", response, 200, '{"id":' + f'{response.json()["id"]}' + ',"display_name":"tester","email":"tester_student@test.com","phone_number":"123456789012345","role":null}')
+    handleApiError("Get profile", response, 200, '{"id":' + f'{response.json()["id"]}' + ',"display_name":"tester","email":"' + email_prefix + 'tester_student@test.com","phone_number":"123456789012345","role":null}')
     student_uid = response.json()["id"]
 
     testToken("Get role", "POST", "/user/get_role", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
@@ -441,49 +470,49 @@ def intezmenyCreateEndpoints():
     testEndpoint("Get role, teacher", "POST", "/user/get_role", teacher_access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 200, "teacher")
 
     testId("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-           {"start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+           {"allow_clash": True, "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
             "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "intezmeny_id", False, 201, True)
     testDateTime("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "start", False, 201, False, True)
     testDateTime("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "duration", False, 201, False, True)
     testNumber("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "from": "2020-12-24", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "from": "2020-12-24", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "day", False, 201)
     testDateTime("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "from", False, 201, True, False)
     testDateTime("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "until", False, 201, True, False)
     testId("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
             "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "group_id", True, 201, False)
     testId("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
             "group_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "lesson_id", True, 201, False)
     testId("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
             "group_id": "1", "lesson_id": "1", "room_id": "1"}, access_jar, "teacher_id", True, 201, False)
     testId("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
             "group_id": "1", "lesson_id": "1", "teacher_id": "1"}, access_jar, "room_id", True, 201, False)
     testEndpoint("Create timetable element, until is before from", "POST", "/intezmeny/create/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-23",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-23",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 400, "Bad request")
     testEndpoint("Create timetable element, until is the same day as from", "POST", "/intezmeny/create/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 201, "")
     testToken("Create timetable element", "POST", "/intezmeny/create/timetable_element",
-              {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+              {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
                "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, wrong_access_jar)
     testEndpoint("Create timetable element, method is not POST", "PATCH", "/intezmeny/create/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 405, "")
     testEndpoint("Create timetable element", "POST", "/intezmeny/create/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "02:02:02", "duration": "02:02:02", "day": "4", "from": "2020-12-24", "until": "2020-12-25",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 201, "")
 
     testEndpoint("Create homework", "POST", "/intezmeny/create/homework", access_jar,
@@ -632,52 +661,52 @@ def intezmenyUpdateEndpoints():
 
 
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "intezmeny_id", False, 204, True)
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "element_id", False, 204, False)
     testDateTime("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "start", False, 204, False, True)
     testDateTime("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "duration", False, 204, False, True)
     testNumber("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "from": "2021-11-23", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "from": "2021-11-23", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "day", False, 204)
     testDateTime("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "from", False, 204, True, False)
     testDateTime("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "until", False, 204, True, False)
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "element_id": "2", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "2", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "group_id", True, 204, False)
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "element_id": "3", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "3", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "group_id": "1", "teacher_id": "1", "room_id": "1"}, access_jar, "lesson_id", True, 204, False)
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "element_id": "4", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "4", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "group_id": "1", "lesson_id": "1", "room_id": "1"}, access_jar, "teacher_id", True, 204, False)
     testId("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-           {"intezmeny_id": f"{intezmeny_id}", "element_id": "5", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+           {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "5", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
             "group_id": "1", "lesson_id": "1", "teacher_id": "1"}, access_jar, "room_id", True, 204, False)
     testEndpoint("Update timetable element, until is before from", "POST", "/intezmeny/update/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-10-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-10-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 400, "Bad request")
     testEndpoint("Update timetable element, until is the same day as from", "POST", "/intezmeny/update/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-23",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-23",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 204, "")
     testToken("Update timetable element", "POST", "/intezmeny/update/timetable_element",
-              {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+              {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
                "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, wrong_access_jar)
     testEndpoint("Update timetable element, method is not POST", "PATCH", "/intezmeny/update/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 405, "")
     testEndpoint("Update timetable element", "POST", "/intezmeny/update/timetable_element", access_jar,
-                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
+                 {"allow_clash": True, "intezmeny_id": f"{intezmeny_id}", "element_id": "1", "start": "03:03:03", "duration": "03:03:03", "day": "5", "from": "2021-11-23", "until": "2021-11-24",
                   "group_id": "1", "lesson_id": "1", "teacher_id": "1", "room_id": "1"}, 204, "")
 
     testId("Update homework", "POST", "/intezmeny/update/homework",
@@ -717,7 +746,7 @@ def intezmenyGetEndpoints():
     global intezmeny_id
 
     response = testEndpointNoErrorHandling("POST", "/intezmeny/user/get_all", access_jar, {"intezmeny_id": f"{intezmeny_id}"})
-    handleApiError("Get users", response, 200, '[{"id":' + f'{response.json()[0]["id"]}' + ',"display_name":"testerer","email":"tester@test.com","phone_number":null,"role":"admin"},{"id":' + f'{response.json()[1]["id"]}' + ',"display_name":"tester","email":"tester_teacher@test.com","phone_number":"123456789012345","role":"teacher"}]')
+    handleApiError("Get users", response, 200, '[{"id":' + f'{response.json()[0]["id"]}' + ',"display_name":"testerer","email":"' + email_prefix + 'tester@test.com","phone_number":null,"role":"admin"},{"id":' + f'{response.json()[1]["id"]}' + ',"display_name":"tester","email":"' + email_prefix + 'tester_teacher@test.com","phone_number":"123456789012345","role":"teacher"}]')
     testId("Get users", "POST", "/intezmeny/user/get_all", {}, access_jar, "intezmeny_id", False, 200, True)
     testToken("Get users", "POST", "/intezmeny/user/get_all", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
     testEndpoint("Get users, method not POST", "PATCH", "/intezmeny/user/get_all", access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
@@ -728,6 +757,15 @@ def intezmenyGetEndpoints():
     testToken("Get classes", "POST", "/intezmeny/get/classes", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
     testEndpoint("Get classes, method not POST", "PATCH", "/intezmeny/get/classes", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
+    etag = testEndpointNoErrorHandling("POST", "/intezmeny/get/classes", access_jar, {"intezmeny_id": f"{intezmeny_id}"}).headers.get("ETag", "")
+    response = getSession().post(URL + "/intezmeny/get/classes", json={"intezmeny_id": f"{intezmeny_id}"}, headers={"If-None-Match": etag},
+                                 cookies=access_jar, verify=False)
+    handleApiError("Get classes, not modified", response, 304, "")
+    testEndpoint("Update class, bumps the data version", "POST", "/intezmeny/update/class", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "class_id": "1", "name": "test_class_updated"}, 204, "")
+    response = getSession().post(URL + "/intezmeny/get/classes", json={"intezmeny_id": f"{intezmeny_id}"}, headers={"If-None-Match": etag},
+                                 cookies=access_jar, verify=False)
+    handleApiError("Get classes, modified since the ETag", response, 200, '[{"id":1,"name":"test_class_updated"}]')
 
     testEndpoint("Get lessons", "POST", "/intezmeny/get/lessons", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 200, '[{"id":1,"name":"test_lesson_updated"}]')
@@ -750,6 +788,35 @@ def intezmenyGetEndpoints():
     testEndpoint("Get rooms, method not POST", "PATCH", "/intezmeny/get/rooms", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
 
+    classes = testEndpointNoErrorHandling("POST", "/intezmeny/get/classes", access_jar, {"intezmeny_id": f"{intezmeny_id}"}).text
+    rooms = testEndpointNoErrorHandling("POST", "/intezmeny/get/rooms", access_jar, {"intezmeny_id": f"{intezmeny_id}"}).text
+    users = testEndpointNoErrorHandling("POST", "/intezmeny/user/get_all", access_jar, {"intezmeny_id": f"{intezmeny_id}"}).text
+    profile = testEndpointNoErrorHandling("GET", "/user/profile", access_jar, {}).text
+    testEndpoint("Get snapshot", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["rooms", "classes", "users", "profile"]}, 200,
+                 '{"rooms":' + rooms + ',"classes":' + classes + ',"users":' + users + ',"profile":' + profile + '}')
+    testEndpoint("Get snapshot, streamed", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["rooms", "classes"], "stream": True}, 200,
+                 '{"rooms":' + rooms + ',"classes":' + classes + '}')
+    testEndpoint("Get snapshot, teacher", "POST", "/intezmeny/get/snapshot", teacher_access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes"]}, 200, '{"classes":' + classes + '}')
+    testEndpoint("Get snapshot, users as teacher", "POST", "/intezmeny/get/snapshot", teacher_access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes", "users"]}, 403, "Unauthorised")
+    testEndpoint("Get snapshot, no collections", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}"}, 400, "Bad request")
+    testEndpoint("Get snapshot, empty collections", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": []}, 400, "Bad request")
+    testEndpoint("Get snapshot, unknown collection", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes", "timetable"]}, 400, "Bad request")
+    testEndpoint("Get snapshot, duplicate collection", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes", "classes"]}, 400, "Bad request")
+    testEndpoint("Get snapshot, stream is not a boolean", "POST", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes"], "stream": "true"}, 400, "Bad request")
+    testId("Get snapshot", "POST", "/intezmeny/get/snapshot", {"collections": ["classes"]}, access_jar, "intezmeny_id", False, 200, True)
+    testToken("Get snapshot", "POST", "/intezmeny/get/snapshot", {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes"]}, wrong_access_jar)
+    testEndpoint("Get snapshot, method not POST", "PATCH", "/intezmeny/get/snapshot", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "collections": ["classes"]}, 405, "")
+
     testEndpoint("Get teachers", "POST", "/intezmeny/get/teachers", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 200, '[{"id":1,"name":"test_teacher_updated_no_user","job":"test_updated","uid":null,"lessons":[],"availabilitys":[]},{"id":2,"name":"test_teacher_updated","job":"test_updated","uid":' + f'{teacher_uid}' + ',"lessons":[],"availabilitys":[]}]')
     testId("Get teachers", "POST", "/intezmeny/get/teachers", {}, access_jar, "intezmeny_id", False, 200, True)
@@ -764,13 +831,148 @@ def intezmenyGetEndpoints():
     testEndpoint("Get timetable, method not POST", "PATCH", "/intezmeny/get/timetable", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
 
+    testEndpoint("Create timetable element, clashes with a teacher's element", "POST", "/intezmeny/create/timetable_element", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "start": "03:00:00", "duration": "00:30:00", "day": "4", "from": "2020-12-25", "until": "2020-12-25",
+                  "teacher_id": "1"}, 409, '[{"resource":"teacher","resource_id":1,"element_id":6,"other_element_id":null}]')
+    testEndpoint("Create timetable element, allow_clash is not boolean", "POST", "/intezmeny/create/timetable_element", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "allow_clash": "true", "start": "03:00:00", "duration": "00:30:00", "day": "4",
+                  "from": "2020-12-25", "until": "2020-12-25", "teacher_id": "1"}, 400, "Bad request")
+    testEndpoint("Update timetable element, clashes with the other elements of its group", "POST", "/intezmeny/update/timetable_element", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "element_id": "6", "start": "05:00:00", "duration": "00:45:00", "day": "5", "from": "2021-11-24", "until": "2021-11-24",
+                  "group_id": "1"}, 409,
+                 '[{"resource":"group","resource_id":1,"element_id":1,"other_element_id":6},{"resource":"group","resource_id":1,"element_id":3,"other_element_id":6},'
+                 '{"resource":"group","resource_id":1,"element_id":4,"other_element_id":6},{"resource":"group","resource_id":1,"element_id":5,"other_element_id":6}]')
+
+    # Elements 1 to 5 book the same slot, each of them shares its group, teacher and room with the others except for the one it has no value for
+    clashes = [(resource, first, second) for resource, missing in (("group", 2), ("room", 5), ("teacher", 4))
+               for first in range(1, 6) for second in range(first + 1, 6) if missing not in (first, second)]
+    testEndpoint("Get timetable clashes", "POST", "/intezmeny/get/timetable_clashes", access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 200,
+                 "[" + ",".join(f'{{"resource":"{resource}","resource_id":1,"element_id":{first},"other_element_id":{second}}}' for resource, first, second in clashes) + "]")
+    testEndpoint("Get timetable clashes, not admin", "POST", "/intezmeny/get/timetable_clashes", teacher_access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}"}, 403, "Unauthorised")
+    testId("Get timetable clashes", "POST", "/intezmeny/get/timetable_clashes", {}, access_jar, "intezmeny_id", False, 200, True)
+    testToken("Get timetable clashes", "POST", "/intezmeny/get/timetable_clashes", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
+    testEndpoint("Get timetable clashes, method not POST", "PATCH", "/intezmeny/get/timetable_clashes", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
+
+    # Element 6 is on fridays from thursday 2020-12-24, elements 1 to 5 are on saturdays but only valid from a tuesday to a wednesday
+    testEndpoint("Get occurrences", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30"}, 200,
+                 '[{"element_id":6,"date":"2020-12-25","start":"2020-12-25 02:02:02","end":"2020-12-25 04:04:04","group_id":1,"lesson_id":1,"teacher_id":1,"room_id":1}]')
+    testEndpoint("Get occurrences, window ends before the occurrence", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2020-12-24"}, 200, "[]")
+    testEndpoint("Get occurrences, filtered by teacher", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30", "teacher_id": "2"}, 200, "[]")
+    testEndpoint("Get occurrences, mine and not a member of any group", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30", "mine": True}, 200, "[]")
+    testEndpoint("Get occurrences, until is before from", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-25", "until": "2020-12-24"}, 400, "Bad request")
+    testEndpoint("Get occurrences, window is longer than a year", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-01-01", "until": "2021-01-01"}, 400, "Bad request")
+    testEndpoint("Get occurrences, no until", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01"}, 400, "Bad request")
+    testEndpoint("Get occurrences, mine is not boolean", "POST", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30", "mine": "true"}, 400, "Bad request")
+    testId("Get occurrences", "POST", "/intezmeny/get/occurrences", {"from": "2020-12-01", "until": "2021-11-30"}, access_jar, "intezmeny_id", False, 200, True)
+    testToken("Get occurrences", "POST", "/intezmeny/get/occurrences", {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30"}, wrong_access_jar)
+    testEndpoint("Get occurrences, method not POST", "PATCH", "/intezmeny/get/occurrences", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "from": "2020-12-01", "until": "2021-11-30"}, 405, "")
+
+    testEndpoint("Get calendar feed, both group and teacher", "POST", "/intezmeny/get/calendar_feed", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "group_id": "1", "teacher_id": "1"}, 400, "Bad request")
+    testEndpoint("Get calendar feed, no resource", "POST", "/intezmeny/get/calendar_feed", access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 400, "Bad request")
+    testEndpoint("Get calendar feed, room does not exist", "POST", "/intezmeny/get/calendar_feed", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "room_id": "347653267853"}, 400, "Bad request")
+    testToken("Get calendar feed", "POST", "/intezmeny/get/calendar_feed", {"intezmeny_id": f"{intezmeny_id}", "group_id": "1"}, wrong_access_jar)
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/calendar_feed", access_jar, {"intezmeny_id": f"{intezmeny_id}", "group_id": "1"})
+    feed_url = response.json()["url"] if response.status_code == 200 else ""
+    handleApiError("Get calendar feed", response, 200, '{"url":"' + feed_url.replace("/", "\\/") + '"}' if feed_url.startswith("/calendar.ics?feed=") else "[Calendar feed url]")
+    # The calendar is fetched without cookies like a calendar app would, its DTSTAMP is when it was generated
+    response = getSession().get(URL + feed_url, verify=False)
+    calendar = "".join(line + "\r\n" for line in response.text.split("\r\n")[:-1] if not line.startswith("DTSTAMP:"))
+    handleApiError("Get calendar", response, 200, response.text if calendar ==
+                   "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Ordayna//Timetable//EN\r\nCALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n"
+                   "X-WR-CALNAME:test_group_updated\r\nREFRESH-INTERVAL;VALUE=DURATION:PT1H\r\nX-PUBLISHED-TTL:PT1H\r\n"
+                   f"BEGIN:VEVENT\r\nUID:timetable-{intezmeny_id}-6@ordayna\r\nDTSTART:20201225T020202\r\nDTEND:20201225T040404\r\n"
+                   "RRULE:FREQ=WEEKLY;UNTIL=20201225T235959\r\nSUMMARY:test_lesson_updated\r\nLOCATION:test_room_updated\r\n"
+                   "DESCRIPTION:test_group_updated\\ntest_teacher_updated_no_user\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n" else "[Calendar of group 1]")
+    response = getSession().get(URL + feed_url, headers={"If-None-Match": response.headers.get("ETag", "")}, verify=False)
+    handleApiError("Get calendar, not modified", response, 304, "")
+    response = getSession().get(URL + feed_url[:-1] + ("0" if feed_url[-1:] != "0" else "1"), verify=False)
+    handleApiError("Get calendar, forged feed", response, 403, "Unauthorised")
+    response = getSession().get(URL + "/calendar.ics", verify=False)
+    handleApiError("Get calendar, no feed", response, 400, "Bad request")
+
+    # Newest first, homeworks published in the same second are ordered by id
     response = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}"})
-    handleApiError("Get homeworks", response, 200, '[{"id":1,"description":"test_updated","published":"' + response.json()[0]["published"] + '","due":"2021-11-23 03:03:03","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[{"id":1,"file_name":"test_file"},{"id":2,"file_name":"test_file"},{"id":3,"file_name":"test_file"}]},{"id":2,"description":"test","published":"' + response.json()[1]["published"] + '","due":"2020-12-24 02:02:02","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[]}]')
+    handleApiError("Get homeworks", response, 200, '[{"id":2,"description":"test","published":"' + response.json()[0]["published"] + '","due":"2020-12-24 02:02:02","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[]},{"id":1,"description":"test_updated","published":"' + response.json()[1]["published"] + '","due":"2021-11-23 03:03:03","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[{"id":1,"file_name":"test_file"},{"id":2,"file_name":"test_file"},{"id":3,"file_name":"test_file"}]}]')
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "limit": "1"})
+    handleApiError("Get homeworks, first page", response, 200, '[{"id":2,"description":"test","published":"' + response.json()[0]["published"] + '","due":"2020-12-24 02:02:02","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[]}]')
+    next_cursor = response.headers.get("X-Next-Cursor", "")
+    handleApiError("Get homeworks, first page has a next cursor", response, 200, response.text if next_cursor != "" else "[X-Next-Cursor]")
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "limit": "1", "cursor": next_cursor})
+    handleApiError("Get homeworks, last page", response, 200, '[{"id":1,"description":"test_updated","published":"' + response.json()[0]["published"] + '","due":"2021-11-23 03:03:03","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[{"id":1,"file_name":"test_file"},{"id":2,"file_name":"test_file"},{"id":3,"file_name":"test_file"}]}]')
+    handleApiError("Get homeworks, last page has no next cursor", response, 200, response.text if "X-Next-Cursor" not in response.headers else "[No X-Next-Cursor]")
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "due_from": "2021-01-01"})
+    handleApiError("Get homeworks, due from", response, 200, '[{"id":1,"description":"test_updated","published":"' + response.json()[0]["published"] + '","due":"2021-11-23 03:03:03","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[{"id":1,"file_name":"test_file"},{"id":2,"file_name":"test_file"},{"id":3,"file_name":"test_file"}]}]')
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "due_until": "2020-12-24"})
+    handleApiError("Get homeworks, due until includes the last day", response, 200, '[{"id":2,"description":"test","published":"' + response.json()[0]["published"] + '","due":"2020-12-24 02:02:02","group":{"id":1,"name":"test_group_updated","headcount":40,"class":{"id":1,"name":"test_class_updated"}},"lesson":{"id":1,"name":"test_lesson_updated"},"teacher":{"id":1,"name":"test_teacher_updated_no_user"},"attachments":[]}]')
+    testEndpoint("Get homeworks, filtered by group, lesson and teacher", "POST", "/intezmeny/get/homeworks", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "group_id": "1", "lesson_id": "1", "teacher_id": "2"}, 200, "[]")
+    testEndpoint("Get homeworks, due from after due until", "POST", "/intezmeny/get/homeworks", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "due_from": "2021-01-02", "due_until": "2021-01-01"}, 400, "Bad request")
+    testEndpoint("Get homeworks, limit 0", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "limit": "0"}, 400, "Bad request")
+    testEndpoint("Get homeworks, limit too large", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "limit": "501"}, 400, "Bad request")
+    testEndpoint("Get homeworks, invalid cursor", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "cursor": "not_a_cursor"}, 400, "Bad request")
+    testEndpoint("Get homeworks, cursor not string", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "cursor": [next_cursor]}, 400, "Bad request")
+    testEndpoint("Get homeworks, group_id is not numeric", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "group_id": "1a"}, 400, "Bad request")
+    testEndpoint("Get homeworks, invalid due_until", "POST", "/intezmeny/get/homeworks", access_jar, {"intezmeny_id": f"{intezmeny_id}", "due_until": "2025-13-24"}, 400, "Bad request")
     testId("Get homeworks", "POST", "/intezmeny/get/homeworks", {}, access_jar, "intezmeny_id", False, 200, True)
     testToken("Get homeworks", "POST", "/intezmeny/get/homeworks", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
     testEndpoint("Get homeworks, method not POST", "PATCH", "/intezmeny/get/homeworks", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
 
+    base = {"intezmeny_id": f"{intezmeny_id}"}
+    testEndpoint("Create group member", "POST", "/intezmeny/create/group_member", access_jar, base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 201, "")
+    testEndpoint("Create group member, already a member", "POST", "/intezmeny/create/group_member", access_jar,
+                 base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 400, "Already exists")
+    testEndpoint("Create group member, not admin", "POST", "/intezmeny/create/group_member", teacher_access_jar,
+                 base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 403, "Unauthorised")
+    testEndpoint("Create group member, user not part of the intezmeny", "POST", "/intezmeny/create/group_member", access_jar,
+                 base | {"group_id": "1", "member_uid": f"{student_uid}"}, 403, "Unauthorised")
+    testEndpoint("Create group member, group does not exist", "POST", "/intezmeny/create/group_member", access_jar,
+                 base | {"group_id": "999", "member_uid": f"{teacher_uid}"}, 400, "Bad request")
+    testId("Create group member", "POST", "/intezmeny/create/group_member", base | {"member_uid": f"{teacher_uid}"}, access_jar, "group_id", False, 201, False)
+    testToken("Create group member", "POST", "/intezmeny/create/group_member", base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, wrong_access_jar)
+
+    testEndpoint("Get group members", "POST", "/intezmeny/get/group_members", teacher_access_jar, base | {"group_id": "1"}, 200, f"[{teacher_uid}]")
+    testEndpoint("Get group members, group does not exist", "POST", "/intezmeny/get/group_members", access_jar, base | {"group_id": "999"}, 400, "Bad request")
+    testToken("Get group members", "POST", "/intezmeny/get/group_members", base | {"group_id": "1"}, wrong_access_jar)
+
+    # The personal views are the group's homeworks and timetable elements as the teacher is only a member of group 1
+    expected = testEndpointNoErrorHandling("POST", "/intezmeny/get/homeworks", access_jar, base | {"group_id": "1"}).text
+    testEndpoint("Get my homeworks", "POST", "/intezmeny/get/my_homeworks", teacher_access_jar, base, 200, expected)
+    testEndpoint("Get my homeworks, not a member of any group", "POST", "/intezmeny/get/my_homeworks", access_jar, base, 200, "[]")
+    testEndpoint("Get my homeworks, limit 0", "POST", "/intezmeny/get/my_homeworks", teacher_access_jar, base | {"limit": "0"}, 400, "Bad request")
+    testId("Get my homeworks", "POST", "/intezmeny/get/my_homeworks", {}, teacher_access_jar, "intezmeny_id", False, 200, True)
+    testToken("Get my homeworks", "POST", "/intezmeny/get/my_homeworks", base, wrong_access_jar)
+    expected = testEndpointNoErrorHandling("POST", "/intezmeny/get/timetable", access_jar, base | {"group_id": "1"}).text
+    testEndpoint("Get my timetable", "POST", "/intezmeny/get/my_timetable", teacher_access_jar, base, 200, expected)
+    testEndpoint("Get my timetable, not a member of any group", "POST", "/intezmeny/get/my_timetable", access_jar, base, 200, "[]")
+    testEndpoint("Get my timetable, day out of range", "POST", "/intezmeny/get/my_timetable", teacher_access_jar, base | {"day": "7"}, 400, "Bad request")
+    testId("Get my timetable", "POST", "/intezmeny/get/my_timetable", {}, teacher_access_jar, "intezmeny_id", False, 200, True)
+    testToken("Get my timetable", "POST", "/intezmeny/get/my_timetable", base, wrong_access_jar)
+    window = {"from": "2020-12-01", "until": "2021-11-30"}
+    expected = testEndpointNoErrorHandling("POST", "/intezmeny/get/occurrences", access_jar, base | window | {"group_id": "1"}).text
+    testEndpoint("Get occurrences, mine", "POST", "/intezmeny/get/occurrences", teacher_access_jar, base | window | {"mine": True}, 200, expected)
+
+    testEndpoint("Delete group member, not admin", "DELETE", "/intezmeny/delete/group_member", teacher_access_jar,
+                 base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 403, "Unauthorised")
+    testEndpoint("Delete group member", "DELETE", "/intezmeny/delete/group_member", access_jar, base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 204, "")
+    testEndpoint("Delete group member, not a member", "DELETE", "/intezmeny/delete/group_member", access_jar,
+                 base | {"group_id": "1", "member_uid": f"{teacher_uid}"}, 400, "Bad request")
+    testEndpoint("Get my homeworks, no longer a member", "POST", "/intezmeny/get/my_homeworks", teacher_access_jar, base, 200, "[]")
+
     testEndpoint("Get attachment", "POST", "/intezmeny/get/attachment", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"}, 200, "test_text test_text\ntest_text")
     testId("Get attachment", "POST", "/intezmeny/get/attachment", {"attachment_id": "1"}, access_jar, "intezmeny_id", False, 200, True)
@@ -778,6 +980,89 @@ def intezmenyGetEndpoints():
     testToken("Get attachment", "POST", "/intezmeny/get/attachment", {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"}, wrong_access_jar)
     testEndpoint("Get attachment, method not POST", "PATCH", "/intezmeny/get/attachment", access_jar,
                  {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "0"}, 405, "")
+    response = getSession().post(URL + "/intezmeny/get/attachment", json={"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"},
+                                 headers={"Range": "bytes=10-18"}, cookies=access_jar, verify=False)
+    handleApiError("Get attachment, range", response, 206, "test_text")
+    response = getSession().post(URL + "/intezmeny/get/attachment", json={"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"},
+                                 headers={"Range": "bytes=-9"}, cookies=access_jar, verify=False)
+    handleApiError("Get attachment, suffix range", response, 206, "test_text")
+    response = getSession().post(URL + "/intezmeny/get/attachment", json={"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"},
+                                 headers={"Range": "bytes=1000-"}, cookies=access_jar, verify=False)
+    handleApiError("Get attachment, range not satisfiable", response, 416, response.text)
+
+    contents = b"upload_text\x00\xff" * 100000
+    upload = {"intezmeny_id": f"{intezmeny_id}", "homework_id": "2", "file_name": "test_upload"}
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload, data=contents,
+                                 headers={"Content-Type": "application/octet-stream"}, cookies=access_jar, verify=False)
+    handleApiError("Upload attachment", response, 201,
+                   '{"id":' + f'{response.json()["id"] if response.status_code == 201 else 0}' + ',"sha256":"' + hashlib.sha256(contents).hexdigest() + '"}')
+    upload_id = response.json()["id"] if response.status_code == 201 else 0
+    response = getSession().post(URL + "/intezmeny/get/attachment", json={"intezmeny_id": f"{intezmeny_id}", "attachment_id": f"{upload_id}"},
+                                 cookies=access_jar, verify=False)
+    handleApiError("Get uploaded attachment", response, 200, response.text if response.content == contents else "[Uploaded contents]")
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload | {"file_name": "test_upload_again"}, data=contents,
+                                 headers={"Content-Type": "application/octet-stream"}, cookies=access_jar, verify=False)
+    handleApiError("Upload attachment, same contents again", response, 201,
+                   '{"id":' + f'{upload_id + 1}' + ',"sha256":"' + hashlib.sha256(contents).hexdigest() + '"}')
+    response = getSession().post(URL + "/intezmeny/get/attachment", json={"intezmeny_id": f"{intezmeny_id}", "attachment_id": f"{upload_id + 1}"},
+                                 cookies=access_jar, verify=False)
+    handleApiError("Get attachment uploaded again", response, 200, response.text if response.content == contents else "[Uploaded contents]")
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload | {"sha256": "0" * 64}, data=contents,
+                                 headers={"Content-Type": "application/octet-stream"}, cookies=access_jar, verify=False)
+    handleApiError("Upload attachment, sha256 does not match", response, 400, "Bad request")
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload | {"file_name": "test_upload\x00"}, data=contents,
+                                 headers={"Content-Type": "application/octet-stream"}, cookies=access_jar, verify=False)
+    handleApiError("Upload attachment, file name with illegal character", response, 400, "Bad request")
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload, data=contents, headers={"Content-Type": "application/octet-stream"},
+                                 cookies=student_access_jar, verify=False)
+    handleApiError("Upload attachment, not part of the intezmeny", response, 403, "Unauthorised")
+    response = getSession().post(URL + "/intezmeny/upload/attachment", params=upload, data=b"t" * (1024 * 1024 * 20 + 1),
+                                 headers={"Content-Type": "application/octet-stream"}, cookies=access_jar, verify=False)
+    handleApiError("Upload attachment, file too long", response, 413, response.text)
+
+
+def intezmenyBatchEndpoint():
+    operations = [{"op": "create/lesson", "data": {"name": "batch_lesson"}},
+                  {"op": "create/room", "data": {"name": "batch_room", "type": "test", "space": "20"}}]
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/batch", access_jar, {"intezmeny_id": f"{intezmeny_id}", "operations": operations})
+    ids = [result["id"] for result in response.json()["results"]] if response.status_code == 200 else [0, 0]
+    handleApiError("Batch", response, 200, '{"committed":true,"results":[{"status":201,"id":' + f'{ids[0]}' + '},{"status":201,"id":' + f'{ids[1]}' + '}]}')
+
+    # The membership has no id of its own, it must not get the id of the group created before it
+    operations = [{"op": "create/group", "data": {"name": "batch_group", "headcount": "20"}},
+                  {"op": "create/group_member", "data": {"group_id": "1", "member_uid": f"{teacher_uid}"}}]
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/batch", access_jar, {"intezmeny_id": f"{intezmeny_id}", "operations": operations})
+    group_id = response.json()["results"][0]["id"] if response.status_code == 200 else 0
+    handleApiError("Batch, create a group and a group member", response, 200, '{"committed":true,"results":[{"status":201,"id":' + f'{group_id}' + '},{"status":201}]}')
+    testEndpoint("Batch, created group member", "POST", "/intezmeny/get/group_members", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "group_id": "1"}, 200, f"[{teacher_uid}]")
+
+    operations = [{"op": "update/lesson", "data": {"lesson_id": f"{ids[0]}", "name": "batch_lesson_updated"}},
+                  {"op": "create/lesson", "data": {"name": "test_lesson_updated"}},
+                  {"op": "delete/room", "data": {"room_id": f"{ids[1]}"}}]
+    testEndpoint("Batch, failing operation rolls back the batch", "POST", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": operations}, 400,
+                 '{"committed":false,"results":[{"status":204},{"status":400,"body":"Already exists"},null]}')
+    response = testEndpointNoErrorHandling("POST", "/intezmeny/get/lessons", access_jar, {"intezmeny_id": f"{intezmeny_id}"})
+    handleApiError("Batch, rolled back update is not visible", response, 200,
+                   '[{"id":1,"name":"test_lesson_updated"},{"id":' + f'{ids[0]}' + ',"name":"batch_lesson"}]')
+
+    testEndpoint("Batch, unknown operation", "POST", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": [{"op": "create/homework", "data": {}}]}, 400, "Bad request")
+    testEndpoint("Batch, no operations", "POST", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": []}, 400, "Bad request")
+    testEndpoint("Batch, operations is not a list", "POST", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": {"op": "create/lesson"}}, 400, "Bad request")
+    testEndpoint("Batch, data is not an object", "POST", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": [{"op": "create/lesson", "data": "batch_lesson"}]}, 400, "Bad request")
+    testEndpoint("Batch, not admin", "POST", "/intezmeny/batch", teacher_access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": [{"op": "create/lesson", "data": {"name": "batch_lesson_2"}}]}, 403, "Unauthorised")
+    testId("Batch", "POST", "/intezmeny/batch", {"operations": [{"op": "create/lesson", "data": {"name": "batch_lesson_3"}}]},
+           access_jar, "intezmeny_id", False, 200, True)
+    testToken("Batch", "POST", "/intezmeny/batch",
+              {"intezmeny_id": f"{intezmeny_id}", "operations": [{"op": "create/lesson", "data": {"name": "batch_lesson_4"}}]}, wrong_access_jar)
+    testEndpoint("Batch, method not POST", "PATCH", "/intezmeny/batch", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "operations": [{"op": "create/lesson", "data": {"name": "batch_lesson_5"}}]}, 405, "")
 
 
 def intezmenyDeleteEndpoints():
@@ -786,6 +1071,9 @@ def intezmenyDeleteEndpoints():
     global intezmeny_id
 
     testEndpoint("Delete attachment", "DELETE", "/intezmeny/delete/attachment", access_jar, {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"}, 204, "")
+    # Attachment 2 has the same contents, they are stored once and still referenced by it
+    testEndpoint("Get attachment with the same contents as a deleted one", "POST", "/intezmeny/get/attachment", access_jar,
+                 {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "2"}, 200, "test_text test_text\ntest_text")
     testId("Delete attachment", "DELETE", "/intezmeny/delete/attachment", {"attachment_id": "1"}, access_jar, "intezmeny_id", False, 204, True)
     testId("Delete attachment", "DELETE", "/intezmeny/delete/attachment", {"intezmeny_id": f"{intezmeny_id}"}, access_jar, "attachment_id", False, 204, False)
     testToken("Delete attachment", "DELETE", "/intezmeny/delete/attachment", {"intezmeny_id": f"{intezmeny_id}", "attachment_id": "1"}, wrong_access_jar)
@@ -846,8 +1134,24 @@ def deleteIntezmeny():
     global wrong_access_jar
     global intezmeny_id
 
-    testEndpoint("Delete intezmeny", "DELETE", "/delete_intezmeny", access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 204, "")
-    testId("Delete intezmeny", "DELETE", "/delete_intezmeny", {}, access_jar, "intezmeny_id", False, 204, True)
+    response = testEndpointNoErrorHandling("DELETE", "/delete_intezmeny", access_jar, {"intezmeny_id": f"{intezmeny_id}"})
+    job_id = response.json()["job_id"] if response.status_code == 202 else 0
+    handleApiError("Delete intezmeny", response, 202, '{"job_id":' + f'{job_id}' + '}')
+    response = testEndpointNoErrorHandling("GET", "/get_intezmenys", access_jar, {})
+    handleApiError("Get intezmenys, deleted intezmeny is gone at once", response, 200,
+                   response.text if intezmeny_id not in [intezmeny["id"] for intezmeny in response.json()] else "[Without the deleted intezmeny]")
+    # The schema is dropped by the job worker, the job is done unless no worker ran since
+    response = testEndpointNoErrorHandling("POST", "/get_job", access_jar, {"job_id": f"{job_id}"})
+    job = response.json() if response.status_code == 200 else {"status": "", "attempts": 0, "created": "", "finished": None}
+    handleApiError("Get job", response, 200,
+                   '{"id":' + f'{job_id}' + ',"type":"delete_intezmeny","status":"' + job["status"] + '","attempts":' + f'{job["attempts"]}'
+                   + ',"created":"' + job["created"] + '","finished":' + ("null" if job["finished"] is None else '"' + job["finished"] + '"') + '}')
+    if (job["status"] not in ("queued", "running", "done")):
+        handleApiError("Get job, job has not failed", response, 200, "[A queued, running or done job]")
+    testId("Get job", "POST", "/get_job", {}, access_jar, "job_id", False, 200, True)
+    testToken("Get job", "POST", "/get_job", {"job_id": f"{job_id}"}, wrong_access_jar)
+    testEndpoint("Get job, method is not POST", "PATCH", "/get_job", access_jar, {"job_id": f"{job_id}"}, 405, "")
+    testId("Delete intezmeny", "DELETE", "/delete_intezmeny", {}, access_jar, "intezmeny_id", False, 202, True)
     testToken("Delete intezmeny", "DELETE", "/delete_intezmeny", {"intezmeny_id": f"{intezmeny_id}"}, wrong_access_jar)
     testEndpoint("Delete intezmeny, method is not DELETE", "PATCH", "/delete_intezmeny", access_jar, {"intezmeny_id": f"{intezmeny_id}"}, 405, "")
 
@@ -862,20 +1166,66 @@ def deleteUser():
     testEndpoint("Delete user, user does not exist", "DELETE", "/user/delete", access_jar, {"pass": "tester_pass+"}, 403, "Unauthorised")
 
 
-def cleanup():
-    global teacher_access_jar
-    global student_access_jar
+def adminFixture():
+    """Creates the suite's admin user the same way createUser, tokens and changeUserData leave it"""
+    global refresh_jar
+    global access_jar
+    global wrong_access_jar
 
+    testEndpoint("Create admin user", "POST", "/user/create", "",
+                 {"disp_name": "testerer", "email": f"{email_prefix}tester@test.com", "pass": "tester_pass+"}, 201, "")
+    refresh_jar = testEndpoint("Get admin refresh token", "POST", "/token/get_refresh_token", "",
+                 {"email": f"{email_prefix}tester@test.com", "pass": "tester_pass+"}, 200, "").cookies
+    wrong_access_jar = refresh_jar.copy()
+    for cookie in wrong_access_jar:
+        if cookie.name == 'RefreshToken':
+            cookie.name = "AccessToken"
+            cookie.path = "/"
+            break
+    access_jar = testEndpoint("Get admin access token", "GET", "/token/get_access_token", refresh_jar, {}, 200, "").cookies
+
+
+def intezmenyFixture():
+    global intezmeny_id
+
+    testEndpoint("Create intezmeny", "POST", "/create_intezmeny", access_jar, {"intezmeny_name": "tester_intezmeny"}, 201, "")
+    response = testEndpointNoErrorHandling("GET", "/get_intezmenys", access_jar, {})
+    intezmeny_id = response.json()[len(response.json()) - 1]["id"]
+    handleApiError("Get intezmenys", response, 200, '[{"id":' + f'{intezmeny_id}' + ',"name":"tester_intezmeny"}]')
+
+
+def cleanupUser():
     no_phone_refresh_jar = dict()
     no_phone_access_jar = dict()
 
     no_phone_refresh_jar = testEndpoint("Get refresh token for no phone user", "POST", "/token/get_refresh_token", "",
-                                        {"email": "tester_no_phone@test.com", "pass": "tester_pass+"}, 200, "").cookies
+                                        {"email": f"{email_prefix}tester_no_phone@test.com", "pass": "tester_pass+"}, 200, "").cookies
     no_phone_access_jar = testEndpoint("Get access token for no phone user", "GET", "/token/get_access_token", no_phone_refresh_jar, {}, 200, "").cookies
     testEndpoint("Delete no phone number user", "DELETE", "/user/delete", no_phone_access_jar, {"pass": "tester_pass+"}, 204, "")
+
+
+def cleanupAdmin():
+    testEndpoint("Delete admin user", "DELETE", "/user/delete", access_jar, {"pass": "tester_pass+"}, 204, "")
+
+
+def cleanupIntezmenyUsers():
+    global teacher_access_jar
+    global student_access_jar
+
     testEndpoint("Delete teacher user", "DELETE", "/user/delete", teacher_access_jar, {"pass": "tester_pass+"}, 204, "")
     testEndpoint("Delete student user", "DELETE", "/user/delete", student_access_jar, {"pass": "tester_pass+"}, 204, "")
+    # Deleting the admin also deletes the intezmeny as it has no admin left
+    cleanupAdmin()
 
 
-main()
-    
+# The stages of a suite run in order and share the suite's globals, suites run in parallel
+SUITES = {
+    "user": [createUser, tokens, changeUserData, deleteUser, cleanupUser],
+    "intezmeny": [adminFixture, createIntezmeny, deleteIntezmeny, cleanupAdmin],
+    "intezmeny_data": [adminFixture, intezmenyFixture, intezmenyUserEndpoints, intezmenyCreateEndpoints, intezmenyUpdateEndpoints,
+                       intezmenyGetEndpoints, intezmenyBatchEndpoint, intezmenyDeleteEndpoints, cleanupIntezmenyUsers],
+}
+
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,36 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Autoload;
+
+require_once __DIR__ . "/vendor/autoload.php";
+
+/**
+ * The models are loaded when a route first uses them instead of every request loading all of them
+ * Every class is already declared when the web server preloads them (see preload.php) and then this is never called
+ */
+const CLASSES = array(
+    "Attachment\\Attachment" => "models/attachment.php",
+    "Availability\\Availability" => "models/availability.php",
+    "Blob\\Blob" => "models/blob.php",
+    "Calendar\\Calendar" => "models/calendar.php",
+    "Class_\\Class_" => "models/class.php",
+    "Group\\Group" => "models/group.php",
+    "Homework\\Homework" => "models/homework.php",
+    "Homework\\Teacher" => "models/homework.php",
+    "Intezmeny\\Intezmeny" => "models/intezmeny.php",
+    "Job\\Job" => "models/job.php",
+    "Lesson\\Lesson" => "models/lesson.php",
+    "Room\\Room" => "models/room.php",
+    "Teacher\\Teacher" => "models/teacher.php",
+    "Timetable\\TimetableClash" => "models/timetable_element.php",
+    "Timetable\\TimetableElement" => "models/timetable_element.php",
+    "Timetable\\TimetableOccurrence" => "models/timetable_element.php",
+    "User\\Invite" => "models/user.php",
+    "User\\User" => "models/user.php",
+);
+
+spl_autoload_register(function (string $class): void {
+    if (array_key_exists($class, CLASSES)) require_once __DIR__ . "/" . CLASSES[$class];
+});
@@ -0,0 +1,126 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Cache;
+
+use APCUIterator;
+
+/**
+ * Shared memory cache of per user authentication data and of read responses, backed by APCu
+ * Every method is a no-op (every fetch is a miss) when APCu is not available so callers always fall back to the database
+ * APCu is local to the php process pool so with more than one web server the TTL is the upper bound of staleness for
+ * changes made through another server
+ */
+class Cache
+{
+    /** Seconds a cached value is trusted for */
+    const TTL = 30;
+    /** Seconds an unused response is kept for, responses are keyed by the data version so they never go stale */
+    const RESPONSE_TTL = 3600;
+    const PREFIX = "ordayna:";
+
+    public static function enabled(): bool
+    {
+        return function_exists("apcu_enabled") && apcu_enabled();
+    }
+
+    /**
+     * Returns the current generation of the user's cached values or null if caching is disabled
+     * A missing generation is started from a never before used value so that values cached before an eviction can't be revived
+     */
+    public static function userGeneration(int $uid): int|null
+    {
+        if (Cache::enabled() === false) return null;
+        $key = Cache::PREFIX . "generation:" . $uid;
+        $generation = apcu_fetch($key, $success);
+        if ($success === true) return $generation;
+        apcu_add($key, hrtime(true));
+        $generation = apcu_fetch($key, $success);
+        return $success === true ? $generation : null;
+    }
+
+    /** Invalidates every value cached for the user */
+    public static function bumpUserGeneration(int $uid): void
+    {
+        if (Cache::enabled() === false) return;
+        $key = Cache::PREFIX . "generation:" . $uid;
+        if (apcu_inc($key) === false) apcu_store($key, hrtime(true));
+        Cache::count("generation_bumps");
+    }
+
+    /**
+     * Returns the cached value or null on a miss
+     * $generation is set to the generation that has to be passed to storeUserValue if the value is loaded from the database
+     */
+    public static function fetchUserValue(int $uid, string $kind, string $key, int|null &$generation): int|bool|null
+    {
+        $generation = Cache::userGeneration($uid);
+        if ($generation === null) return null;
+        $value = apcu_fetch(Cache::PREFIX . "$kind:$uid:$generation:$key", $success);
+        Cache::count($kind . ($success === true ? "_hits" : "_misses"));
+        return $success === true ? $value : null;
+    }
+
+    public static function storeUserValue(int $uid, string $kind, string $key, int|bool $value, int|null $generation): void
+    {
+        if ($generation === null) return;
+        apcu_store(Cache::PREFIX . "$kind:$uid:$generation:$key", $value, Cache::TTL);
+    }
+
+    /** Returns the cached response of an intezmeny's read endpoint or null on a miss */
+    public static function fetchResponse(int $intezmeny_id, int $data_version, string $key): string|null
+    {
+        if (Cache::enabled() === false) return null;
+        $value = apcu_fetch(Cache::PREFIX . "response:$intezmeny_id:$data_version:$key", $success);
+        Cache::count("response" . ($success === true ? "_hits" : "_misses"));
+        return $success === true ? $value : null;
+    }
+
+    public static function storeResponse(int $intezmeny_id, int $data_version, string $key, string $response): void
+    {
+        if (Cache::enabled() === false) return;
+        apcu_store(Cache::PREFIX . "response:$intezmeny_id:$data_version:$key", $response, Cache::RESPONSE_TTL);
+    }
+
+    public static function count(string $counter, int $step = 1): void
+    {
+        Cache::increment("counter:" . $counter, $step);
+    }
+
+    /** Returns every counter by name */
+    public static function counters(): array
+    {
+        return Cache::values("counter:");
+    }
+
+    /** Same as count but for the per route metrics of Metrics, kept apart so /stats stays small */
+    public static function countMetric(string $metric, int $step = 1): void
+    {
+        Cache::increment("metric:" . $metric, $step);
+    }
+
+    /** Returns every metric by name */
+    public static function metrics(): array
+    {
+        return Cache::values("metric:");
+    }
+
+    private static function increment(string $key, int $step): void
+    {
+        if (Cache::enabled() === false) return;
+        apcu_add(Cache::PREFIX . $key, 0);
+        apcu_inc(Cache::PREFIX . $key, $step);
+    }
+
+    private static function values(string $group): array
+    {
+        $values = array();
+        if (Cache::enabled() === false) return $values;
+        foreach (new APCUIterator('/^' . preg_quote(Cache::PREFIX . $group, "/") . '/') as $entry) {
+            $values[substr($entry["key"], strlen(Cache::PREFIX . $group))] = $entry["value"];
+        }
+        ksort($values);
+        return $values;
+    }
+}
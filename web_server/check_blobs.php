@@ -0,0 +1,240 @@
+<?php
+
+// Checks the blob store (see models/blob.php) against the attachments of every intezmeny
+// Reports reference counts that differ from the attachments referring to the blob, referenced blobs whose file is missing,
+// files without a blob and unreferenced blobs
+// --repair corrects the reference counts and removes the unreferenced blobs and the leftovers of interrupted uploads once
+// they are older than Blob::GRACE_SECONDS, it's meant to be run periodically (e.g. hourly from cron)
+// --verify also rehashes every file, corrupted files are only reported
+// --migrate first moves the attachments from before the blob store (user_data/intezmeny_N/<file_name>_<id>) into it
+// Usage: php check_blobs.php [--repair] [--verify] [--migrate]
+
+declare(strict_types=1);
+
+namespace CheckBlobs;
+
+chdir(__DIR__);
+
+require_once "db.php";
+require_once "models/attachment.php";
+require_once "models/blob.php";
+
+use Attachment\Attachment;
+use Blob\Blob;
+use DB\DB;
+
+if (PHP_SAPI !== "cli") exit(1);
+
+const USAGE = "Usage: php check_blobs.php [--repair] [--verify] [--migrate]\n";
+
+$options = array_slice($argv, 1);
+if (count(array_diff($options, array("--repair", "--verify", "--migrate"))) !== 0) {
+    fwrite(STDERR, USAGE);
+    exit(1);
+}
+$repair = in_array("--repair", $options, true);
+$verify = in_array("--verify", $options, true);
+$migrate = in_array("--migrate", $options, true);
+
+function olderThanGrace(string $path): bool
+{
+    $mtime = @filemtime($path);
+    return $mtime !== false and $mtime < time() - Blob::GRACE_SECONDS;
+}
+
+function rmdirRecursive(string $dir): bool
+{
+    $objects = scandir($dir);
+    if ($objects === false) return false;
+    foreach ($objects as $object) {
+        if ($object === "." or $object === "..") continue;
+        if (is_dir("$dir/$object") and is_link("$dir/$object") === false) {
+            if (rmdirRecursive("$dir/$object") === false) return false;
+        } elseif (unlink("$dir/$object") === false) return false;
+    }
+    return rmdir($dir);
+}
+
+$db = DB::init();
+if ($db === null) {
+    fwrite(STDERR, "Could not connect to the database\n");
+    exit(1);
+}
+if ($db->selectDb('ordayna_main_db') === null) exit(1);
+// Every schema is checked, the ones of deleted intezmenys still refer to their blobs until their job drops them
+$ids = $db->handleQueryResult($db->connection->query(
+    "SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE SCHEMA_NAME LIKE 'ordayna\\_intezmeny\\_%'"
+));
+if ($ids === null) exit(1);
+$ids = array_map(fn($row) => (int) substr($row[0], strlen("ordayna_intezmeny_")), $ids);
+sort($ids);
+
+// Problems that are left as they are
+$problems = 0;
+
+if ($migrate) {
+    $migrated = 0;
+    foreach ($ids as $intezmeny_id) {
+        $legacy = Attachment::getLegacyAttachments($db, $intezmeny_id);
+        if ($legacy === null) {
+            fwrite(STDERR, "Listing the attachments of intezmeny $intezmeny_id failed\n");
+            $problems++;
+            continue;
+        }
+        $failed = 0;
+        foreach ($legacy as $row) {
+            $path = Blob::ROOT . "/intezmeny_$intezmeny_id/" . $row[1] . "_" . $row[0];
+            $sha256 = @hash_file("sha256", $path);
+            $size = @filesize($path);
+            if ($sha256 === false or $size === false) {
+                fwrite(STDERR, "The file of attachment $row[0] of intezmeny $intezmeny_id is missing ($path)\n");
+                $failed++;
+                continue;
+            }
+            if (Blob::storeFile($path, $sha256) === false or Attachment::setLegacyAttachmentBlob($db, $intezmeny_id, (int) $row[0], $sha256, $size) === null) {
+                fwrite(STDERR, "Moving attachment $row[0] of intezmeny $intezmeny_id into the blob store failed\n");
+                $failed++;
+                continue;
+            }
+            $migrated++;
+        }
+        $problems += $failed;
+        // Whatever is left are the files of attachments deleted by a lesson or teacher being deleted, nothing refers to them
+        if ($failed === 0 and is_dir(Blob::ROOT . "/intezmeny_$intezmeny_id") and rmdirRecursive(Blob::ROOT . "/intezmeny_$intezmeny_id") === false) {
+            fwrite(STDERR, "Removing " . Blob::ROOT . "/intezmeny_$intezmeny_id failed\n");
+            $problems++;
+        }
+    }
+    // The directories of intezmenys that were deleted before the blob store
+    foreach (glob(Blob::ROOT . "/intezmeny_*", GLOB_ONLYDIR) ?: array() as $dir) {
+        if (in_array((int) substr(basename($dir), strlen("intezmeny_")), $ids, true)) continue;
+        if (rmdirRecursive($dir) === false) {
+            fwrite(STDERR, "Removing $dir failed\n");
+            $problems++;
+        }
+    }
+    echo "Moved $migrated attachments into the blob store\n";
+}
+
+// Attachments created or deleted while this runs make their counts look wrong, a count lowered by mistake only starts
+// the grace period so the next run corrects it before the blob could be collected
+$references = array();
+foreach ($ids as $intezmeny_id) {
+    $counted = Blob::countReferences($db, $intezmeny_id);
+    if ($counted === null) {
+        // A job dropped the schema in the meantime, its references were released before
+        $ret = $db->handleQueryResult($db->connection->execute_query(
+            'SELECT EXISTS(SELECT * FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = ?)',
+            array("ordayna_intezmeny_$intezmeny_id")
+        ));
+        if ($ret !== null and $ret[0][0] === 0) continue;
+        fwrite(STDERR, "Counting the references of intezmeny $intezmeny_id failed\n");
+        exit(1);
+    }
+    foreach ($counted as $sha256 => $count) $references[$sha256] = ($references[$sha256] ?? 0) + $count;
+}
+$blobs = Blob::getBlobs($db);
+if ($blobs === null) exit(1);
+
+$recounted = 0;
+$collected = 0;
+$known = array();
+foreach ($blobs as list($sha256, $size, $ref_count, $released_ago)) {
+    $known[$sha256] = true;
+    $count = $references[$sha256] ?? 0;
+    $exists = is_file(Blob::path($sha256));
+    if ($count !== 0 and $exists === false) {
+        fwrite(STDERR, "Blob $sha256 is referenced $count times but its file is missing\n");
+        $problems++;
+    }
+    if ($count !== $ref_count) {
+        echo "Blob $sha256 has a reference count of $ref_count but $count references\n";
+        if ($repair === false) {
+            $problems++;
+            continue;
+        }
+        if (Blob::setRefCount($db, $sha256, $size, $count) === null) exit(1);
+        $recounted++;
+        continue;
+    }
+    if ($count !== 0 or $repair === false or ($released_ago !== null and $released_ago < Blob::GRACE_SECONDS)) continue;
+    $deleted = Blob::deleteUnreferenced($db, $sha256);
+    if ($deleted === null) exit(1);
+    // An upload of the same contents touches the file, it's kept for the row the upload creates
+    if ($deleted and $exists and olderThanGrace(Blob::path($sha256))) {
+        if (Blob::deleteFile($sha256) === false) {
+            fwrite(STDERR, "Removing the file of blob $sha256 failed\n");
+            $problems++;
+            continue;
+        }
+    }
+    if ($deleted) $collected++;
+}
+
+foreach ($references as $sha256 => $count) {
+    if (isset($known[$sha256])) continue;
+    $size = @filesize(Blob::path($sha256));
+    if ($size === false) {
+        fwrite(STDERR, "Blob $sha256 is referenced $count times but it's unknown and its file is missing\n");
+        $problems++;
+        continue;
+    }
+    echo "Blob $sha256 is referenced $count times but it's unknown\n";
+    if ($repair === false) {
+        $problems++;
+        continue;
+    }
+    if (Blob::setRefCount($db, $sha256, $size, $count) === null) exit(1);
+    $known[$sha256] = true;
+    $recounted++;
+}
+
+$checked = 0;
+$removed = 0;
+$shards = glob(Blob::ROOT . "/" . Blob::DIR . "/[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]", GLOB_ONLYDIR) ?: array();
+foreach ($shards as $shard) {
+    foreach (scandir($shard) as $name) {
+        if ($name === "." or $name === "..") continue;
+        $path = "$shard/$name";
+        if (Blob::isHash($name) === false or Blob::path($name) !== $path) {
+            echo "$path is not a blob\n";
+            $problems++;
+            continue;
+        }
+        $checked++;
+        if ($verify and hash_file("sha256", $path) !== $name) {
+            fwrite(STDERR, "The contents of blob $name don't match its hash\n");
+            $problems++;
+        }
+        if (isset($known[$name])) continue;
+        // Files of uploads whose attachment isn't created yet are new or touched
+        if (olderThanGrace($path) === false) continue;
+        echo "Blob $name has a file but is unknown\n";
+        if ($repair === false) {
+            $problems++;
+            continue;
+        }
+        if (unlink($path) === false) {
+            $problems++;
+            continue;
+        }
+        $removed++;
+    }
+}
+foreach (glob(Blob::ROOT . "/" . Blob::TMP_DIR . "/*") ?: array() as $path) {
+    if (olderThanGrace($path) === false) continue;
+    echo "$path is left from an interrupted upload\n";
+    if ($repair === false) {
+        $problems++;
+        continue;
+    }
+    if (unlink($path) === false) {
+        $problems++;
+        continue;
+    }
+    $removed++;
+}
+
+echo "Checked " . count($blobs) . " blobs and $checked files, corrected $recounted reference counts, "
+    . "collected $collected unreferenced blobs and removed $removed stray files, $problems problems left\n";
+exit($problems === 0 ? 0 : 1);
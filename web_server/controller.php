@@ -8,21 +8,19 @@ namespace Controller;
 
 require_once "db.php";
 require_once "jwt.php";
-require_once "models/user.php";
-require_once "models/class.php";
-require_once "models/group.php";
-require_once "models/room.php";
-require_once "models/lesson.php";
-require_once "models/teacher.php";
-require_once "models/homework.php";
-require_once "models/attachment.php";
-require_once "models/intezmeny.php";
-require_once "models/timetable_element.php";
+require_once "cache.php";
+require_once "metrics.php";
+// The models are loaded by autoload.php when a route first uses them
+require_once "autoload.php";
 
+use Cache\Cache;
 use Class_\Class_;
+use Config\Config;
 use DB\DB;
 use JWT\JWT;
 use DateTimeImmutable;
+use DateTimeZone;
+use Exception;
 use Group\Group;
 use Room\Room;
 use Teacher\Teacher;
@@ -30,10 +28,18 @@ use User\User;
 use Lesson\Lesson;
 use Homework\Homework;
 use Attachment\Attachment;
+use Blob\Blob;
+use Calendar\Calendar;
 use Intezmeny\Intezmeny;
+use Job\Job;
 use Timetable\TimetableElement;
+use stdClass;
 use ValueError;
 
+use Error\Log;
+use Metrics\Metrics;
+use function Error\logError;
+
 use Lcobucci\JWT\Token\RegisteredClaims;
 use Lcobucci\JWT\UnencryptedToken;
 
@@ -42,6 +48,48 @@ static $max_file_size = 1024 * 1024 * 20;
 
 class Controller
 {
+    /** The operations /intezmeny/batch accepts and the endpoints that carry them out */
+    const BATCH_OPERATIONS = array(
+        "create/class" => "createClass",
+        "create/group" => "createGroup",
+        "create/group_member" => "createGroupMember",
+        "create/lesson" => "createLesson",
+        "create/room" => "createRoom",
+        "create/teacher" => "createTeacher",
+        "create/timetable_element" => "createTimetableElement",
+        "update/class" => "updateClass",
+        "update/group" => "updateGroup",
+        "update/lesson" => "updateLesson",
+        "update/room" => "updateRoom",
+        "update/teacher" => "updateTeacher",
+        "update/timetable_element" => "updateTimetableElement",
+        "delete/class" => "deleteClass",
+        "delete/group" => "deleteGroup",
+        "delete/group_member" => "deleteGroupMember",
+        "delete/lesson" => "deleteLesson",
+        "delete/room" => "deleteRoom",
+        "delete/teacher" => "deleteTeacher",
+        "delete/timetable_element" => "deleteTimetableElement",
+    );
+    /** The batch operations that create a row without an id of its own, their results have no id */
+    const BATCH_KEYLESS_CREATES = array("create/group_member");
+    const BATCH_MAX_OPERATIONS = 1000;
+    /** The collections /intezmeny/get/snapshot can return, users is admin only */
+    const SNAPSHOT_COLLECTIONS = array("classes", "groups", "lessons", "rooms", "teachers", "homeworks", "users", "profile");
+    /** The homeworks on a page of /intezmeny/get/homeworks when no limit is given and the most that can be asked for */
+    const HOMEWORK_PAGE_SIZE = 100;
+    const HOMEWORK_MAX_PAGE_SIZE = 500;
+    /** The longest window /intezmeny/get/occurrences expands, a school year fits */
+    const OCCURRENCES_MAX_DAYS = 366;
+    /** How long shared caches (the nginx microcache included) may serve a calendar feed without revalidating it */
+    const CALENDAR_MAX_AGE = 60;
+
+    /**
+     * Set while /intezmeny/batch carries out its operations
+     * array("db" => DB, "intezmeny_id" => int, "uid" => int, "data" => the current operation's data)
+     */
+    private static array|null $batch = null;
+
     public static function getRefreshToken(): null
     {
         $data = json_decode(file_get_contents("php://input"));
@@ -53,34 +101,25 @@ class Controller
         $db = DB::init();
         if ($db === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $ret = User::userExistsViaEmail($db, $email);
+        $ret = User::getLoginCredentials($db, $email);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-
-        $user = User::getUserViaEmail($db, $email);
-        if ($user === null) return handleReturn(ControllerRet::unexpected_error);
-
-        $pass_hash = User::getUserPasswordHash($db, $user->id);
-        if ($pass_hash === null) return handleReturn(ControllerRet::unexpected_error);
+        list($uid, $pass_hash, $token_generation) = $ret;
         if (password_verify($pass, $pass_hash) === false) return handleReturn(ControllerRet::unauthorised);
 
-        if (password_needs_rehash($pass_hash, PASSWORD_DEFAULT)) {
-            $new_pass_hash = password_hash($pass, PASSWORD_DEFAULT);
-            if ($new_pass_hash === false) return handleReturn(ControllerRet::unexpected_error);
-            if ($new_pass_hash === null) return handleReturn(ControllerRet::unexpected_error);
-            if (User::changePasswordHash($db, $user->id, $new_pass_hash) === null) return handleReturn(ControllerRet::unexpected_error);
+        // Hashes made with older parameters are replaced after the response was sent so the login doesn't wait for the
+        // second (and possibly more expensive) hash
+        if (Controller::passwordNeedsRehash($pass_hash)) {
+            register_shutdown_function(function () use ($db, $uid, $pass) {
+                $new_pass_hash = Controller::passwordHash($pass);
+                if ($new_pass_hash !== null) User::changePasswordHash($db, $uid, $new_pass_hash);
+                Log::flush();
+            });
         }
 
         $jwt = JWT::init();
         if ($jwt === false) return handleReturn(ControllerRet::unexpected_error);
-        $refresh_token = $jwt->createRefreshToken($user->id);
-
-        if (User::newToken(
-            $db,
-            $refresh_token->claims()->get("uid"),
-            $refresh_token->claims()->get(RegisteredClaims::ID),
-            $refresh_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)
-        ) === null) return handleReturn(ControllerRet::unexpected_error);
+        $refresh_token = $jwt->createRefreshToken($uid, $token_generation);
 
         $age = $refresh_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)->getTimestamp();
         $age -= $refresh_token->claims()->get(RegisteredClaims::ISSUED_AT)->getTimestamp();
@@ -107,18 +146,18 @@ class Controller
         if ($jwt === false) return handleReturn(ControllerRet::unexpected_error);
         $token = Controller::validateRefreshToken($db, $jwt);
         if (is_a($token, "Controller\ControllerRet") === true) return handleReturn($token);
-        $new_token = $jwt->createRefreshToken($token->claims()->get("uid"));
 
-        if (User::newToken(
+        $ret = User::revokeToken(
             $db,
-            $new_token->claims()->get("uid"),
-            $new_token->claims()->get(RegisteredClaims::ID),
-            $new_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)
-        ) === null) return handleReturn(ControllerRet::unexpected_error);
+            $token->claims()->get("uid"),
+            $token->claims()->get(RegisteredClaims::ID),
+            $token->claims()->get(RegisteredClaims::EXPIRATION_TIME)
+        );
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        // Another request rotated the same token first
+        if ($ret === false) return handleReturn(Controller::revokeTokenFamily($db, $token));
 
-        if (User::revokeToken($db, $token->claims()->get("uid"), $token->claims()->get(RegisteredClaims::ID)) === null) {
-            return handleReturn(ControllerRet::unexpected_error);
-        }
+        $new_token = $jwt->createRefreshToken($token->claims()->get("uid"), $token->claims()->get("gen"), $token->claims()->get("fam"));
 
         $age = $new_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)->getTimestamp();
         $age -= $new_token->claims()->get(RegisteredClaims::ISSUED_AT)->getTimestamp();
@@ -145,14 +184,9 @@ class Controller
         if ($jwt === false) return handleReturn(ControllerRet::unexpected_error);
         $token = Controller::validateRefreshToken($db, $jwt);
         if (is_a($token, "Controller\ControllerRet") === true) return handleReturn($token);
-        $new_access_token = $jwt->createAccessToken($token->claims()->get("uid"));
+        // Access tokens are not stored, they are checked against the user's token generation only
+        $new_access_token = $jwt->createAccessToken($token->claims()->get("uid"), $token->claims()->get("gen"));
 
-        if (User::newToken(
-            $db,
-            $new_access_token->claims()->get("uid"),
-            $new_access_token->claims()->get(RegisteredClaims::ID),
-            $new_access_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)
-        ) === null) return handleReturn(ControllerRet::unexpected_error);
         $age = $new_access_token->claims()->get(RegisteredClaims::EXPIRATION_TIME)->getTimestamp();
         $age -= $new_access_token->claims()->get(RegisteredClaims::ISSUED_AT)->getTimestamp();
         header(
@@ -189,8 +223,7 @@ class Controller
         if ($ret === true) return handleReturn(ControllerRet::already_exists);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $pass_hash = password_hash($pass, PASSWORD_BCRYPT);
-        if ($pass_hash === false) return handleReturn(ControllerRet::unexpected_error);
+        $pass_hash = Controller::passwordHash($pass);
         if ($pass_hash === null) return handleReturn(ControllerRet::unexpected_error);
         if (User::createUser($db, $disp_name, $email, $phone_number, $pass_hash) === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -254,11 +287,7 @@ class Controller
         if (password_verify($pass, $pass_hash) === false) return handleReturn(ControllerRet::unauthorised);
 
         if (User::deleteUser($db, $token->claims()->get("uid")) === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Intezmeny::deleteOrphanedIntezmenys($db);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        for ($i = 0; $i < count($ret); $i++) {
-            if (rmdirRecursive("user_data/intezmeny_" . $ret[$i]) === false) return handleReturn(ControllerRet::unexpected_error);
-        }
+        if (Intezmeny::deleteOrphanedIntezmenys($db) === null) return handleReturn(ControllerRet::unexpected_error);
 
         if (User::revokeAllTokens($db, $token->claims()->get("uid")) === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -346,8 +375,7 @@ class Controller
         if ($pass_hash === null) return handleReturn(ControllerRet::unexpected_error);
         if (password_verify($pass, $pass_hash) === false) return handleReturn(ControllerRet::unauthorised);
 
-        $new_pass_hash = password_hash($new_pass, PASSWORD_DEFAULT);
-        if ($new_pass_hash === false) return handleReturn(ControllerRet::unexpected_error);
+        $new_pass_hash = Controller::passwordHash($new_pass);
         if ($new_pass_hash === null) return handleReturn(ControllerRet::unexpected_error);
         if (User::changePasswordHash($db, $token->claims()->get("uid"), $new_pass_hash) === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -402,6 +430,7 @@ class Controller
         $data = json_decode(file_get_contents("php://input"));
         $intezmeny_id = Controller::validateInteger(@$data->intezmeny_id);
         if ($intezmeny_id === null) return handleReturn(ControllerRet::bad_request);
+        Log::setIntezmenyId($intezmeny_id);
 
         $db = DB::init();
         if ($db === null) return handleReturn(ControllerRet::unexpected_error);
@@ -411,9 +440,6 @@ class Controller
         $token = Controller::validateAccessToken($db, $jwt);
         if (is_a($token, "Controller\ControllerRet") === true) return handleReturn($token);
 
-        $ret = User::userExists($db, $token->claims()->get("uid"));
-        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
         $ret = User::partOfIntezmeny($db, $intezmeny_id, $token->claims()->get("uid"), true);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
@@ -421,10 +447,41 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        if (Intezmeny::deleteIntezmeny($db, $intezmeny_id) === null) return handleReturn(ControllerRet::unexpected_error);
-        if (rmdirRecursive("user_data/intezmeny_$intezmeny_id") === false) return handleReturn(ControllerRet::unexpected_error);
+        $job_id = Intezmeny::deleteIntezmeny($db, $intezmeny_id, $token->claims()->get("uid"));
+        if ($job_id === null) return handleReturn(ControllerRet::unexpected_error);
 
-        return handleReturn(ControllerRet::success_no_content);
+        header('Content-Type: application/json');
+        echo json_encode(array("job_id" => $job_id));
+
+        return handleReturn(ControllerRet::success_accepted);
+    }
+
+    /**
+     * The status of a job queued by one of the user's requests (e.g. /delete_intezmeny)
+     * A failed job has used up its retries, it's queued again while it has retries left
+     */
+    public static function getJob(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        $job_id = Controller::validateInteger(@$data->job_id);
+        if ($job_id === null) return handleReturn(ControllerRet::bad_request);
+
+        $db = DB::init();
+        if ($db === null) return handleReturn(ControllerRet::unexpected_error);
+
+        $jwt = JWT::init();
+        if ($jwt === false) return handleReturn(ControllerRet::unexpected_error);
+        $token = Controller::validateAccessToken($db, $jwt);
+        if (is_a($token, "Controller\ControllerRet") === true) return handleReturn($token);
+
+        $job = Job::getJob($db, $job_id, $token->claims()->get("uid"));
+        if ($job === false) return handleReturn(ControllerRet::unauthorised);
+        if ($job === null) return handleReturn(ControllerRet::unexpected_error);
+
+        header('Content-Type: application/json');
+        echo json_encode($job);
+
+        return handleReturn(ControllerRet::success);
     }
 
     public static function getIntezmenys(): null
@@ -528,6 +585,8 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
+        // The memberships go first, once the user is fired a retry can't reach them anymore
+        if (Group::deleteUserGroupMembers($db, $intezmeny_id, $fire_uid) === null) return handleReturn(ControllerRet::unexpected_error);
         if (User::fireUser($db, $intezmeny_id, $fire_uid) === null) return handleReturn(ControllerRet::unexpected_error);
 
         return handleReturn(ControllerRet::success_no_content);
@@ -586,7 +645,7 @@ class Controller
 
     public static function createClass(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
         $headcount = Controller::validateInteger(@$data->headcount, 5);
@@ -612,7 +671,7 @@ class Controller
 
     public static function createGroup(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
         $headcount = Controller::validateInteger(@$data->headcount, 5);
@@ -641,12 +700,41 @@ class Controller
         return handleReturn(ControllerRet::success_created);
     }
 
+    public static function createGroupMember(): null
+    {
+        $data = Controller::requestData();
+        $group_id = Controller::validateInteger(@$data->group_id);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        $member_uid = Controller::validateInteger(@$data->member_uid);
+        if ($member_uid === null) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $ret = User::isAdmin($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = User::partOfIntezmeny($db, $intezmeny_id, $member_uid, false);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = Group::groupExists($db, $intezmeny_id, $group_id);
+        if ($ret === false) return handleReturn(ControllerRet::bad_request);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = Group::groupMemberExists($db, $intezmeny_id, $group_id, $member_uid);
+        if ($ret === true) return handleReturn(ControllerRet::already_exists);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+
+        if (Group::createGroupMember($db, $intezmeny_id, $group_id, $member_uid) === null) return handleReturn(ControllerRet::unexpected_error);
+
+        return handleReturn(ControllerRet::success_created);
+    }
+
     public static function createLesson(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id, $uid) = $ret;
 
@@ -664,7 +752,7 @@ class Controller
 
     public static function createRoom(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
         $type = Controller::validateString(@$data->type, max_chars: 200, null_allowed: true);
@@ -690,7 +778,7 @@ class Controller
 
     public static function createTeacher(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
         $job = Controller::validateString(@$data->job, max_chars: 200);
@@ -721,7 +809,7 @@ class Controller
 
     public static function createTimetableElement(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $start = Controller::validateTime(@$data->start, time_allowed: true);
         if ($start === null) return handleReturn(ControllerRet::bad_request);
         $duration = Controller::validateTime(@$data->duration, time_allowed: true);
@@ -746,6 +834,8 @@ class Controller
         $room_id = Controller::validateInteger(@$data->room_id, null_allowed: true);
         if ($room_id === null) return handleReturn(ControllerRet::bad_request);
         if ($room_id === false) $room_id = null;
+        $allow_clash = Controller::validateBoolean(@$data->allow_clash);
+        if ($allow_clash === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id, $uid) = $ret;
@@ -753,42 +843,87 @@ class Controller
         $ret = User::isAdmin($db, $intezmeny_id, $uid);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        if ($group_id !== null) {
-            $ret = Group::groupExists($db, $intezmeny_id, $group_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($lesson_id !== null) {
-            $ret = Lesson::lessonExists($db, $intezmeny_id, $lesson_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($teacher_id !== null) {
-            $ret = Teacher::teacherExists($db, $intezmeny_id, $teacher_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($room_id !== null) {
-            $ret = Room::roomExists($db, $intezmeny_id, $room_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(
+            array("group_", $group_id),
+            array("lesson", $lesson_id),
+            array("teacher", $teacher_id),
+            array("room", $room_id),
+        ));
+        if ($ret === false) return handleReturn(ControllerRet::bad_request);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        if (TimetableElement::createTimetableElement(
+        return Controller::writeTimetableElement(
             $db,
             $intezmeny_id,
-            $start->format("H:i:s"),
-            $duration->format("H:i:s"),
-            $day,
-            $from->format("Y-m-d"),
-            $until->format("Y-m-d"),
-            $group_id,
-            $lesson_id,
-            $teacher_id,
-            $room_id
-        ) === null) return handleReturn(ControllerRet::unexpected_error);
+            $allow_clash,
+            fn() => TimetableElement::findClashes(
+                $db,
+                $intezmeny_id,
+                null,
+                $start->format("H:i:s"),
+                $duration->format("H:i:s"),
+                $day,
+                $from->format("Y-m-d"),
+                $until->format("Y-m-d"),
+                $group_id,
+                $teacher_id,
+                $room_id
+            ),
+            fn() => TimetableElement::createTimetableElement(
+                $db,
+                $intezmeny_id,
+                $start->format("H:i:s"),
+                $duration->format("H:i:s"),
+                $day,
+                $from->format("Y-m-d"),
+                $until->format("Y-m-d"),
+                $group_id,
+                $lesson_id,
+                $teacher_id,
+                $room_id
+            ),
+            ControllerRet::success_created
+        );
+    }
 
-        return handleReturn(ControllerRet::success_created);
+    /**
+     * Checks the element with $find_clashes (unless $allow_clash) and saves it with $write in one transaction that holds the
+     * intezmeny's timetable lock, so two concurrent writes can't both pass the check and book the same slot
+     * A batch is a transaction already and took the lock before its first operation
+     */
+    private static function writeTimetableElement(DB $db, int $intezmeny_id, bool $allow_clash, callable $find_clashes, callable $write, ControllerRet $success): null
+    {
+        $own_transaction = ($allow_clash === false and Controller::$batch === null);
+        try {
+            if ($own_transaction) {
+                if ($db->logError($db->connection->begin_transaction()) === null) return handleReturn(ControllerRet::unexpected_error);
+                if (TimetableElement::lockTimetable($db, $intezmeny_id) === null) {
+                    $db->connection->rollback();
+                    return handleReturn(ControllerRet::unexpected_error);
+                }
+            }
+            if ($allow_clash === false) {
+                $ret = $find_clashes();
+                if ($ret === null or count($ret) !== 0) {
+                    if ($own_transaction) $db->connection->rollback();
+                    if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+                    header('Content-Type: application/json');
+                    echo json_encode($ret);
+                    return handleReturn(ControllerRet::conflict);
+                }
+            }
+            if ($write() === null) {
+                if ($own_transaction) $db->connection->rollback();
+                return handleReturn(ControllerRet::unexpected_error);
+            }
+            if ($own_transaction and $db->logError($db->connection->commit()) === null) return handleReturn(ControllerRet::unexpected_error);
+        } catch (Exception) {
+            if ($own_transaction) $db->connection->rollback();
+            $db->logError(false);
+            return handleReturn(ControllerRet::unexpected_error);
+        }
+
+        return handleReturn($success);
     }
 
     public static function createHomework(): null
@@ -811,13 +946,11 @@ class Controller
         $ret = User::isTeacher($db, $intezmeny_id, $uid);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Group::groupExists($db, $intezmeny_id, $group_id);
-        if ($ret === false) return handleReturn(ControllerRet::bad_request);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Lesson::lessonExists($db, $intezmeny_id, $lesson_id);
-        if ($ret === false) return handleReturn(ControllerRet::bad_request);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Teacher::teacherExists($db, $intezmeny_id, $teacher_id);
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(
+            array("group_", $group_id),
+            array("lesson", $lesson_id),
+            array("teacher", $teacher_id),
+        ));
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -846,19 +979,62 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $attachment_id = Attachment::createAttachment($db, $intezmeny_id, $homework_id, $file_name);
+        $hash = Blob::storeContents($file_contents);
+        if ($hash === false) return handleReturn(ControllerRet::unexpected_error);
+        if (Attachment::createAttachment($db, $intezmeny_id, $homework_id, $file_name, $hash, strlen($file_contents)) === null) return handleReturn(ControllerRet::unexpected_error);
+
+        return handleReturn(ControllerRet::success_created);
+    }
+
+    /**
+     * The file is the raw request body (not json or multipart) and every other field is a query parameter
+     * The body is hashed and written in chunks so memory use doesn't grow with the file's size
+     * If the optional sha256 parameter is given then a body with a different hash is rejected
+     * Contents that are stored already (e.g. the same worksheet attached to another homework) are only referenced again
+     */
+    public static function uploadAttachment(): null
+    {
+        global $max_file_size;
+
+        $data = (object) $_GET;
+        $homework_id = Controller::validateInteger(@$data->homework_id);
+        if ($homework_id === null) return handleReturn(ControllerRet::bad_request);
+        $file_name = Controller::validateFileName(@$data->file_name);
+        if ($file_name === null) return handleReturn(ControllerRet::bad_request);
+        $sha256 = Controller::validateString(@$data->sha256, min_chars: 64, max_chars: 64, null_allowed: true);
+        if ($sha256 === null) return handleReturn(ControllerRet::bad_request);
+        if ($sha256 === false) $sha256 = null;
+        if ($sha256 !== null and ctype_xdigit($sha256) === false) return handleReturn(ControllerRet::bad_request);
+        if (isset($_SERVER["CONTENT_LENGTH"]) and (int) $_SERVER["CONTENT_LENGTH"] > $max_file_size) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $ret = User::isTeacher($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = Homework::homeworkExists($db, $intezmeny_id, $homework_id);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+
+        $ret = Blob::storeStream("php://input", $max_file_size);
+        if ($ret === false) return handleReturn(ControllerRet::unexpected_error);
+        if ($ret === null) return handleReturn(ControllerRet::bad_request);
+        list($hash, $size) = $ret;
+        // A blob stored for a rejected upload is left to check_blobs.php, an upload of the same contents may be using it
+        if ($sha256 !== null and hash_equals(strtolower($sha256), $hash) === false) return handleReturn(ControllerRet::bad_request);
+        $attachment_id = Attachment::createAttachment($db, $intezmeny_id, $homework_id, $file_name, $hash, $size);
         if ($attachment_id === null) return handleReturn(ControllerRet::unexpected_error);
-        if (file_force_contents("user_data/intezmeny_$intezmeny_id/" . $file_name . "_$attachment_id", $file_contents) === false) {
-            if (Attachment::deleteAttachment($db, $intezmeny_id, $attachment_id) === null) return handleReturn(ControllerRet::unexpected_error);
-            return handleReturn(ControllerRet::unexpected_error);
-        }
+
+        header('Content-Type: application/json');
+        echo json_encode(array("id" => $attachment_id, "sha256" => $hash));
 
         return handleReturn(ControllerRet::success_created);
     }
 
     public static function deleteClass(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $class_id = Controller::validateInteger(@$data->class_id);
         if ($class_id === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
@@ -879,10 +1055,10 @@ class Controller
 
     public static function deleteLesson(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $lesson_id = Controller::validateInteger(@$data->lesson_id);
         if ($lesson_id === null) return handleReturn(ControllerRet::bad_request);
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id, $uid) = $ret;
 
@@ -900,7 +1076,7 @@ class Controller
 
     public static function deleteGroup(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $group_id = Controller::validateInteger(@$data->group_id);
         if ($group_id === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
@@ -919,9 +1095,32 @@ class Controller
         return handleReturn(ControllerRet::success_no_content);
     }
 
+    public static function deleteGroupMember(): null
+    {
+        $data = Controller::requestData();
+        $group_id = Controller::validateInteger(@$data->group_id);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        $member_uid = Controller::validateInteger(@$data->member_uid);
+        if ($member_uid === null) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $ret = User::isAdmin($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = Group::groupMemberExists($db, $intezmeny_id, $group_id, $member_uid);
+        if ($ret === false) return handleReturn(ControllerRet::bad_request);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+
+        if (Group::deleteGroupMember($db, $intezmeny_id, $group_id, $member_uid) === null) return handleReturn(ControllerRet::unexpected_error);
+
+        return handleReturn(ControllerRet::success_no_content);
+    }
+
     public static function deleteRoom(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $room_id = Controller::validateInteger(@$data->room_id);
         if ($room_id === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
@@ -942,7 +1141,7 @@ class Controller
 
     public static function deleteTeacher(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $teacher_id = Controller::validateInteger(@$data->teacher_id);
         if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
@@ -963,7 +1162,7 @@ class Controller
 
     public static function deleteTimetableElement(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $timetable_element_id = Controller::validateInteger(@$data->timetable_element_id);
         if ($timetable_element_id === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
@@ -998,12 +1197,7 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $attachments = Attachment::getHomeworkAttachments($db, $intezmeny_id, $homework_id);
-        if ($attachments === null) return handleReturn(ControllerRet::unexpected_error);
-
-        for ($i = 0; $i < count($attachments); $i++) {
-            if (unlink("user_data/intezmeny_$intezmeny_id/" . $attachments[$i][1] . "_" . $attachments[$i][0]) === false) return handleReturn(ControllerRet::unexpected_error);
-        }
+        // The attachments' blobs lose their references in the procedure, check_blobs.php removes the unreferenced ones
         if (Homework::deleteHomework($db, $intezmeny_id, $homework_id) === null) return handleReturn(ControllerRet::unexpected_error);
 
         return handleReturn(ControllerRet::success_no_content);
@@ -1025,10 +1219,6 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $attachment_name = Attachment::getAttachmentName($db, $intezmeny_id, $attachment_id);
-        if ($attachment_name === null) return handleReturn(ControllerRet::unexpected_error);
-
-        if (unlink("user_data/intezmeny_$intezmeny_id/" . $attachment_name . "_" . $attachment_id) === false) return handleReturn(ControllerRet::unexpected_error);
         if (Attachment::deleteAttachment($db, $intezmeny_id, $attachment_id) === null) return handleReturn(ControllerRet::unexpected_error);
 
         return handleReturn(ControllerRet::success_no_content);
@@ -1036,7 +1226,7 @@ class Controller
 
     public static function updateClass(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $class_id = Controller::validateInteger(@$data->class_id);
         if ($class_id === null) return handleReturn(ControllerRet::bad_request);
         $name = Controller::validateString(@$data->name, max_chars: 200);
@@ -1059,12 +1249,12 @@ class Controller
 
     public static function updateLesson(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $lesson_id = Controller::validateInteger(@$data->lesson_id);
         if ($lesson_id === null) return handleReturn(ControllerRet::bad_request);
         $name = Controller::validateString(@$data->name, max_chars: 200);
         if ($name === null) return handleReturn(ControllerRet::bad_request);
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id, $uid) = $ret;
 
@@ -1082,7 +1272,7 @@ class Controller
 
     public static function updateGroup(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $group_id = Controller::validateInteger(@$data->group_id);
         if ($group_id === null) return handleReturn(ControllerRet::bad_request);
         $name = Controller::validateString(@$data->name, max_chars: 200);
@@ -1099,12 +1289,10 @@ class Controller
         $ret = User::isAdmin($db, $intezmeny_id, $uid);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        if ($class_id !== null) {
-            $ret = Class_::classExists($db, $intezmeny_id, $class_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        $ret = Group::groupExists($db, $intezmeny_id, $group_id);
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(
+            array("group_", $group_id),
+            array("class", $class_id),
+        ));
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -1115,7 +1303,7 @@ class Controller
 
     public static function updateRoom(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $room_id = Controller::validateInteger(@$data->room_id);
         if ($room_id === null) return handleReturn(ControllerRet::bad_request);
         $name = Controller::validateString(@$data->name, max_chars: 200);
@@ -1143,7 +1331,7 @@ class Controller
 
     public static function updateTeacher(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $teacher_id = Controller::validateInteger(@$data->teacher_id);
         if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
         $name = Controller::validateString(@$data->name, max_chars: 200);
@@ -1184,7 +1372,7 @@ class Controller
 
     public static function updateTimetableElement(): null
     {
-        $data = json_decode(file_get_contents("php://input"));
+        $data = Controller::requestData();
         $element_id = Controller::validateInteger(@$data->element_id);
         if ($element_id === null) return handleReturn(ControllerRet::bad_request);
         $start = Controller::validateTime(@$data->start, time_allowed: true);
@@ -1211,6 +1399,8 @@ class Controller
         $room_id = Controller::validateInteger(@$data->room_id, null_allowed: true);
         if ($room_id === null) return handleReturn(ControllerRet::bad_request);
         if ($room_id === false) $room_id = null;
+        $allow_clash = Controller::validateBoolean(@$data->allow_clash);
+        if ($allow_clash === null) return handleReturn(ControllerRet::bad_request);
         $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id, $uid) = $ret;
@@ -1218,46 +1408,49 @@ class Controller
         $ret = User::isAdmin($db, $intezmeny_id, $uid);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = TimetableElement::timetableElementExists($db, $intezmeny_id, $element_id);
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(
+            array("timetable", $element_id),
+            array("group_", $group_id),
+            array("lesson", $lesson_id),
+            array("teacher", $teacher_id),
+            array("room", $room_id),
+        ));
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        if ($group_id !== null) {
-            $ret = Group::groupExists($db, $intezmeny_id, $group_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($lesson_id !== null) {
-            $ret = Lesson::lessonExists($db, $intezmeny_id, $lesson_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($teacher_id !== null) {
-            $ret = Teacher::teacherExists($db, $intezmeny_id, $teacher_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
-        if ($room_id !== null) {
-            $ret = Room::roomExists($db, $intezmeny_id, $room_id);
-            if ($ret === false) return handleReturn(ControllerRet::bad_request);
-            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        }
 
-        if (TimetableElement::updateTimetableElement(
+        return Controller::writeTimetableElement(
             $db,
             $intezmeny_id,
-            $element_id,
-            $start->format("H:i:s"),
-            $duration->format("H:i:s"),
-            $day,
-            $from->format("Y-m-d"),
-            $until->format("Y-m-d"),
-            $group_id,
-            $lesson_id,
-            $teacher_id,
-            $room_id
-        ) === null) return handleReturn(ControllerRet::unexpected_error);
-
-        return handleReturn(ControllerRet::success_no_content);
+            $allow_clash,
+            fn() => TimetableElement::findClashes(
+                $db,
+                $intezmeny_id,
+                $element_id,
+                $start->format("H:i:s"),
+                $duration->format("H:i:s"),
+                $day,
+                $from->format("Y-m-d"),
+                $until->format("Y-m-d"),
+                $group_id,
+                $teacher_id,
+                $room_id
+            ),
+            fn() => TimetableElement::updateTimetableElement(
+                $db,
+                $intezmeny_id,
+                $element_id,
+                $start->format("H:i:s"),
+                $duration->format("H:i:s"),
+                $day,
+                $from->format("Y-m-d"),
+                $until->format("Y-m-d"),
+                $group_id,
+                $lesson_id,
+                $teacher_id,
+                $room_id
+            ),
+            ControllerRet::success_no_content
+        );
     }
 
     public static function updateHomework(): null
@@ -1282,16 +1475,12 @@ class Controller
         $ret = User::isTeacher($db, $intezmeny_id, $uid);
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Homework::homeworkExists($db, $intezmeny_id, $homework_id);
-        if ($ret === false) return handleReturn(ControllerRet::bad_request);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Group::groupExists($db, $intezmeny_id, $group_id);
-        if ($ret === false) return handleReturn(ControllerRet::bad_request);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Lesson::lessonExists($db, $intezmeny_id, $lesson_id);
-        if ($ret === false) return handleReturn(ControllerRet::bad_request);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-        $ret = Teacher::teacherExists($db, $intezmeny_id, $teacher_id);
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(
+            array("homework", $homework_id),
+            array("group_", $group_id),
+            array("lesson", $lesson_id),
+            array("teacher", $teacher_id),
+        ));
         if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
@@ -1309,64 +1498,142 @@ class Controller
         return handleReturn(ControllerRet::success_no_content);
     }
 
-    public static function getClasses(): null
+    /**
+     * Carries out an ordered list of create, update and delete operations in a single transaction
+     * The body is {"intezmeny_id": ..., "operations": [{"op": "create/class", "data": {...}}, ...]} where op is a key of
+     * BATCH_OPERATIONS and data is what the operation's own endpoint takes without intezmeny_id
+     * The caller is authenticated once and the list's shape is checked before anything is changed, then every operation
+     * runs through its endpoint's own validation on the batch's connection so later operations see the earlier ones' rows
+     * The first failing operation rolls back the whole batch and its status becomes the response's status
+     * Every result has the operation's status, the id of the created row for creates (except the ones in
+     * BATCH_KEYLESS_CREATES) and the response body if there is one,
+     * the results of the operations that never ran are null
+     */
+    public static function batch(): null
     {
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $data = json_decode(file_get_contents("php://input"));
+        if (isset($data->operations) === false or is_array($data->operations) === false) return handleReturn(ControllerRet::bad_request);
+        if (count($data->operations) === 0 or count($data->operations) > Controller::BATCH_MAX_OPERATIONS) return handleReturn(ControllerRet::bad_request);
+        foreach ($data->operations as $operation) {
+            if (is_object($operation) === false or isset($operation->op) === false or is_string($operation->op) === false) return handleReturn(ControllerRet::bad_request);
+            if (array_key_exists($operation->op, Controller::BATCH_OPERATIONS) === false) return handleReturn(ControllerRet::bad_request);
+            if (isset($operation->data) and is_object($operation->data) === false) return handleReturn(ControllerRet::bad_request);
+        }
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
-        list($db, $intezmeny_id) = $ret;
+        list($db, $intezmeny_id, $uid) = $ret;
 
-        $ret = Class_::getClasses($db, $intezmeny_id);
+        // Every operation is admin only
+        $ret = User::isAdmin($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
+        $results = array_fill(0, count($data->operations), null);
+        $failed_status = null;
+        try {
+            if ($db->logError($db->connection->begin_transaction()) === null) return handleReturn(ControllerRet::unexpected_error);
+            // Taken before anything is read so the clash checks of its timetable operations see every committed element
+            if (TimetableElement::lockTimetable($db, $intezmeny_id) === null) {
+                $db->connection->rollback();
+                return handleReturn(ControllerRet::unexpected_error);
+            }
+            foreach ($data->operations as $i => $operation) {
+                $operation_data = isset($operation->data) ? clone $operation->data : new stdClass();
+                $operation_data->intezmeny_id = (string) $intezmeny_id;
+                Controller::$batch = array("db" => $db, "intezmeny_id" => $intezmeny_id, "uid" => $uid, "data" => $operation_data);
+                http_response_code(200);
+                ob_start();
+                try {
+                    call_user_func(array(Controller::class, Controller::BATCH_OPERATIONS[$operation->op]));
+                } finally {
+                    $body = ob_get_clean();
+                    Controller::$batch = null;
+                }
+                $status = http_response_code();
+                $results[$i] = array("status" => $status);
+                if ($status === 201 and in_array($operation->op, Controller::BATCH_KEYLESS_CREATES, true) === false) {
+                    $id = Intezmeny::lastCreatedId($db, $intezmeny_id, explode("/", $operation->op)[1]);
+                    if ($id === null) $status = 500;
+                    $results[$i]["id"] = $id;
+                }
+                if ($body !== "" and $body !== false) $results[$i]["body"] = json_decode($body) ?? $body;
+                if ($status >= 400) {
+                    $failed_status = $status;
+                    break;
+                }
+            }
+            if ($failed_status === null and $db->logError($db->connection->commit()) === null) $failed_status = 500;
+            if ($failed_status !== null) $db->connection->rollback();
+        } catch (Exception) {
+            $db->logError(false);
+            $db->connection->rollback();
+            return handleReturn(ControllerRet::unexpected_error);
+        }
+
+        // Drop the headers the operations may set, the ones set before the batch (e.g. X-Request-Id) are kept
+        foreach (array("Content-Type", "ETag", "Cache-Control", "X-Next-Cursor") as $header) header_remove($header);
         header('Content-Type: application/json');
-        echo json_encode($ret);
+        echo json_encode(array("committed" => $failed_status === null, "results" => $results));
 
-        return handleReturn(ControllerRet::success);
+        if ($failed_status === null) return handleReturn(ControllerRet::success);
+        http_response_code($failed_status);
+        return null;
     }
 
-    public static function getGroups(): null
+    public static function getClasses(): null
     {
         $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id) = $ret;
 
-        $ret = Group::getGroups($db, $intezmeny_id);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-
-        header('Content-Type: application/json');
-        echo json_encode($ret);
-
-        return handleReturn(ControllerRet::success);
+        return Controller::respondVersioned($db, $intezmeny_id, "classes", fn() => Class_::getClasses($db, $intezmeny_id));
     }
 
-    public static function getLessons(): null
+    public static function getGroups(): null
     {
         $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id) = $ret;
 
-        $ret = Lesson::getLessons($db, $intezmeny_id);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
-
-        header('Content-Type: application/json');
-        echo json_encode($ret);
-
-        return handleReturn(ControllerRet::success);
+        return Controller::respondVersioned($db, $intezmeny_id, "groups", fn() => Group::getGroups($db, $intezmeny_id));
     }
 
-    public static function getRooms(): null
+    /** Returns the uids of the group's members, only for teachers and admins */
+    public static function getGroupMembers(): null
     {
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $data = json_decode(file_get_contents("php://input"));
+        $group_id = Controller::validateInteger(@$data->group_id);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
-        list($db, $intezmeny_id) = $ret;
+        list($db, $intezmeny_id, $uid) = $ret;
 
-        $ret = Room::getRooms($db, $intezmeny_id);
+        $ret = User::isTeacher($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $ret = Group::groupExists($db, $intezmeny_id, $group_id);
+        if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        header('Content-Type: application/json');
-        echo json_encode($ret);
+        return Controller::respondVersioned($db, $intezmeny_id, "group_members:$group_id", fn() => Group::getGroupMembers($db, $intezmeny_id, $group_id));
+    }
 
-        return handleReturn(ControllerRet::success);
+    public static function getLessons(): null
+    {
+        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id) = $ret;
+
+        return Controller::respondVersioned($db, $intezmeny_id, "lessons", fn() => Lesson::getLessons($db, $intezmeny_id));
+    }
+
+    public static function getRooms(): null
+    {
+        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id) = $ret;
+
+        return Controller::respondVersioned($db, $intezmeny_id, "rooms", fn() => Room::getRooms($db, $intezmeny_id));
     }
 
     public static function getTeachers(): null
@@ -1375,7 +1642,57 @@ class Controller
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id) = $ret;
 
-        $ret = Teacher::getTeachers($db, $intezmeny_id);
+        return Controller::respondVersioned($db, $intezmeny_id, "teachers", fn() => Teacher::getTeachers($db, $intezmeny_id));
+    }
+
+    public static function getTimetable(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        $from = Controller::validateTime(@$data->from, date_allowed: true, null_allowed: true);
+        if ($from === null) return handleReturn(ControllerRet::bad_request);
+        if ($from === false) $from = null;
+        $until = Controller::validateTime(@$data->until, date_allowed: true, null_allowed: true);
+        if ($until === null) return handleReturn(ControllerRet::bad_request);
+        if ($until === false) $until = null;
+        if ($from !== null and $until !== null and $from->getTimestamp() > $until->getTimestamp()) return handleReturn(ControllerRet::bad_request);
+        $group_id = Controller::validateInteger(@$data->group_id, null_allowed: true);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($group_id === false) $group_id = null;
+        $teacher_id = Controller::validateInteger(@$data->teacher_id, null_allowed: true);
+        if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($teacher_id === false) $teacher_id = null;
+        $room_id = Controller::validateInteger(@$data->room_id, null_allowed: true);
+        if ($room_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($room_id === false) $room_id = null;
+        $day = Controller::validateInteger(@$data->day, null_allowed: true);
+        if ($day === null) return handleReturn(ControllerRet::bad_request);
+        if ($day === false) $day = null;
+        if ($day !== null and ($day > 6 or $day < 0)) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id) = $ret;
+
+        $from = $from === null ? null : $from->format("Y-m-d");
+        $until = $until === null ? null : $until->format("Y-m-d");
+        return Controller::respondVersioned(
+            $db,
+            $intezmeny_id,
+            "timetable:" . json_encode(array($from, $until, $group_id, $teacher_id, $room_id, $day)),
+            fn() => TimetableElement::getTimetable($db, $intezmeny_id, $from, $until, $group_id, $teacher_id, $room_id, $day)
+        );
+    }
+
+    public static function getTimetableClashes(): null
+    {
+        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $ret = User::isAdmin($db, $intezmeny_id, $uid);
+        if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+
+        $ret = TimetableElement::auditClashes($db, $intezmeny_id);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
         header('Content-Type: application/json');
@@ -1384,36 +1701,316 @@ class Controller
         return handleReturn(ControllerRet::success);
     }
 
-    public static function getTimetable(): null
+    /**
+     * Returns the dated occurrences of the timetable elements between from and until (both inclusive, at most
+     * Controller::OCCURRENCES_MAX_DAYS days) ordered by start, mine selects the elements of the caller's groups
+     */
+    public static function getOccurrences(): null
     {
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $data = json_decode(file_get_contents("php://input"));
+        $from = Controller::validateTime(@$data->from, date_allowed: true);
+        if ($from === null) return handleReturn(ControllerRet::bad_request);
+        $until = Controller::validateTime(@$data->until, date_allowed: true);
+        if ($until === null) return handleReturn(ControllerRet::bad_request);
+        if ($from > $until or $from->diff($until)->days >= Controller::OCCURRENCES_MAX_DAYS) return handleReturn(ControllerRet::bad_request);
+        $group_id = Controller::validateInteger(@$data->group_id, null_allowed: true);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($group_id === false) $group_id = null;
+        $teacher_id = Controller::validateInteger(@$data->teacher_id, null_allowed: true);
+        if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($teacher_id === false) $teacher_id = null;
+        $room_id = Controller::validateInteger(@$data->room_id, null_allowed: true);
+        if ($room_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($room_id === false) $room_id = null;
+        $mine = Controller::validateBoolean(@$data->mine);
+        if ($mine === null) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $from = $from->format("Y-m-d");
+        $until = $until->format("Y-m-d");
+        $member_uid = $mine ? $uid : null;
+        return Controller::respondVersioned(
+            $db,
+            $intezmeny_id,
+            "occurrences:" . json_encode(array($from, $until, $group_id, $teacher_id, $room_id, $member_uid)),
+            function () use ($db, $intezmeny_id, $from, $until, $group_id, $teacher_id, $room_id, $member_uid) {
+                $elements = TimetableElement::getTimetable($db, $intezmeny_id, $from, $until, $group_id, $teacher_id, $room_id, member_uid: $member_uid);
+                return $elements === null ? null : TimetableElement::expand($elements, $from, $until);
+            }
+        );
+    }
+
+    /**
+     * Returns the url of the iCalendar feed of the timetable of exactly one of group_id, teacher_id and room_id
+     * Anyone who has the url can read the feed, calendar apps can't log in
+     */
+    public static function getCalendarFeed(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        $group_id = Controller::validateInteger(@$data->group_id, null_allowed: true);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        $teacher_id = Controller::validateInteger(@$data->teacher_id, null_allowed: true);
+        if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
+        $room_id = Controller::validateInteger(@$data->room_id, null_allowed: true);
+        if ($room_id === null) return handleReturn(ControllerRet::bad_request);
+        $resources = array_filter(array("group" => $group_id, "teacher" => $teacher_id, "room" => $room_id), fn($id) => $id !== false);
+        if (count($resources) !== 1) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id) = $ret;
 
-        $ret = TimetableElement::getTimetable($db, $intezmeny_id);
+        $resource = array_key_first($resources);
+        $ret = Intezmeny::rowsExist($db, $intezmeny_id, array(array(Calendar::RESOURCES[$resource], $resources[$resource])));
+        if ($ret === false) return handleReturn(ControllerRet::bad_request);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
         header('Content-Type: application/json');
-        echo json_encode($ret);
+        echo json_encode(array("url" => "/calendar.ics?feed=" . Calendar::feedToken($intezmeny_id, $resource, $resources[$resource])));
 
         return handleReturn(ControllerRet::success);
     }
 
+    /**
+     * Serves an iCalendar feed (see getCalendarFeed), calendar apps poll it so it is answered like a versioned read:
+     * a matching If-None-Match gets 304 from the data version alone and the feed is only regenerated when it's first
+     * asked for after the intezmeny's data changed
+     * The response may be kept by shared caches for Controller::CALENDAR_MAX_AGE seconds, nginx keeps it too
+     */
+    public static function getCalendar(): null
+    {
+        $data = (object) $_GET;
+        $feed = Controller::validateString(@$data->feed, max_chars: 100);
+        if ($feed === null) return handleReturn(ControllerRet::bad_request);
+        $feed = Calendar::parseFeedToken($feed);
+        if ($feed === false) return handleReturn(ControllerRet::unauthorised);
+        list($intezmeny_id, $resource, $resource_id) = $feed;
+
+        $db = DB::init();
+        if ($db === null) return handleReturn(ControllerRet::unexpected_error);
+
+        $data_version = Intezmeny::getDataVersion($db, $intezmeny_id);
+        if ($data_version === null) {
+            // Only an intezmeny deleted since the url was handed out is a 404, nginx keeps serving the feed it has on errors
+            $ret = Intezmeny::intezmenyExists($db, $intezmeny_id);
+            if ($ret === false) return handleReturn(ControllerRet::not_found);
+            return handleReturn(ControllerRet::unexpected_error);
+        }
+
+        $key = "calendar:$resource:$resource_id";
+        $etag = '"' . $intezmeny_id . '-' . $data_version . '-' . hash("xxh64", $key) . '"';
+        header("ETag: $etag");
+        header("Cache-Control: public, max-age=" . Controller::CALENDAR_MAX_AGE);
+        if (Controller::notModified($etag)) return handleReturn(ControllerRet::not_modified);
+
+        $ics = Cache::fetchResponse($intezmeny_id, $data_version, $key);
+        if ($ics === null) {
+            $ics = Calendar::getFeed($db, $intezmeny_id, $resource, $resource_id);
+            if ($ics === false) return handleReturn(ControllerRet::not_found);
+            if ($ics === null) return handleReturn(ControllerRet::unexpected_error);
+            Cache::storeResponse($intezmeny_id, $data_version, $key, $ics);
+        }
+
+        header('Content-Type: text/calendar; charset=utf-8');
+        echo $ics;
+
+        return handleReturn(ControllerRet::success);
+    }
+
+    /**
+     * Returns a page of the homeworks newest first, a page that is not the last one has the cursor of the next page in
+     * its X-Next-Cursor header which is sent back as cursor with the same limit and filters to get that page
+     */
     public static function getHomeworks(): null
     {
-        $ret = Controller::validateIntezmenyData(json_decode(file_get_contents("php://input")), true);
+        $data = json_decode(file_get_contents("php://input"));
+        $limit = Controller::validateInteger(@$data->limit, null_allowed: true);
+        if ($limit === null) return handleReturn(ControllerRet::bad_request);
+        if ($limit === false) $limit = Controller::HOMEWORK_PAGE_SIZE;
+        if ($limit < 1 or $limit > Controller::HOMEWORK_MAX_PAGE_SIZE) return handleReturn(ControllerRet::bad_request);
+        $cursor = Controller::validateCursor(@$data->cursor, null_allowed: true);
+        if ($cursor === null) return handleReturn(ControllerRet::bad_request);
+        if ($cursor === false) $cursor = null;
+        $group_id = Controller::validateInteger(@$data->group_id, null_allowed: true);
+        if ($group_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($group_id === false) $group_id = null;
+        $lesson_id = Controller::validateInteger(@$data->lesson_id, null_allowed: true);
+        if ($lesson_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($lesson_id === false) $lesson_id = null;
+        $teacher_id = Controller::validateInteger(@$data->teacher_id, null_allowed: true);
+        if ($teacher_id === null) return handleReturn(ControllerRet::bad_request);
+        if ($teacher_id === false) $teacher_id = null;
+        $due_from = Controller::validateTime(@$data->due_from, date_allowed: true, null_allowed: true);
+        if ($due_from === null) return handleReturn(ControllerRet::bad_request);
+        if ($due_from === false) $due_from = null;
+        $due_until = Controller::validateTime(@$data->due_until, date_allowed: true, null_allowed: true);
+        if ($due_until === null) return handleReturn(ControllerRet::bad_request);
+        if ($due_until === false) $due_until = null;
+        if ($due_from !== null and $due_until !== null and $due_from->getTimestamp() > $due_until->getTimestamp()) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
         if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
         list($db, $intezmeny_id) = $ret;
 
-        $ret = Homework::getHomeworks($db, $intezmeny_id);
-        if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        $due_from = $due_from === null ? null : $due_from->format("Y-m-d");
+        $due_until = $due_until === null ? null : $due_until->format("Y-m-d");
+        return Controller::respondVersioned(
+            $db,
+            $intezmeny_id,
+            "homeworks:" . json_encode(array($limit, $cursor, $group_id, $lesson_id, $teacher_id, $due_from, $due_until)),
+            fn() => Homework::getHomeworks($db, $intezmeny_id, $limit, $cursor, $group_id, $lesson_id, $teacher_id, $due_from, $due_until),
+            paged: true
+        );
+    }
+
+    /**
+     * The homeworks of the groups the user is a member of, paged like /intezmeny/get/homeworks
+     * The page is cached per user so only the user's own homeworks are ever read or sent
+     */
+    public static function getMyHomeworks(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        $limit = Controller::validateInteger(@$data->limit, null_allowed: true);
+        if ($limit === null) return handleReturn(ControllerRet::bad_request);
+        if ($limit === false) $limit = Controller::HOMEWORK_PAGE_SIZE;
+        if ($limit < 1 or $limit > Controller::HOMEWORK_MAX_PAGE_SIZE) return handleReturn(ControllerRet::bad_request);
+        $cursor = Controller::validateCursor(@$data->cursor, null_allowed: true);
+        if ($cursor === null) return handleReturn(ControllerRet::bad_request);
+        if ($cursor === false) $cursor = null;
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        return Controller::respondVersioned(
+            $db,
+            $intezmeny_id,
+            "my_homeworks:" . json_encode(array($uid, $limit, $cursor)),
+            fn() => Homework::getHomeworks($db, $intezmeny_id, $limit, $cursor, member_uid: $uid),
+            paged: true
+        );
+    }
+
+    /** The timetable elements of the groups the user is a member of, cached per user */
+    public static function getMyTimetable(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        $from = Controller::validateTime(@$data->from, date_allowed: true, null_allowed: true);
+        if ($from === null) return handleReturn(ControllerRet::bad_request);
+        if ($from === false) $from = null;
+        $until = Controller::validateTime(@$data->until, date_allowed: true, null_allowed: true);
+        if ($until === null) return handleReturn(ControllerRet::bad_request);
+        if ($until === false) $until = null;
+        if ($from !== null and $until !== null and $from->getTimestamp() > $until->getTimestamp()) return handleReturn(ControllerRet::bad_request);
+        $day = Controller::validateInteger(@$data->day, null_allowed: true);
+        if ($day === null) return handleReturn(ControllerRet::bad_request);
+        if ($day === false) $day = null;
+        if ($day !== null and ($day > 6 or $day < 0)) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        $from = $from === null ? null : $from->format("Y-m-d");
+        $until = $until === null ? null : $until->format("Y-m-d");
+        return Controller::respondVersioned(
+            $db,
+            $intezmeny_id,
+            "my_timetable:" . json_encode(array($uid, $from, $until, $day)),
+            fn() => TimetableElement::getTimetable($db, $intezmeny_id, $from, $until, day: $day, member_uid: $uid)
+        );
+    }
+
+    /**
+     * Returns the chosen collections as the members of one json object in the order they were asked for
+     * The caller is authenticated once and every collection is read on the same connection, the intezmeny's collections
+     * come from the same response cache as their own get endpoints
+     * With "stream": true every member is sent as soon as it is read, a collection that fails to load then ends the object
+     * with an "error" member as the status was already sent
+     */
+    public static function getSnapshot(): null
+    {
+        $data = json_decode(file_get_contents("php://input"));
+        if (isset($data->collections) === false or is_array($data->collections) === false or count($data->collections) === 0) return handleReturn(ControllerRet::bad_request);
+        foreach ($data->collections as $collection) {
+            if (in_array($collection, Controller::SNAPSHOT_COLLECTIONS, true) === false) return handleReturn(ControllerRet::bad_request);
+        }
+        if (count(array_unique($data->collections)) !== count($data->collections)) return handleReturn(ControllerRet::bad_request);
+        $stream = Controller::validateBoolean(@$data->stream);
+        if ($stream === null) return handleReturn(ControllerRet::bad_request);
+        $ret = Controller::validateIntezmenyData($data, true);
+        if (is_a($ret, "Controller\ControllerRet") === true) return handleReturn($ret);
+        list($db, $intezmeny_id, $uid) = $ret;
+
+        if (in_array("users", $data->collections, true) === true) {
+            $ret = User::isAdmin($db, $intezmeny_id, $uid);
+            if ($ret === false) return handleReturn(ControllerRet::unauthorised);
+            if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
+        }
+
+        $data_version = Intezmeny::getDataVersion($db, $intezmeny_id);
+        if ($data_version === null) return handleReturn(ControllerRet::unexpected_error);
+        $loaders = array(
+            "classes" => fn() => Controller::versionedJson($intezmeny_id, $data_version, "classes", fn() => Class_::getClasses($db, $intezmeny_id)),
+            "groups" => fn() => Controller::versionedJson($intezmeny_id, $data_version, "groups", fn() => Group::getGroups($db, $intezmeny_id)),
+            "lessons" => fn() => Controller::versionedJson($intezmeny_id, $data_version, "lessons", fn() => Lesson::getLessons($db, $intezmeny_id)),
+            "rooms" => fn() => Controller::versionedJson($intezmeny_id, $data_version, "rooms", fn() => Room::getRooms($db, $intezmeny_id)),
+            "teachers" => fn() => Controller::versionedJson($intezmeny_id, $data_version, "teachers", fn() => Teacher::getTeachers($db, $intezmeny_id)),
+            // The first page of /intezmeny/get/homeworks, followed by a homeworks_next_cursor member if there are more
+            "homeworks" => function () use ($db, $intezmeny_id, $data_version): string|null {
+                $page = Controller::versionedJson(
+                    $intezmeny_id,
+                    $data_version,
+                    "homeworks:" . json_encode(array(Controller::HOMEWORK_PAGE_SIZE, null, null, null, null, null, null)),
+                    fn() => Homework::getHomeworks($db, $intezmeny_id, Controller::HOMEWORK_PAGE_SIZE),
+                    paged: true
+                );
+                if ($page === null) return null;
+                list($next_cursor, $json) = explode("\n", $page, 2);
+                return $next_cursor === "" ? $json : $json . ',"homeworks_next_cursor":' . json_encode($next_cursor);
+            },
+            "users" => fn() => Controller::encodeJson(User::getAllIntezmenyUsers($db, $intezmeny_id)),
+            "profile" => fn() => Controller::encodeJson(User::getUser($db, $uid)),
+        );
+
+        if ($stream === false) {
+            $members = array();
+            foreach ($data->collections as $collection) {
+                $json = $loaders[$collection]();
+                if ($json === null) return handleReturn(ControllerRet::unexpected_error);
+                $members[] = json_encode($collection) . ":" . $json;
+            }
+
+            header('Content-Type: application/json');
+            echo "{" . implode(",", $members) . "}";
 
+            return handleReturn(ControllerRet::success);
+        }
+
+        http_response_code(200);
         header('Content-Type: application/json');
-        echo json_encode($ret);
+        // Stops nginx from buffering the response until it is complete
+        header('X-Accel-Buffering: no');
+        while (ob_get_level() > 0) ob_end_flush();
+        echo "{";
+        foreach ($data->collections as $i => $collection) {
+            $separator = $i === 0 ? "" : ",";
+            $json = $loaders[$collection]();
+            if ($json === null) {
+                echo $separator . '"error":"Unexpected error"}';
+                return null;
+            }
+            echo $separator . json_encode($collection) . ":" . $json;
+            flush();
+        }
+        echo "}";
 
-        return handleReturn(ControllerRet::success);
+        return null;
     }
 
+    /**
+     * Behind nginx the file is handed to nginx with X-Accel-Redirect (see the protected_user_data location in nginx.conf)
+     * which serves it with sendfile and handles Range requests itself
+     * Otherwise the file (or the single byte range asked for in the Range header) is copied to the output in chunks
+     */
     public static function getAttachment(): null
     {
         $data = json_decode(file_get_contents("php://input"));
@@ -1427,25 +2024,166 @@ class Controller
         if ($ret === false) return handleReturn(ControllerRet::unauthorised);
         if ($ret === null) return handleReturn(ControllerRet::unexpected_error);
 
-        $attachment_name = Attachment::getAttachmentName($db, $intezmeny_id, $attachment_id);
-        if ($attachment_id === null) return handleReturn(ControllerRet::unexpected_error);
-
-        $file_contents = file_get_contents("user_data/intezmeny_$intezmeny_id/" . $attachment_name . "_" . $attachment_id);
-        if ($file_contents === false) return handleReturn(ControllerRet::unexpected_error);
+        $hash = Attachment::getAttachmentBlob($db, $intezmeny_id, $attachment_id);
+        if ($hash === null) return handleReturn(ControllerRet::unexpected_error);
+        if ($hash === "") {
+            // Not yet moved to the blob store by check_blobs.php --migrate
+            $attachment_name = Attachment::getAttachmentName($db, $intezmeny_id, $attachment_id);
+            if ($attachment_name === null) return handleReturn(ControllerRet::unexpected_error);
+            $file = "intezmeny_$intezmeny_id/" . $attachment_name . "_" . $attachment_id;
+        } else {
+            $file = Blob::relativePath($hash);
+        }
+        $size = @filesize("user_data/$file");
+        if ($size === false) return handleReturn(ControllerRet::unexpected_error);
 
         header('Content-Type: application/octet-stream');
-        echo $file_contents;
+        if (isset($_SERVER["ACCEL_REDIRECT_PREFIX"]) and is_string($_SERVER["ACCEL_REDIRECT_PREFIX"])) {
+            header('X-Accel-Redirect: ' . $_SERVER["ACCEL_REDIRECT_PREFIX"] . implode("/", array_map("rawurlencode", explode("/", $file))));
+            return handleReturn(ControllerRet::success);
+        }
+
+        header('Accept-Ranges: bytes');
+        $range = parseRange(@$_SERVER["HTTP_RANGE"], $size);
+        if ($range === false) {
+            header("Content-Range: bytes */$size");
+            return handleReturn(ControllerRet::range_not_satisfiable);
+        }
+        if ($range === null) $range = array(0, $size - 1);
+        else header("Content-Range: bytes $range[0]-$range[1]/$size");
+        header('Content-Length: ' . ($range[1] - $range[0] + 1));
+        handleReturn($range[1] - $range[0] + 1 === $size ? ControllerRet::success : ControllerRet::success_partial_content);
+
+        if ($size !== 0 and file_stream_range("user_data/$file", $range[0], $range[1] - $range[0] + 1) === false) {
+            // The status and the headers are already sent so the client only sees a short body
+            logError("Streaming attachment $file failed");
+        }
+        return null;
+    }
+
+    /**
+     * Only answers requests from the server itself as it exposes internal counters
+     */
+    public static function getStats(): null
+    {
+        if (in_array($_SERVER["REMOTE_ADDR"] ?? "", array("127.0.0.1", "::1"), true) === false) return handleReturn(ControllerRet::unauthorised);
+
+        header('Content-Type: application/json');
+        echo json_encode(array("cache_enabled" => Cache::enabled(), "counters" => (object) Cache::counters()));
 
         return handleReturn(ControllerRet::success);
     }
 
+    /**
+     * Answers requests from the server itself and, if Config::$metrics_token is set, requests that send it as a bearer token
+     * Returns the per route metrics in the prometheus text format
+     */
+    public static function getMetrics(): null
+    {
+        $token = isset(Config::$metrics_token) ? Config::$metrics_token : null;
+        $authorization = $_SERVER["HTTP_AUTHORIZATION"] ?? "";
+        if (
+            in_array($_SERVER["REMOTE_ADDR"] ?? "", array("127.0.0.1", "::1"), true) === false
+            and ($token === null or is_string($authorization) === false or hash_equals("Bearer " . $token, $authorization) === false)
+        ) return handleReturn(ControllerRet::unauthorised);
+
+        header('Content-Type: text/plain; version=0.0.4');
+        echo Metrics::render();
+
+        return handleReturn(ControllerRet::success);
+    }
+
+    /**
+     * Sends the json of a read endpoint whose response only depends on the intezmeny's data and on $key
+     * The ETag is derived from the intezmeny's data version so a matching If-None-Match is answered with 304 without
+     * touching the intezmeny's schema, otherwise the json is served from the shared memory cache of the current version
+     * and $load is only called (and its result cached) on a miss
+     * A paged $load returns the page and the position the next page starts after, the cursor of which is sent in the
+     * X-Next-Cursor header
+     */
+    private static function respondVersioned(DB $db, int $intezmeny_id, string $key, callable $load, bool $paged = false): null
+    {
+        $data_version = Intezmeny::getDataVersion($db, $intezmeny_id);
+        if ($data_version === null) return handleReturn(ControllerRet::unexpected_error);
+
+        $etag = '"' . $intezmeny_id . '-' . $data_version . '-' . hash("xxh64", $key) . '"';
+        header("ETag: $etag");
+        // Clients may keep the response but have to revalidate it every time
+        header("Cache-Control: private, no-cache");
+        if (Controller::notModified($etag)) return handleReturn(ControllerRet::not_modified);
+
+        $json = Controller::versionedJson($intezmeny_id, $data_version, $key, $load, $paged);
+        if ($json === null) return handleReturn(ControllerRet::unexpected_error);
+        if ($paged === true) {
+            list($next_cursor, $json) = explode("\n", $json, 2);
+            if ($next_cursor !== "") header("X-Next-Cursor: $next_cursor");
+        }
+
+        header('Content-Type: application/json');
+        echo $json;
+
+        return handleReturn(ControllerRet::success);
+    }
+
+    /** Whether the request's If-None-Match matches $etag */
+    private static function notModified(string $etag): bool
+    {
+        if (isset($_SERVER["HTTP_IF_NONE_MATCH"]) === false or is_string($_SERVER["HTTP_IF_NONE_MATCH"]) === false) return false;
+        foreach (explode(",", $_SERVER["HTTP_IF_NONE_MATCH"]) as $candidate) {
+            // nginx weakens the ETag of gzipped responses so the comparison is weak
+            $candidate = trim($candidate);
+            if (str_starts_with($candidate, "W/")) $candidate = substr($candidate, 2);
+            if ($candidate === $etag or $candidate === "*") {
+                Cache::count("not_modified");
+                return true;
+            }
+        }
+        return false;
+    }
+
+    /**
+     * Returns the json of $load's result from the response cache or loads and caches it, null on failure
+     * The json of a page is preceded by the cursor of the next page (empty on the last page) and a newline
+     */
+    private static function versionedJson(int $intezmeny_id, int $data_version, string $key, callable $load, bool $paged = false): string|null
+    {
+        $json = Cache::fetchResponse($intezmeny_id, $data_version, $key);
+        if ($json !== null) return $json;
+        $ret = $load();
+        if ($ret === null) return null;
+        if ($paged === true) {
+            list($page, $next) = $ret;
+            $json = ($next === null ? "" : Controller::encodeCursor($next)) . "\n" . json_encode($page);
+        } else {
+            $json = json_encode($ret);
+        }
+        Cache::storeResponse($intezmeny_id, $data_version, $key, $json);
+        return $json;
+    }
+
+    private static function encodeJson(mixed $value): string|null
+    {
+        return $value === null ? null : json_encode($value);
+    }
+
+    /** The request's json body or the current operation's data while a batch runs */
+    private static function requestData(): mixed
+    {
+        if (Controller::$batch !== null) return Controller::$batch["data"];
+        return json_decode(file_get_contents("php://input"));
+    }
+
     /**
      * Returns the database connection and the intezmeny's id and the uid
      */
     private static function validateIntezmenyData(mixed $data, bool $invite_must_be_accepted): ControllerRet|array
     {
+        // The batch already authenticated the caller and its operations have to run on its connection
+        if (Controller::$batch !== null) return array(Controller::$batch["db"], Controller::$batch["intezmeny_id"], Controller::$batch["uid"]);
+
         $intezmeny_id = Controller::validateInteger(@$data->intezmeny_id);
         if ($intezmeny_id === null) return ControllerRet::bad_request;
+        Log::setIntezmenyId($intezmeny_id);
 
         $db = DB::init();
         if ($db === null) return ControllerRet::unexpected_error;
@@ -1469,18 +2207,42 @@ class Controller
         $token = $jwt->parseToken($_COOKIE["RefreshToken"]);
         if ($token === null) return ControllerRet::bad_request;
 
-        $ret = User::isRevokedToken($db, $token->claims()->get("uid"), $token->claims()->get(RegisteredClaims::ID));
-        if ($ret === true) return ControllerRet::unauthorised;
-        if ($ret === null) return ControllerRet::unexpected_error;
+        // The signature is checked first so that only tokens issued by us can reach the database and the cache
         if ($jwt->validateRefreshToken($token) === false) return ControllerRet::unauthorised;
-
-        $ret = User::userExists($db, $token->claims()->get("uid"));
-        if ($ret === false) return ControllerRet::unauthorised;
+        if (is_string($token->claims()->get("fam")) === false) return ControllerRet::unauthorised;
+        $ret = Controller::validateTokenGeneration($db, $token);
+        if ($ret !== null) return $ret;
+
+        $ret = User::isRevokedToken($db, $token->claims()->get("uid"), $token->claims()->get(RegisteredClaims::ID), $token->claims()->get("fam"));
+        // A revoked refresh token is only presented again if it was stolen (or its rotation raced), either way its whole
+        // family is revoked so neither the thief's nor the user's copy of the newest token can be used
+        if ($ret === true) return Controller::revokeTokenFamily($db, $token);
         if ($ret === null) return ControllerRet::unexpected_error;
 
         return $token;
     }
 
+    private static function revokeTokenFamily(DB $db, UnencryptedToken $token): ControllerRet
+    {
+        $expires_after = (new DateTimeImmutable("now", new DateTimeZone("UTC")))->modify(JWT::REFRESH_TOKEN_LIFETIME);
+        if (User::revokeTokenFamily($db, $token->claims()->get("uid"), $token->claims()->get("fam"), $expires_after) === null) {
+            return ControllerRet::unexpected_error;
+        }
+        return ControllerRet::unauthorised;
+    }
+
+    /**
+     * Returns null if the token was issued in the user's current token generation, which also means that the user exists
+     */
+    private static function validateTokenGeneration(DB $db, UnencryptedToken $token): ControllerRet|null
+    {
+        if (is_int($token->claims()->get("uid")) === false or is_int($token->claims()->get("gen")) === false) return ControllerRet::unauthorised;
+        $ret = User::getTokenGeneration($db, $token->claims()->get("uid"));
+        if ($ret === null) return ControllerRet::unexpected_error;
+        if ($ret !== $token->claims()->get("gen")) return ControllerRet::unauthorised;
+        return null;
+    }
+
     private static function validateAccessToken(DB $db, JWT $jwt): ControllerRet|UnencryptedToken
     {
         if (isset($_COOKIE["AccessToken"]) === false or is_string($_COOKIE["AccessToken"]) === false) return ControllerRet::bad_request;
@@ -1488,18 +2250,46 @@ class Controller
         $token = $jwt->parseToken($_COOKIE["AccessToken"]);
         if ($token === null) return ControllerRet::bad_request;
 
-        $ret = User::isRevokedToken($db, $token->claims()->get("uid"), $token->claims()->get(RegisteredClaims::ID));
-        if ($ret === true) return ControllerRet::unauthorised;
-        if ($ret === null) return ControllerRet::unexpected_error;
+        // The signature is checked first so that only tokens issued by us can reach the database and the cache
         if ($jwt->validateAccessToken($token) === false) return ControllerRet::unauthorised;
-
-        $ret = User::userExists($db, $token->claims()->get("uid"));
-        if ($ret === false) return ControllerRet::unauthorised;
-        if ($ret === null) return ControllerRet::unexpected_error;
+        $ret = Controller::validateTokenGeneration($db, $token);
+        if ($ret !== null) return $ret;
 
         return $token;
     }
 
+    /** Config::$password_algo and $password_options (see password_cost.php) or php's defaults */
+    private static function passwordAlgorithm(): string|null
+    {
+        return isset(Config::$password_algo) ? Config::$password_algo : PASSWORD_DEFAULT;
+    }
+
+    private static function passwordOptions(): array
+    {
+        return isset(Config::$password_options) ? Config::$password_options : array();
+    }
+
+    /** Hashes a new password with the configured parameters, returns null on failure */
+    private static function passwordHash(string $pass): string|null
+    {
+        try {
+            return password_hash($pass, Controller::passwordAlgorithm(), Controller::passwordOptions());
+        } catch (ValueError $e) {
+            logError("Invalid password hashing parameters in config.php: " . $e->getMessage());
+            return null;
+        }
+    }
+
+    private static function passwordNeedsRehash(string $pass_hash): bool
+    {
+        try {
+            return password_needs_rehash($pass_hash, Controller::passwordAlgorithm(), Controller::passwordOptions());
+        } catch (ValueError $e) {
+            logError("Invalid password hashing parameters in config.php: " . $e->getMessage());
+            return false;
+        }
+    }
+
     // This static function handles the case where $number is undefined
     // It's expected that $number is passed in with the "@" stfu operator
     // If null is allowed and $number is null then returns false
@@ -1519,6 +2309,16 @@ class Controller
         return $int;
     }
 
+    // This static function handles the case where $boolean is undefined
+    // It's expected that $boolean is passed in with the "@" stfu operator
+    // If $boolean is undefined then returns $default, only json booleans are accepted
+    private static function validateBoolean(mixed $boolean, bool $default = false): bool|null
+    {
+        if (!isset($boolean)) return $default;
+        if (!is_bool($boolean)) return null;
+        return $boolean;
+    }
+
     // This static function handles the case where $string is undefined
     // It's expected that $string is passed in with the "@" stfu operator
     // If null is allowed and $string is null then returns false
@@ -1609,6 +2409,36 @@ class Controller
         return $ret;
     }
 
+    // This static function handles the case where $cursor is undefined
+    // It's expected that $cursor is passed in with the "@" stfu operator
+    // If null is allowed and $cursor is null then returns false
+    // Returns the (published, id) position encodeCursor made the cursor from
+    private static function validateCursor(mixed $cursor, bool $null_allowed = false): array|null|false
+    {
+        if (isset($cursor) === false) {
+            if ($null_allowed === true) {
+                return false;
+            } else {
+                return null;
+            }
+        }
+        $str_cursor = Controller::validateString(@$cursor, max_chars: 64);
+        if ($str_cursor === null) return null;
+        $json = base64_decode(strtr($str_cursor, "-_", "+/"), true);
+        if ($json === false) return null;
+        $position = json_decode($json);
+        if (is_array($position) === false or count($position) !== 2 or is_string($position[0]) === false or is_int($position[1]) === false or $position[1] < 1) return null;
+        $published = DateTimeImmutable::createFromFormat("Y-m-d H:i:s", $position[0]);
+        if ($published === false or DateTimeImmutable::getLastErrors() !== false or $published->format("Y-m-d H:i:s") !== $position[0]) return null;
+        return $position;
+    }
+
+    /** The opaque cursor of a (published, id) position, url safe base64 of its json */
+    private static function encodeCursor(array $position): string
+    {
+        return rtrim(strtr(base64_encode(json_encode($position)), "+/", "-_"), "=");
+    }
+
     /**
      * This static function handles the case where $time is undefined
      * It's expected that $time is passed in with the "@" stfu operator
@@ -1670,9 +2500,18 @@ function handleReturn(ControllerRet $ret_val): null
         case ControllerRet::success_created:
             http_response_code(201);
             break;
+        case ControllerRet::success_accepted:
+            http_response_code(202);
+            break;
         case ControllerRet::success_no_content:
             http_response_code(204);
             break;
+        case ControllerRet::success_partial_content:
+            http_response_code(206);
+            break;
+        case ControllerRet::not_modified:
+            http_response_code(304);
+            break;
         case ControllerRet::bad_request:
             http_response_code(400);
             header('Content-Type: text/plain');
@@ -1693,6 +2532,13 @@ function handleReturn(ControllerRet $ret_val): null
             header('Content-Type: text/plain');
             echo "Not found";
             break;
+        case ControllerRet::range_not_satisfiable:
+            http_response_code(416);
+            break;
+        case ControllerRet::conflict:
+            // The caller echoes what the request conflicts with
+            http_response_code(409);
+            break;
         case ControllerRet::unexpected_error:
             http_response_code(500);
             header('Content-Type: text/plain');
@@ -1711,45 +2557,55 @@ enum ControllerRet
 {
     case success;
     case success_created;
+    case success_accepted;
     case success_no_content;
+    case success_partial_content;
+    case not_modified;
     case bad_request;
     case already_exists;
     case unauthorised;
     case not_found;
+    case conflict;
+    case range_not_satisfiable;
     case unexpected_error;
 }
 
-function file_force_contents(string $dir, string $contents): int|false
+/**
+ * Parses a single "bytes=" range of the Range header against a file of $size bytes and returns the first and last byte
+ * Returns null if the whole file should be sent (no header, a malformed header or multiple ranges) and false if the
+ * range is unsatisfiable
+ */
+function parseRange(mixed $header, int $size): array|null|false
 {
-    $parts = explode('/', $dir);
-    $file = array_pop($parts);
-    $dir = implode("/", $parts);
-    if (is_dir($dir) === false) mkdir($dir, recursive: true);
-    try {
-        return file_put_contents("$dir/$file", $contents, LOCK_EX);
-    } catch (ValueError) {
-        return false;
+    if (is_string($header) === false or preg_match('/^bytes=(\d*)-(\d*)$/', trim($header), $matches) !== 1) return null;
+    if ($matches[1] === "" and $matches[2] === "") return null;
+    if ($matches[1] === "") {
+        // A suffix range, the last n bytes
+        $length = (int) $matches[2];
+        if ($length === 0 or $size === 0) return false;
+        return array(max(0, $size - $length), $size - 1);
     }
+    $first = (int) $matches[1];
+    $last = $matches[2] === "" ? $size - 1 : min((int) $matches[2], $size - 1);
+    if ($first >= $size or $first > $last) return false;
+    return array($first, $last);
 }
 
 /**
- * ReturnshandleReturn( true on success and null on failur)e
+ * Copies $length bytes of $path starting at $offset to the output without loading the file into memory
  */
-function rmdirRecursive(string $dir): bool
+function file_stream_range(string $path, int $offset, int $length): bool
 {
-    if (is_dir($dir)) {
-        $objects = scandir($dir);
-        if ($objects === false) return false;
-        foreach ($objects as $object) {
-            if ($object !== "." && $object !== "..") {
-                if (is_dir($dir . '/' . $object) && !is_link($dir . '/' . $object)) {
-                    if (rmdirRecursive($dir . '/' . $object) === false) return false;
-                } else {
-                    if (unlink($dir . '/' . $object) === false) return false;
-                }
-            }
-        }
-        if (rmdir($dir) === false) return false;
+    while (ob_get_level() > 0) ob_end_flush();
+    $in = fopen($path, "rb");
+    if ($in === false) return false;
+    $out = fopen("php://output", "wb");
+    if ($out === false) {
+        fclose($in);
+        return false;
     }
-    return true;
+    $copied = stream_copy_to_stream($in, $out, $length, $offset);
+    fclose($in);
+    fclose($out);
+    return $copied === $length;
 }
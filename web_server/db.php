@@ -6,38 +6,147 @@ namespace DB;
 
 require_once "error.php";
 require_once "config.php";
+require_once "cache.php";
 require_once "intezmeny_sql.php";
+require_once "metrics.php";
 
+use Cache\Cache;
 use Config\Config;
 use function Error\logError;
 use Exception;
+use Metrics\Metrics;
 use mysqli;
 use mysqli_result;
 
+/**
+ * A mysqli connection that reports the statements it sends and the time spent on them to Metrics
+ * multi_query counts as a single statement, the time spent on the results of its further statements is added by next_result
+ */
+class Connection extends mysqli
+{
+    public function query(string $query, int $result_mode = MYSQLI_STORE_RESULT): mysqli_result|bool
+    {
+        $started = hrtime(true);
+        try {
+            return parent::query($query, $result_mode);
+        } finally {
+            Metrics::addQuery(hrtime(true) - $started);
+        }
+    }
+
+    public function execute_query(string $query, ?array $params = null): mysqli_result|bool
+    {
+        $started = hrtime(true);
+        try {
+            return parent::execute_query($query, $params);
+        } finally {
+            Metrics::addQuery(hrtime(true) - $started);
+        }
+    }
+
+    public function multi_query(string $query): bool
+    {
+        $started = hrtime(true);
+        try {
+            return parent::multi_query($query);
+        } finally {
+            Metrics::addQuery(hrtime(true) - $started);
+        }
+    }
+
+    public function next_result(): bool
+    {
+        $started = hrtime(true);
+        try {
+            return parent::next_result();
+        } finally {
+            Metrics::addQuery(hrtime(true) - $started, 0);
+        }
+    }
+
+    public function select_db(string $database): bool
+    {
+        $started = hrtime(true);
+        try {
+            return parent::select_db($database);
+        } finally {
+            Metrics::addQuery(hrtime(true) - $started);
+        }
+    }
+}
+
 class DB
 {
+    /** Maximum number of parent ids bound to a single query by loadChildren */
+    const CHILD_BATCH_SIZE = 1000;
+
     public mysqli $connection;
+    /** The schema the connection currently uses, null if unknown */
+    private string|null $selected_schema;
 
-    public function __construct(mysqli $connection)
+    public function __construct(mysqli $connection, string|null $selected_schema)
     {
         $this->connection = $connection;
+        $this->selected_schema = $selected_schema;
     }
 
+    /**
+     * Connects to the database, reusing one of the process's persistent connections if there is an idle one
+     * mysqli resets a reused persistent connection (rolls back open transactions, drops temporary tables, releases locks,
+     * resets session variables and the selected schema) before returning it so no state leaks between requests
+     */
     public static function init(): DB|null
     {
+        $persistent = isset(Config::$database_persistent) ? Config::$database_persistent : true;
         try {
-            $connection = mysqli_connect(Config::$database_address, Config::$database_username, Config::$database_password, Config::$database_name);
-            if ($connection === false) {
+            $idle_links = mysqli_get_links_stats()["cached_plinks"];
+            $connection = new Connection(
+                ($persistent === true ? "p:" : "") . Config::$database_address,
+                Config::$database_username,
+                Config::$database_password,
+                Config::$database_name
+            );
+            if ($connection->connect_errno !== 0) {
                 logError(mysqli_connect_error());
                 return null;
             }
-            return new DB($connection);
+            if ($persistent === true and mysqli_get_links_stats()["cached_plinks"] < $idle_links) {
+                Cache::count("db_connections_reused");
+            } else {
+                Cache::count("db_connections_opened");
+            }
+            return new DB($connection, Config::$database_name);
         } catch (Exception) {
             logError(mysqli_connect_error());
             return null;
         }
     }
 
+    /**
+     * Selects the schema unless the connection already uses it
+     * Returns true on success and null on failure
+     */
+    public function selectDb(string $schema): true|null
+    {
+        if ($this->selected_schema === $schema) {
+            Cache::count("db_select_skipped");
+            return true;
+        }
+        Cache::count("db_select");
+        if ($this->logError($this->connection->select_db($schema)) === null) {
+            $this->selected_schema = null;
+            return null;
+        }
+        $this->selected_schema = $schema;
+        return true;
+    }
+
+    /** Has to be called after running sql that may change the schema (e.g. USE) outside of selectDb */
+    public function forgetSelectedSchema(): void
+    {
+        $this->selected_schema = null;
+    }
+
     /** Returns first results contents as 2d array or null if $cur_result is null */
     private function freeRemainingResults(mysqli_result|null $cur_result): array|null
     {
@@ -67,6 +176,32 @@ class DB
         return $ret_value;
     }
 
+    /**
+     * Loads the children of many parents with one query per CHILD_BATCH_SIZE parents instead of one query per parent
+     * $select has to select the parent's id as its first column and must not have a WHERE or ORDER BY clause
+     * If $parent_ids is null the children of every parent are loaded with a single query
+     * Returns the rest of the children's columns grouped by their parent's id, parents without children are left out
+     */
+    public function loadChildren(string $select, string $parent_column, array|null $parent_ids, string $order_by = ""): array|null
+    {
+        if ($parent_ids === null) {
+            $batches = array(array());
+        } else {
+            $batches = array_chunk(array_values(array_unique($parent_ids)), DB::CHILD_BATCH_SIZE);
+        }
+
+        $children = array();
+        foreach ($batches as $batch) {
+            $where = $parent_ids === null ? "" : " WHERE " . $parent_column . " IN (" . implode(", ", array_fill(0, count($batch), "?")) . ")";
+            $ret = $this->handleQueryResult($this->connection->execute_query($select . $where . " " . $order_by, $batch));
+            if ($ret === null) return null;
+            foreach ($ret as $row) {
+                $children[$row[0]][] = array_slice($row, 1);
+            }
+        }
+        return $children;
+    }
+
     /** Frees all results but only returns the first */
     public function handleQueryResult(mysqli_result|bool $ret): array|bool|null
     {
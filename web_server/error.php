@@ -4,14 +4,180 @@ declare(strict_types=1);
 
 namespace Error;
 
-function logError(string $msg): bool
+require_once "config.php";
+
+use Config\Config;
+use DateTimeImmutable;
+
+/**
+ * Structured (json lines) logging of errors and of every request
+ * Records are buffered for the request and written with a single append once the response was sent, without a lock, so
+ * logging never makes a request wait for another one
+ * Every record carries the request's id (also sent back in the X-Request-Id header), route and intezmeny id
+ * Config::$log_path, $log_level, $log_access, $log_max_bytes, $log_max_files and $log_udp_sink tune it, see the defaults below
+ */
+class Log
 {
-    if (file_put_contents(
-        "error_logs.txt",
-        date("Y-m-d H:i:s T", time()) . ": " . $msg . "\n",
-        FILE_APPEND | LOCK_EX
-    ) === false) {
-        return false;
+    const LEVELS = array("debug" => 0, "info" => 1, "warning" => 2, "error" => 3);
+    // syslog severities of the levels
+    const SEVERITIES = array("debug" => 7, "info" => 6, "warning" => 4, "error" => 3);
+    // syslog facility local0
+    const FACILITY = 16;
+
+    private static array $records = array();
+    private static bool $registered = false;
+    private static bool $finished = false;
+    private static string|null $request_id = null;
+    private static int|null $intezmeny_id = null;
+
+    /** Starts the request's log, has to be called before anything is sent */
+    public static function init(): void
+    {
+        Log::register();
+        header("X-Request-Id: " . Log::requestId());
+    }
+
+    /** The id of the request, taken from the X-Request-Id header of a proxy if it sent a sane one */
+    public static function requestId(): string
+    {
+        if (Log::$request_id === null) {
+            $header = $_SERVER["HTTP_X_REQUEST_ID"] ?? null;
+            Log::$request_id = (is_string($header) and preg_match('/^[A-Za-z0-9._-]{1,64}$/', $header) === 1) ? $header : bin2hex(random_bytes(8));
+        }
+        return Log::$request_id;
+    }
+
+    /** Tags the rest of the request's records with the intezmeny it works on */
+    public static function setIntezmenyId(int $intezmeny_id): void
+    {
+        Log::$intezmeny_id = $intezmeny_id;
+    }
+
+    public static function debug(string $msg, array $context = array()): void
+    {
+        Log::write("debug", $msg, $context);
+    }
+
+    public static function info(string $msg, array $context = array()): void
+    {
+        Log::write("info", $msg, $context);
+    }
+
+    public static function warning(string $msg, array $context = array()): void
+    {
+        Log::write("warning", $msg, $context);
+    }
+
+    public static function error(string $msg, array $context = array()): void
+    {
+        Log::write("error", $msg, $context);
+    }
+
+    public static function write(string $level, string $msg, array $context = array()): void
+    {
+        if (Log::LEVELS[$level] < Log::LEVELS[Log::minimumLevel()]) return;
+        Log::register();
+        Log::$records[] = Log::record($level, $msg, $context);
     }
+
+    /**
+     * Writes the buffered records, run at shutdown
+     * Under php-fpm the response is finished first so the client doesn't wait for the write
+     * Work deferred until after the response (shutdown functions registered later) calls it again to write its own records
+     */
+    public static function flush(): void
+    {
+        if (PHP_SAPI !== "cli" and Log::$finished === false) {
+            Log::$finished = true;
+            $status = http_response_code();
+            if (function_exists("fastcgi_finish_request")) fastcgi_finish_request();
+            if ((isset(Config::$log_access) ? Config::$log_access : true) === true) {
+                $record = Log::record("info", "request", array(
+                    "method" => $_SERVER["REQUEST_METHOD"] ?? null,
+                    "status" => $status === false ? null : $status,
+                    "duration_ms" => round((microtime(true) - ($_SERVER["REQUEST_TIME_FLOAT"] ?? microtime(true))) * 1000, 3),
+                ));
+                if (Log::LEVELS["info"] >= Log::LEVELS[Log::minimumLevel()]) Log::$records[] = $record;
+            }
+        }
+        if (count(Log::$records) === 0) return;
+
+        $lines = "";
+        foreach (Log::$records as $record) {
+            $lines .= json_encode($record, JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE | JSON_INVALID_UTF8_SUBSTITUTE) . "\n";
+        }
+        $path = isset(Config::$log_path) ? Config::$log_path : "logs/ordayna.jsonl";
+        if (is_dir(dirname($path)) === false) @mkdir(dirname($path), 0770, true);
+        Log::rotate($path);
+        // A single O_APPEND write doesn't interleave with the other processes' writes so no lock is needed
+        if (@file_put_contents($path, $lines, FILE_APPEND) === false) error_log("Could not write the log file: " . $path);
+
+        if (isset(Config::$log_udp_sink) and Config::$log_udp_sink !== null) Log::ship(Config::$log_udp_sink);
+        Log::$records = array();
+    }
+
+    private static function register(): void
+    {
+        if (Log::$registered === true) return;
+        Log::$registered = true;
+        register_shutdown_function(array(Log::class, "flush"));
+    }
+
+    private static function minimumLevel(): string
+    {
+        $level = isset(Config::$log_level) ? Config::$log_level : "info";
+        return array_key_exists($level, Log::LEVELS) ? $level : "info";
+    }
+
+    private static function record(string $level, string $msg, array $context): array
+    {
+        return array(
+            "time" => (new DateTimeImmutable())->format("Y-m-d\TH:i:s.vP"),
+            "level" => $level,
+            "msg" => $msg,
+            "request_id" => PHP_SAPI === "cli" ? null : Log::requestId(),
+            "route" => PHP_SAPI === "cli" ? ($_SERVER["argv"][0] ?? null) : explode("?", $_SERVER["REQUEST_URI"] ?? "")[0],
+            "intezmeny_id" => Log::$intezmeny_id,
+        ) + $context;
+    }
+
+    /**
+     * Moves the log file aside once it reaches Config::$log_max_bytes and keeps the newest Config::$log_max_files of the
+     * moved files, the directory of the log file has to be writable
+     * A process that loses the race for the rename just appends to the new file
+     */
+    private static function rotate(string $path): void
+    {
+        $max_bytes = isset(Config::$log_max_bytes) ? Config::$log_max_bytes : 16 * 1024 * 1024;
+        $size = @filesize($path);
+        if ($size === false or $size < $max_bytes) return;
+        if (@rename($path, $path . "." . date("Ymd-His") . "-" . Log::requestId()) === false) return;
+
+        $max_files = isset(Config::$log_max_files) ? Config::$log_max_files : 5;
+        $rotated = glob($path . ".*");
+        if ($rotated === false) return;
+        sort($rotated);
+        foreach (array_slice($rotated, 0, max(0, count($rotated) - $max_files)) as $old) @unlink($old);
+    }
+
+    /** Sends every record as a syslog datagram, a sink that isn't listening loses them without slowing the request */
+    private static function ship(string $sink): void
+    {
+        $socket = @stream_socket_client("udp://" . $sink, $error_code, $error_message, 0.1);
+        if ($socket === false) return;
+        $host = gethostname();
+        foreach (Log::$records as $record) {
+            $pri = Log::FACILITY * 8 + Log::SEVERITIES[$record["level"]];
+            @fwrite($socket, "<$pri>1 " . $record["time"] . " " . ($host === false ? "-" : $host) . " ordayna - - - "
+                . json_encode($record, JSON_UNESCAPED_SLASHES | JSON_UNESCAPED_UNICODE | JSON_INVALID_UTF8_SUBSTITUTE));
+        }
+        fclose($socket);
+    }
+}
+
+/** Logs an error of the current request, kept for the callers from before Log */
+function logError(string $msg): bool
+{
+    Log::error($msg);
     return true;
 }
@@ -0,0 +1,45 @@
+<?php
+
+// Tops up the pool of empty intezmenys that /create_intezmeny claims instead of creating a schema in the request
+// Also deletes the pooled intezmenys that were created from an older intezmeny_sql.php
+// Meant to be run periodically (e.g. every minute from cron), the pool size defaults to Config::$intezmeny_pool_size or 10
+// job_worker.php also fills the pool when /create_intezmeny finds it empty
+// Usage: php fill_intezmeny_pool.php [pool size]
+
+declare(strict_types=1);
+
+namespace FillIntezmenyPool;
+
+chdir(__DIR__);
+
+require_once "db.php";
+require_once "models/intezmeny.php";
+
+use DB\DB;
+use Intezmeny\Intezmeny;
+
+if (PHP_SAPI !== "cli") exit(1);
+
+$size = Intezmeny::poolSize();
+if (isset($argv[1])) {
+    if (ctype_digit($argv[1]) === false) {
+        fwrite(STDERR, "Usage: php fill_intezmeny_pool.php [pool size]\n");
+        exit(1);
+    }
+    $size = (int) $argv[1];
+}
+
+$db = DB::init();
+if ($db === null) {
+    fwrite(STDERR, "Could not connect to the database\n");
+    exit(1);
+}
+
+$ret = Intezmeny::fillPool($db, $size);
+if ($ret === null) {
+    fwrite(STDERR, "Filling the pool failed\n");
+    exit(1);
+}
+list($deleted, $created) = $ret;
+echo "Deleted $deleted stale and created $created new pooled intezmenys\n";
+exit(0);
@@ -16,6 +16,15 @@ CREATE OR REPLACE TABLE group_ (
     CONSTRAINT fk_group_class FOREIGN KEY ( class_id ) REFERENCES class( id ) ON DELETE SET NULL ON UPDATE CASCADE
 );
 
+-- The users (ordayna_main_db.users) in a group, user_id comes first as the personal views look up the groups of a user
+CREATE OR REPLACE TABLE group_member (
+    group_id INT UNSIGNED NOT NULL,
+    user_id  INT UNSIGNED NOT NULL,
+    PRIMARY KEY ( user_id, group_id ),
+    INDEX group_member_group ( group_id ),
+    CONSTRAINT fk_group_member_group FOREIGN KEY ( group_id ) REFERENCES group_( id ) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
 CREATE OR REPLACE TABLE lesson (
     id   INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(200) UNIQUE NOT NULL
@@ -64,6 +73,11 @@ CREATE OR REPLACE TABLE timetable (
     lesson_id  INT UNSIGNED DEFAULT NULL,
     teacher_id INT UNSIGNED DEFAULT NULL,
     room_id    INT UNSIGNED DEFAULT NULL,
+    INDEX timetable_group_day_start ( group_id, day, start ),
+    INDEX timetable_teacher_day_start ( teacher_id, day, start ),
+    INDEX timetable_room_day_start ( room_id, day, start ),
+    INDEX timetable_day_start ( day, start ),
+    INDEX timetable_until ( until ),
     CONSTRAINT fk_timetable_group_ FOREIGN KEY ( group_id ) REFERENCES group_( id ) ON DELETE SET NULL ON UPDATE CASCADE,
     CONSTRAINT fk_timetable_class FOREIGN KEY ( room_id ) REFERENCES room( id ) ON DELETE SET NULL ON UPDATE CASCADE,
     CONSTRAINT fk_timetable_lesson FOREIGN KEY ( lesson_id ) REFERENCES lesson( id ) ON DELETE SET NULL ON UPDATE CASCADE,
@@ -78,162 +92,258 @@ CREATE OR REPLACE TABLE homework (
     group_id    INT UNSIGNED NOT NULL,
     lesson_id   INT UNSIGNED NOT NULL,
     teacher_id  INT UNSIGNED NOT NULL,
+    -- The feed is paged newest first by (published, id), the filtered feeds have their own index with the filter first
+    INDEX homework_published ( published, id ),
+    INDEX homework_group_published ( group_id, published, id ),
+    INDEX homework_lesson_published ( lesson_id, published, id ),
+    INDEX homework_teacher_published ( teacher_id, published, id ),
+    INDEX homework_due ( due ),
     CONSTRAINT fk_homework_lesson FOREIGN KEY ( lesson_id ) REFERENCES lesson( id ) ON DELETE CASCADE ON UPDATE CASCADE,
     CONSTRAINT fk_homework_teacher FOREIGN KEY ( teacher_id ) REFERENCES teacher( id ) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
+-- The contents are stored once per sha256 in the blob store, see models/blob.php
 CREATE OR REPLACE TABLE attachments (
     id          INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
     homework_id INT UNSIGNED NOT NULL,
     file_name VARCHAR(200) NOT NULL,
+    sha256      CHAR(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+    INDEX attachments_sha256 ( sha256 ),
     CONSTRAINT fk_attachment_homework FOREIGN KEY ( homework_id ) REFERENCES homework( id ) ON DELETE CASCADE ON UPDATE CASCADE
 );
 ';
 
 $intezmeny_procedures = '
+-- Every procedure that changes data has to call this after the change so that responses cached for the old version
+-- are never served again, the id of the intezmeny is the suffix of the name of its schema
+CREATE OR REPLACE PROCEDURE bumpDataVersion ()
+BEGIN
+    UPDATE ordayna_main_db.intezmeny SET data_version = data_version + 1
+    WHERE id = CAST(SUBSTRING(DATABASE(), LENGTH("ordayna_intezmeny_") + 1) AS UNSIGNED);
+END;
+
 CREATE OR REPLACE PROCEDURE newClass ( IN in_name VARCHAR(200), IN in_headcount SMALLINT UNSIGNED )
 BEGIN
     INSERT INTO class (name) VALUES (in_name);
     CALL newGroup(in_name, in_headcount, LAST_INSERT_ID());
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modClass ( IN in_id INT UNSIGNED, IN in_name VARCHAR(200))
 BEGIN
     UPDATE class SET name=in_name WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delClass ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM class WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newGroup ( IN in_name VARCHAR(200), IN in_headcount SMALLINT UNSIGNED, IN in_class_id INT UNSIGNED )
 BEGIN
     INSERT INTO group_ (name, headcount, class_id) VALUES (in_name, in_headcount, in_class_id);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modGroup ( IN in_id INT UNSIGNED, IN in_name VARCHAR(200), IN in_headcount SMALLINT UNSIGNED, IN in_class_id INT UNSIGNED )
 BEGIN
     UPDATE group_ SET name=in_name, headcount=in_headcount, class_id=in_class_id WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delGroup ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM group_ WHERE id=in_id;
+    CALL bumpDataVersion();
+END;
+
+CREATE OR REPLACE PROCEDURE newGroupMember ( IN in_group_id INT UNSIGNED, IN in_user_id INT UNSIGNED )
+BEGIN
+    INSERT INTO group_member (group_id, user_id) VALUES (in_group_id, in_user_id);
+    CALL bumpDataVersion();
+END;
+
+CREATE OR REPLACE PROCEDURE delGroupMember ( IN in_group_id INT UNSIGNED, IN in_user_id INT UNSIGNED )
+BEGIN
+    DELETE FROM group_member WHERE group_id=in_group_id AND user_id=in_user_id;
+    CALL bumpDataVersion();
+END;
+
+CREATE OR REPLACE PROCEDURE delUserGroupMembers ( IN in_user_id INT UNSIGNED )
+BEGIN
+    DELETE FROM group_member WHERE user_id=in_user_id;
+    CALL bumpDataVersion();
+END;
+
+-- Takes the attachments that are about to be deleted off the reference counts of their blobs, the foreign keys delete
+-- the attachments of deleted homeworks, lessons and teachers so every procedure that deletes one of them has to call
+-- this first with the id it deletes (the other arguments are NULL)
+CREATE OR REPLACE PROCEDURE releaseBlobs ( IN in_attachment_id INT UNSIGNED, IN in_homework_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED )
+BEGIN
+    UPDATE ordayna_main_db.blobs
+    JOIN (
+        SELECT attachments.sha256, COUNT(*) AS refs
+        FROM attachments JOIN homework ON homework.id = attachments.homework_id
+        WHERE attachments.id = in_attachment_id OR homework.id = in_homework_id OR homework.lesson_id = in_lesson_id OR homework.teacher_id = in_teacher_id
+        GROUP BY attachments.sha256
+    ) AS released ON released.sha256 = blobs.sha256
+    SET blobs.ref_count = IF(blobs.ref_count > released.refs, blobs.ref_count - released.refs, 0), blobs.released = NOW();
+END;
+
+-- Takes every attachment off the reference counts and deletes them, called before the schema of the intezmeny is dropped
+-- Run in a transaction so that a retry after a failure never releases the same references twice
+CREATE OR REPLACE PROCEDURE releaseAllBlobs ()
+BEGIN
+    UPDATE ordayna_main_db.blobs
+    JOIN (SELECT sha256, COUNT(*) AS refs FROM attachments GROUP BY sha256) AS released ON released.sha256 = blobs.sha256
+    SET blobs.ref_count = IF(blobs.ref_count > released.refs, blobs.ref_count - released.refs, 0), blobs.released = NOW();
+    DELETE FROM attachments;
 END;
 
 CREATE OR REPLACE PROCEDURE newLesson ( IN in_name VARCHAR(200) )
 BEGIN
     INSERT INTO lesson (name) VALUES (in_name);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modLesson ( IN in_id INT UNSIGNED, IN in_name VARCHAR(200) )
 BEGIN
     UPDATE lesson SET name=in_name WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delLesson ( IN in_id INT UNSIGNED )
 BEGIN
+    CALL releaseBlobs(NULL, NULL, in_id, NULL);
     DELETE FROM lesson WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newRoom ( IN in_name VARCHAR(200), IN in_type VARCHAR(200), IN in_space INT UNSIGNED )
 BEGIN
     INSERT INTO room (name, type, space) VALUES (in_name, in_type, in_space);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modRoom ( IN in_id INT UNSIGNED, IN in_name VARCHAR(200), IN in_type VARCHAR(200), IN in_space INT UNSIGNED )
 BEGIN
     UPDATE room SET name=in_name, type=in_type, space=in_space WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delRoom ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM room WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newTeacher ( IN in_name VARCHAR(200), IN in_job VARCHAR(200), IN in_user_id INT UNSIGNED )
 BEGIN
     INSERT INTO teacher (name, job, user_id) VALUES (in_name, in_job, in_user_id);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modTeacher ( IN in_id INT UNSIGNED, IN in_name VARCHAR(200), IN in_job VARCHAR(200), in_user_id INT UNSIGNED )
 BEGIN
     UPDATE teacher SET name=in_name, job=in_job, user_id=in_user_id WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delTeacher ( IN in_id INT UNSIGNED )
 BEGIN
+    CALL releaseBlobs(NULL, NULL, NULL, in_id);
     DELETE FROM teacher WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newTeacher_lesson ( IN in_teacher_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED )
 BEGIN
     INSERT INTO teacher_lesson (teacher_id, lesson_id) VALUES (in_teacher_id, in_lesson_id);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modTeacher_lesson ( IN in_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED )
 BEGIN
     UPDATE teacher_lesson SET teacher_id=in_teacher_id, lesson_id=in_lesson_id WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delTeacher_lesson ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM teacher_lesson WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newTeacher_availability ( IN in_teacher_id INT UNSIGNED, IN in_available_from_day TINYINT UNSIGNED, IN in_available_from_time TIME, IN in_available_until_day TINYINT UNSIGNED, IN in_available_until_time TIME )
 BEGIN
     INSERT INTO teacher_availability (teacher_id, available_from_day, available_from_time, available_until_day, available_until_time) VALUES (in_teacher_id, in_available_from_day, in_available_from_time, in_available_until_day, in_available_until_time);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modTeacher_availability ( IN in_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED, IN in_available_from_day TINYINT UNSIGNED, IN in_available_from_time TIME, IN in_available_until_day TINYINT UNSIGNED, IN in_available_until_time TIME )
 BEGIN
     UPDATE teacher_availability SET teacher_id=in_teacher_id, available_from_day=in_available_from_day, available_from_time=in_available_from_time, available_until_day=in_available_until_day, available_until_time=in_available_until_time WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delTeacher_availability ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM teacher_availability WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newTimetableElement ( IN in_start TIME, IN in_duration TIME, IN in_day TINYINT UNSIGNED, IN in_from DATE, IN in_until DATE, IN in_group_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED, IN in_room_id INT UNSIGNED )
 BEGIN
     INSERT INTO timetable (start, duration, day, from_, until, group_id, lesson_id, teacher_id, room_id) VALUES (in_start, in_duration, in_day, in_from, in_until, in_group_id, in_lesson_id, in_teacher_id, in_room_id);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modTimetableElement ( IN in_id INT UNSIGNED, IN in_start TIME, IN in_duration TIME, IN in_day TINYINT UNSIGNED, IN in_from DATE, IN in_until DATE, IN in_group_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED, IN in_room_id INT UNSIGNED )
 BEGIN
     UPDATE timetable SET start=in_start, duration=in_duration, day=in_day, from_=in_from, until=in_until, group_id=in_group_id, lesson_id=in_lesson_id, teacher_id=in_teacher_id, room_id=in_room_id WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delTimetableElement ( IN in_id INT UNSIGNED )
 BEGIN
     DELETE FROM timetable WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE newHomework ( IN in_description TEXT, IN in_due DATETIME, IN in_group_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED )
 BEGIN
     INSERT INTO homework (description, due, group_id, lesson_id, teacher_id) VALUES (in_description, in_due, in_group_id, in_lesson_id, in_teacher_id);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE modHomework ( IN in_id INT UNSIGNED, IN in_description TEXT, IN in_due DATETIME, IN in_group_id INT UNSIGNED, IN in_lesson_id INT UNSIGNED, IN in_teacher_id INT UNSIGNED )
 BEGIN
     UPDATE homework SET description=in_description, due=in_due, group_id=in_group_id, lesson_id=in_lesson_id, teacher_id=in_teacher_id WHERE in_id=id;
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delHomework ( IN in_id INT UNSIGNED )
 BEGIN
+    CALL releaseBlobs(NULL, in_id, NULL, NULL);
     DELETE FROM homework WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 
-CREATE OR REPLACE PROCEDURE newAttachment ( IN in_homework_id INT UNSIGNED, IN in_file_name VARCHAR(200) )
+-- The blob has to be in the blob store already, its row is created by its first reference
+CREATE OR REPLACE PROCEDURE newAttachment ( IN in_homework_id INT UNSIGNED, IN in_file_name VARCHAR(200), IN in_sha256 CHAR(64), IN in_size BIGINT UNSIGNED )
 BEGIN
-    INSERT INTO attachments (homework_id, file_name) VALUES (in_homework_id, in_file_name);
+    INSERT INTO ordayna_main_db.blobs (sha256, size, ref_count) VALUES (in_sha256, in_size, 1)
+        ON DUPLICATE KEY UPDATE ref_count = ref_count + 1;
+    INSERT INTO attachments (homework_id, file_name, sha256) VALUES (in_homework_id, in_file_name, in_sha256);
+    CALL bumpDataVersion();
 END;
 
 CREATE OR REPLACE PROCEDURE delAttachment ( IN in_id INT UNSIGNED )
 BEGIN
+    CALL releaseBlobs(in_id, NULL, NULL, NULL);
     DELETE FROM attachments WHERE id=in_id;
+    CALL bumpDataVersion();
 END;
 ';
@@ -0,0 +1,93 @@
+<?php
+
+// Runs the queued jobs (see models/job.php) until none is due and exits
+// Meant to be run periodically (e.g. every minute from cron), at most Config::$job_workers (default 2) workers run at
+// once and the ones started while that many are running exit at once
+// Usage: php job_worker.php
+
+declare(strict_types=1);
+
+namespace JobWorker;
+
+chdir(__DIR__);
+
+require_once "db.php";
+require_once "models/intezmeny.php";
+require_once "models/job.php";
+
+use Config\Config;
+use DB\DB;
+use Intezmeny\Intezmeny;
+use Job\Job;
+use Throwable;
+
+if (PHP_SAPI !== "cli") exit(1);
+
+$workers = isset(Config::$job_workers) ? Config::$job_workers : 2;
+
+/** Returns null if the job succeeded and its error otherwise */
+function run(DB $db, string $type, mixed $payload): string|null
+{
+    switch ($type) {
+        case "delete_intezmeny":
+            if (is_int($payload["intezmeny_id"] ?? null) === false) return "Invalid payload";
+            if (Intezmeny::dropSchema($db, $payload["intezmeny_id"]) === null) return "Dropping the schema failed: " . $db->connection->error;
+            return null;
+        case "fill_intezmeny_pool":
+            if (Intezmeny::fillPool($db, Intezmeny::poolSize()) === null) return "Filling the pool failed: " . $db->connection->error;
+            return null;
+        default:
+            return "Unknown job type";
+    }
+}
+
+$db = DB::init();
+if ($db === null) {
+    fwrite(STDERR, "Could not connect to the database\n");
+    exit(1);
+}
+
+// The slots are locks of the worker's connection so a worker that dies frees its slot
+$slot = null;
+for ($i = 0; $i < $workers and $slot === null; $i++) {
+    $ret = $db->handleQueryResult($db->connection->execute_query('SELECT GET_LOCK(?, 0)', array("ordayna_job_worker_$i")));
+    if ($ret === null) exit(1);
+    if ($ret[0][0] === 1) $slot = $i;
+}
+if ($slot === null) {
+    echo "$workers workers are running already\n";
+    exit(0);
+}
+
+$done = 0;
+$failed = 0;
+while (true) {
+    $job = Job::claim($db);
+    if ($job === null) {
+        fwrite(STDERR, "Taking a job failed\n");
+        exit(1);
+    }
+    if ($job === false) break;
+    list($job_id, $type, $payload, $attempt) = $job;
+
+    if ($attempt > Job::MAX_ATTEMPTS) {
+        $error = "Abandoned by its worker";
+    } else {
+        try {
+            $error = run($db, $type, $payload);
+        } catch (Throwable $e) {
+            $error = get_class($e) . ": " . $e->getMessage();
+        }
+    }
+    if ($error === null) {
+        if (Job::finish($db, $job_id) === null) exit(1);
+        echo "Job $job_id ($type) done\n";
+        $done++;
+        continue;
+    }
+    fwrite(STDERR, "Job $job_id ($type) attempt $attempt failed: $error\n");
+    if (Job::fail($db, $job_id, $attempt, $error) === null) exit(1);
+    $failed++;
+}
+echo "Ran $done jobs, $failed failed\n";
+exit($failed === 0 ? 0 : 1);
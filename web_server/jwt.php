@@ -34,18 +34,31 @@ use Ramsey\Uuid\Uuid;
 
 class JWT
 {
+    const REFRESH_TOKEN_LIFETIME = '+15 day';
+    const ACCESS_TOKEN_LIFETIME = '+10 minute';
+
+    /** Built once per request, the signer, key, builder, parser and constraints are all immutable */
+    private static JWT|null $instance = null;
+
     private $tokenBuilder;
     private $algorithm;
     private $key;
+    private Parser $parser;
+    private Validator $validator;
+    private array $refresh_constraints;
+    private array $access_constraints;
 
     function __construct()
     {
         $this->tokenBuilder = new Builder(new JoseEncoder(), ChainedFormatter::default());
         $this->algorithm = new Blake2b();
+        $this->parser = new Parser(new JoseEncoder());
+        $this->validator = new Validator();
     }
 
     public static function init(): JWT|false
     {
+        if (JWT::$instance !== null) return JWT::$instance;
         $jwt = new JWT();
         try {
             $jwt->key = InMemory::plainText(Config::$jwt_secret);
@@ -53,10 +66,17 @@ class JWT
             logError("Failed to initialize JWT Class from Config::\$jwt_secret; Exception: " . $e->getMessage());
             return false;
         }
+        $jwt->refresh_constraints = $jwt->constraints("refresh", array("uid", "gen", "fam"));
+        $jwt->access_constraints = $jwt->constraints("access", array("uid", "gen"));
+        JWT::$instance = $jwt;
         return $jwt;
     }
 
-    public function createRefreshToken(int $user_id): UnencryptedToken
+    /**
+     * $generation is the user's current token generation (see User::getTokenGeneration)
+     * $family is the family of the refresh token this one replaces, a new family is started if it is null
+     */
+    public function createRefreshToken(int $user_id, int $generation, string|null $family = null): UnencryptedToken
     {
         $now = new DateTimeImmutable("now", new DateTimeZone("UTC"));
         return $this->tokenBuilder
@@ -73,16 +93,19 @@ class JWT
             // Configures the time that the token can be used (nbf claim)
             ->canOnlyBeUsedAfter($now)
             // Configures the expiration time of the token (exp claim)
-            ->expiresAt($now->modify('+15 day'))
+            ->expiresAt($now->modify(JWT::REFRESH_TOKEN_LIFETIME))
             // Configures a new claim, called "uid"
             ->withClaim('uid', $user_id)
+            ->withClaim('gen', $generation)
+            // Every refresh token rotated from the same login shares the family, reusing one of them revokes all of them
+            ->withClaim('fam', $family ?? Uuid::uuid4()->toString())
             // Configures a new header, called "foo"
             // ->withHeader('foo', 'bar')
             // Builds a new token
             ->getToken($this->algorithm, $this->key);
     }
 
-    public function createAccessToken(int $user_id): UnencryptedToken
+    public function createAccessToken(int $user_id, int $generation): UnencryptedToken
     {
         $now = new DateTimeImmutable("now", new DateTimeZone("UTC"));
         return $this->tokenBuilder
@@ -99,9 +122,10 @@ class JWT
             // Configures the time that the token can be used (nbf claim)
             ->canOnlyBeUsedAfter($now)
             // Configures the expiration time of the token (exp claim)
-            ->expiresAt($now->modify('+10 minute'))
+            ->expiresAt($now->modify(JWT::ACCESS_TOKEN_LIFETIME))
             // Configures a new claim, called "uid"
             ->withClaim('uid', $user_id)
+            ->withClaim('gen', $generation)
             // Configures a new header, called "foo"
             // ->withHeader('foo', 'bar')
             // Builds a new token
@@ -113,29 +137,7 @@ class JWT
      */
     public function validateRefreshToken(UnencryptedToken $token): bool
     {
-        $validator = new Validator();
-
-        if (!$validator->validate($token, new IssuedBy("http://ordayna.website"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new PermittedFor("http://ordayna.website"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new RelatedTo("refresh"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new SignedWith($this->algorithm, $this->key))) {
-            return false;
-        }
-        $clock = SystemClock::fromSystemTimezone();
-        if (!$validator->validate($token, new StrictValidAt($clock))) {
-            return false;
-        }
-        if (!$validator->validate($token, new HasClaim("uid"))) {
-            return false;
-        }
-
-        return true;
+        return $this->validator->validate($token, ...$this->refresh_constraints);
     }
 
     /**
@@ -143,38 +145,29 @@ class JWT
      */
     public function validateAccessToken(UnencryptedToken $token): bool
     {
-        $validator = new Validator();
-
-        if (!$validator->validate($token, new IssuedBy("http://ordayna.website"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new PermittedFor("http://ordayna.website"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new RelatedTo("access"))) {
-            return false;
-        }
-        if (!$validator->validate($token, new SignedWith($this->algorithm, $this->key))) {
-            return false;
-        }
-        $clock = SystemClock::fromSystemTimezone();
-        if (!$validator->validate($token, new StrictValidAt($clock))) {
-            return false;
-        }
-        if (!$validator->validate($token, new HasClaim("uid"))) {
-            return false;
-        }
-
-        return true;
+        return $this->validator->validate($token, ...$this->access_constraints);
     }
 
     public function parseToken(string $token_str): UnencryptedToken|null
     {
-        $parser = new Parser(new JoseEncoder());
         try {
-            return $parser->parse($token_str);
+            return $this->parser->parse($token_str);
         } catch (CannotDecodeContent | InvalidTokenStructure | UnsupportedHeaderFound) {
             return null;
         }
     }
+
+    /** The constraints a token of the subject has to satisfy, in the order they are checked */
+    private function constraints(string $subject, array $claims): array
+    {
+        $constraints = array(
+            new IssuedBy("http://ordayna.website"),
+            new PermittedFor("http://ordayna.website"),
+            new RelatedTo($subject),
+            new SignedWith($this->algorithm, $this->key),
+            new StrictValidAt(SystemClock::fromSystemTimezone()),
+        );
+        foreach ($claims as $claim) $constraints[] = new HasClaim($claim);
+        return $constraints;
+    }
 }
@@ -0,0 +1,169 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Metrics;
+
+require_once "cache.php";
+
+use Cache\Cache;
+
+/**
+ * Per route request counts by method and status, latency histograms and the number of sql statements and the time spent
+ * in the database, aggregated in shared memory (APCu) and rendered in the prometheus text format by /metrics
+ * Every response also gets a Server-Timing header with its own bootstrap, database and total time
+ */
+class Metrics
+{
+    /** Upper bounds of the latency histogram buckets in seconds, the last bucket is everything above */
+    const LATENCY_BUCKETS = array(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10);
+    /** Route label of every path that is not in the router's match table so unknown paths can't create new metrics */
+    const OTHER_ROUTE = "other";
+    /** The method labels, any other method is counted as Metrics::OTHER_METHOD so clients can't create new metrics */
+    const METHODS = array("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS");
+    const OTHER_METHOD = "OTHER";
+
+    private static string|null $route = null;
+    private static int $queries = 0;
+    private static int $db_ns = 0;
+    private static int $started_ns = 0;
+    private static float $boot = 0;
+
+    /** Starts measuring the request, has to be called before anything is sent */
+    public static function init(): void
+    {
+        Metrics::$started_ns = hrtime(true);
+        // Time spent loading and compiling the code before the router started, see preload.php
+        Metrics::$boot = max(0, microtime(true) - ($_SERVER["REQUEST_TIME_FLOAT"] ?? microtime(true)));
+        header_register_callback(array(Metrics::class, "sendServerTiming"));
+        register_shutdown_function(array(Metrics::class, "record"));
+    }
+
+    /** The requests are only recorded once their route is known */
+    public static function setRoute(string $route): void
+    {
+        Metrics::$route = $route;
+    }
+
+    /** Called by DB\Connection for every statement, $statements is 0 for the time spent fetching further results */
+    public static function addQuery(int $duration_ns, int $statements = 1): void
+    {
+        Metrics::$queries += $statements;
+        Metrics::$db_ns += $duration_ns;
+    }
+
+    public static function sendServerTiming(): void
+    {
+        header(sprintf(
+            'Server-Timing: boot;dur=%.3f, db;dur=%.3f;desc="%d queries", total;dur=%.3f',
+            Metrics::$boot * 1e3,
+            Metrics::$db_ns / 1e6,
+            Metrics::$queries,
+            (hrtime(true) - Metrics::$started_ns) / 1e6
+        ));
+    }
+
+    /** Adds the request to the shared metrics, run at shutdown */
+    public static function record(): void
+    {
+        if (Metrics::$route === null) return;
+        $status = http_response_code();
+        $duration = (hrtime(true) - Metrics::$started_ns) / 1e9;
+        $route = Metrics::$route;
+        $method = $_SERVER["REQUEST_METHOD"] ?? "";
+        if (in_array($method, Metrics::METHODS, true) === false) $method = Metrics::OTHER_METHOD;
+
+        Cache::countMetric("requests|$route|$method|" . ($status === false ? 200 : $status));
+        $bucket = count(Metrics::LATENCY_BUCKETS);
+        foreach (Metrics::LATENCY_BUCKETS as $i => $bound) {
+            if ($duration <= $bound) {
+                $bucket = $i;
+                break;
+            }
+        }
+        Cache::countMetric("latency|$route|$bucket");
+        // APCu can only increment integers so the sums are kept in microseconds
+        Cache::countMetric("latency_us|$route", (int) round($duration * 1e6));
+        Cache::countMetric("queries|$route", Metrics::$queries);
+        Cache::countMetric("db_us|$route", intdiv(Metrics::$db_ns, 1000));
+    }
+
+    /** Renders the shared metrics and the cache counters in the prometheus text format */
+    public static function render(): string
+    {
+        $requests = array();
+        $latency = array();
+        $latency_sum = array();
+        $queries = array();
+        $db_time = array();
+        foreach (Cache::metrics() as $name => $value) {
+            $parts = explode("|", $name);
+            switch ($parts[0]) {
+                case "requests":
+                    if (count($parts) === 4) $requests[] = array($parts[1], $parts[2], $parts[3], $value);
+                    break;
+                case "latency":
+                    if (count($parts) === 3) $latency[$parts[1]][(int) $parts[2]] = $value;
+                    break;
+                case "latency_us":
+                    $latency_sum[$parts[1]] = $value / 1e6;
+                    break;
+                case "queries":
+                    $queries[$parts[1]] = $value;
+                    break;
+                case "db_us":
+                    $db_time[$parts[1]] = $value / 1e6;
+                    break;
+            }
+        }
+
+        $out = "# HELP ordayna_http_requests_total Requests by route, method and status\n";
+        $out .= "# TYPE ordayna_http_requests_total counter\n";
+        foreach ($requests as list($route, $method, $status, $value)) {
+            $out .= "ordayna_http_requests_total{" . Metrics::labels(array("route" => $route, "method" => $method, "status" => $status)) . "} $value\n";
+        }
+
+        $out .= "# HELP ordayna_http_request_duration_seconds Time spent handling the requests of a route\n";
+        $out .= "# TYPE ordayna_http_request_duration_seconds histogram\n";
+        foreach ($latency as $route => $buckets) {
+            $cumulative = 0;
+            foreach (Metrics::LATENCY_BUCKETS as $i => $bound) {
+                $cumulative += $buckets[$i] ?? 0;
+                $out .= "ordayna_http_request_duration_seconds_bucket{" . Metrics::labels(array("route" => $route, "le" => (string) $bound)) . "} $cumulative\n";
+            }
+            $cumulative += $buckets[count(Metrics::LATENCY_BUCKETS)] ?? 0;
+            $out .= "ordayna_http_request_duration_seconds_bucket{" . Metrics::labels(array("route" => $route, "le" => "+Inf")) . "} $cumulative\n";
+            $out .= "ordayna_http_request_duration_seconds_sum{" . Metrics::labels(array("route" => $route)) . "} " . ($latency_sum[$route] ?? 0) . "\n";
+            $out .= "ordayna_http_request_duration_seconds_count{" . Metrics::labels(array("route" => $route)) . "} $cumulative\n";
+        }
+
+        $out .= "# HELP ordayna_db_queries_total Sql statements sent to the database by the requests of a route\n";
+        $out .= "# TYPE ordayna_db_queries_total counter\n";
+        foreach ($queries as $route => $value) {
+            $out .= "ordayna_db_queries_total{" . Metrics::labels(array("route" => $route)) . "} $value\n";
+        }
+
+        $out .= "# HELP ordayna_db_duration_seconds_total Time the requests of a route spent waiting for the database\n";
+        $out .= "# TYPE ordayna_db_duration_seconds_total counter\n";
+        foreach ($db_time as $route => $value) {
+            $out .= "ordayna_db_duration_seconds_total{" . Metrics::labels(array("route" => $route)) . "} $value\n";
+        }
+
+        $out .= "# HELP ordayna_cache_events_total Shared memory cache and database connection counters (see /stats)\n";
+        $out .= "# TYPE ordayna_cache_events_total counter\n";
+        foreach (Cache::counters() as $counter => $value) {
+            $out .= "ordayna_cache_events_total{" . Metrics::labels(array("counter" => $counter)) . "} $value\n";
+        }
+
+        return $out;
+    }
+
+    private static function labels(array $labels): string
+    {
+        $pairs = array();
+        foreach ($labels as $name => $value) {
+            $pairs[] = $name . '="' . str_replace(array("\\", "\"", "\n"), array("\\\\", "\\\"", "\\n"), $value) . '"';
+        }
+        return implode(",", $pairs);
+    }
+}
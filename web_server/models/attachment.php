@@ -23,7 +23,7 @@ class Attachment
     public static function attachmentExists(DB $db, int $intezmeny_id, int $attachment_id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM attachments WHERE id = ?)',
                 array($attachment_id)
@@ -34,15 +34,16 @@ class Attachment
     }
 
     /**
+     * The contents have to be in the blob store already (see Blob::storeContents and Blob::storeStream)
      * Returns the new attachments id
      */
-    public static function createAttachment(DB $db, int $intezmeny_id, int $homework_id, string $file_name): int|null
+    public static function createAttachment(DB $db, int $intezmeny_id, int $homework_id, string $file_name, string $sha256, int $size): int|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             if ($db->handleQueryResult($db->connection->execute_query(
-                'CALL newAttachment(?, ?)',
-                array($homework_id, $file_name)
+                'CALL newAttachment(?, ?, ?, ?)',
+                array($homework_id, $file_name, $sha256, $size)
             )) === null) return null;
             // Have to make an sql query here since calling a procedure overwrites mysqli_insert_id
             return ($ret = $db->handleQueryResult(
@@ -56,7 +57,7 @@ class Attachment
     public static function deleteAttachment(DB $db, int $intezmeny_id, int $attachment_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delAttachment(?)',
                 array($attachment_id)
@@ -66,27 +67,63 @@ class Attachment
         }
     }
 
-    public static function getHomeworkAttachments(DB $db, int $intezmeny_id, int $homework_id): array|null
+    public static function getAttachmentName(DB $db, int $intezmeny_id, int $attachment_id): string|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                'SELECT attachments.id, file_name FROM attachments LEFT JOIN homework ON homework.id = homework_id WHERE homework.id = ?',
-                array($homework_id)
-            ))) === null ? null : $ret;
+                "SELECT file_name FROM attachments WHERE id = ?",
+                array($attachment_id)
+            ))) === null ? null : $ret[0][0];
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
-    public static function getAttachmentName(DB $db, int $intezmeny_id, int $attachment_id): string|null
+    /**
+     * Returns the sha256 of the attachment's contents in the blob store, an empty string if the attachment is from
+     * before the blob store and check_blobs.php --migrate hasn't moved it there yet
+     */
+    public static function getAttachmentBlob(DB $db, int $intezmeny_id, int $attachment_id): string|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                "SELECT file_name FROM attachments WHERE id = ?",
+                "SELECT sha256 FROM attachments WHERE id = ?",
                 array($attachment_id)
-            ))) === null ? null : $ret[0][0];
+            ))) === null ? null : $ret[0][0] ?? "";
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Returns the attachments from before the blob store as array(id, file_name) */
+    public static function getLegacyAttachments(DB $db, int $intezmeny_id): array|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return $db->handleQueryResult($db->connection->query(
+                'SELECT id, file_name FROM attachments WHERE sha256 IS NULL'
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Points an attachment from before the blob store at the blob its contents were moved to */
+    public static function setLegacyAttachmentBlob(DB $db, int $intezmeny_id, int $attachment_id, string $sha256, int $size): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            if ($db->handleQueryResult($db->connection->execute_query(
+                'UPDATE attachments SET sha256 = ? WHERE id = ? AND sha256 IS NULL',
+                array($sha256, $attachment_id)
+            )) === null) return null;
+            if ($db->connection->affected_rows !== 1) return true;
+            return $db->handleQueryResult($db->connection->execute_query(
+                'INSERT INTO ordayna_main_db.blobs (sha256, size, ref_count) VALUES (?, ?, 1) ON DUPLICATE KEY UPDATE ref_count = ref_count + 1',
+                array($sha256, $size)
+            ));
         } catch (Exception) {
             return $db->logError(false);
         }
@@ -0,0 +1,223 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Blob;
+
+require_once "db.php";
+
+use DB\DB;
+use Exception;
+use ValueError;
+
+/**
+ * The attachments' contents, every distinct content is stored once as user_data/blobs/<2 hex>/<2 hex>/<sha256> however
+ * many attachments of however many intezmenys refer to it, the two levels of 256 directories keep every directory small
+ * ordayna_main_db.blobs counts the references (kept by the attachment procedures of intezmeny_sql.php), unreferenced
+ * blobs and the leftovers of interrupted uploads are removed by check_blobs.php
+ */
+class Blob
+{
+    const ROOT = "user_data";
+    const DIR = "blobs";
+    /** Uploads are written here first, it's on the blobs' filesystem so storing a finished upload is a rename */
+    const TMP_DIR = "blobs/tmp";
+    /** Unreferenced blobs younger than this are kept as an upload of the same contents may be about to refer to them */
+    const GRACE_SECONDS = 3600;
+
+    public static function isHash(mixed $sha256): bool
+    {
+        return is_string($sha256) and preg_match('/^[0-9a-f]{64}$/', $sha256) === 1;
+    }
+
+    /** The blob's path relative to user_data, X-Accel-Redirect takes it like this */
+    public static function relativePath(string $sha256): string
+    {
+        return Blob::DIR . "/" . substr($sha256, 0, 2) . "/" . substr($sha256, 2, 2) . "/" . $sha256;
+    }
+
+    public static function path(string $sha256): string
+    {
+        return Blob::ROOT . "/" . Blob::relativePath($sha256);
+    }
+
+    /** Stores $contents unless a blob with the same contents is stored already, returns its sha256 or false on failure */
+    public static function storeContents(string $contents): string|false
+    {
+        $sha256 = hash("sha256", $contents);
+        if (Blob::touchStored($sha256) === true) return $sha256;
+        $tmp = Blob::tmpPath();
+        if ($tmp === false) return false;
+        try {
+            $written = file_put_contents($tmp, $contents);
+        } catch (ValueError) {
+            $written = false;
+        }
+        if ($written !== strlen($contents) or Blob::adopt($tmp, $sha256) === false) {
+            @unlink($tmp);
+            return false;
+        }
+        return $sha256;
+    }
+
+    /**
+     * Copies the $input stream into the store in chunks and returns array(sha256, size)
+     * Returns null if $input is longer than $max_size bytes and false on failure, nothing is stored in either case
+     * The contents are only kept if no blob with the same contents is stored already
+     */
+    public static function storeStream(string $input, int $max_size): array|null|false
+    {
+        $tmp = Blob::tmpPath();
+        if ($tmp === false) return false;
+        $in = fopen($input, "rb");
+        if ($in === false) return false;
+        $out = fopen($tmp, "wb");
+        if ($out === false) {
+            fclose($in);
+            return false;
+        }
+        $hash = hash_init("sha256");
+        $written = 0;
+        $ret = true;
+        while (feof($in) === false) {
+            $chunk = fread($in, 65536);
+            if ($chunk === false) {
+                $ret = false;
+                break;
+            }
+            $written += strlen($chunk);
+            if ($written > $max_size) {
+                $ret = null;
+                break;
+            }
+            hash_update($hash, $chunk);
+            if (fwrite($out, $chunk) !== strlen($chunk)) {
+                $ret = false;
+                break;
+            }
+        }
+        fclose($in);
+        if (fclose($out) === false) $ret = false;
+        if ($ret !== true) {
+            @unlink($tmp);
+            return $ret;
+        }
+        $sha256 = hash_final($hash);
+        if (Blob::touchStored($sha256) === true) {
+            unlink($tmp);
+            return array($sha256, $written);
+        }
+        if (Blob::adopt($tmp, $sha256) === false) {
+            @unlink($tmp);
+            return false;
+        }
+        return array($sha256, $written);
+    }
+
+    /**
+     * Moves the file at $path into the store as the blob $sha256, the caller vouches for the hash
+     * If the blob is stored already the file is deleted instead
+     */
+    public static function storeFile(string $path, string $sha256): bool
+    {
+        if (Blob::touchStored($sha256) === true) return unlink($path);
+        return Blob::adopt($path, $sha256);
+    }
+
+    public static function deleteFile(string $sha256): bool
+    {
+        return is_file(Blob::path($sha256)) === false or unlink(Blob::path($sha256));
+    }
+
+    /**
+     * A stored blob is touched so check_blobs.php doesn't take it for unreferenced before the reference that is about
+     * to be added is counted
+     */
+    private static function touchStored(string $sha256): bool
+    {
+        return is_file(Blob::path($sha256)) and touch(Blob::path($sha256));
+    }
+
+    private static function adopt(string $path, string $sha256): bool
+    {
+        $dir = dirname(Blob::path($sha256));
+        // Another upload may create the directory at the same time
+        if (is_dir($dir) === false and @mkdir($dir, recursive: true) === false and is_dir($dir) === false) return false;
+        // An upload of the same contents may get here at the same time, either file is the same blob
+        return rename($path, Blob::path($sha256));
+    }
+
+    private static function tmpPath(): string|false
+    {
+        $dir = Blob::ROOT . "/" . Blob::TMP_DIR;
+        if (is_dir($dir) === false and @mkdir($dir, recursive: true) === false and is_dir($dir) === false) return false;
+        return $dir . "/" . bin2hex(random_bytes(16));
+    }
+
+    /** Returns every blob as array(sha256, size, ref_count, seconds since a reference was last dropped or null) */
+    public static function getBlobs(DB $db): array|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->query(
+                'SELECT sha256, size, ref_count, TIMESTAMPDIFF(SECOND, released, NOW()) FROM blobs ORDER BY sha256'
+            ));
+            if ($ret === null) return null;
+            return array_map(fn($row) => array($row[0], (int) $row[1], (int) $row[2], $row[3] === null ? null : (int) $row[3]), $ret);
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Returns how many of the intezmeny's attachments refer to each blob by sha256 */
+    public static function countReferences(DB $db, int $intezmeny_id): array|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->query(
+                'SELECT sha256, COUNT(*) FROM attachments WHERE sha256 IS NOT NULL GROUP BY sha256'
+            ));
+            if ($ret === null) return null;
+            $references = array();
+            foreach ($ret as $row) $references[$row[0]] = (int) $row[1];
+            return $references;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Creates the blob's row or corrects its reference count */
+    public static function setRefCount(DB $db, string $sha256, int $size, int $ref_count): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            return $db->handleQueryResult($db->connection->execute_query(
+                '
+                    INSERT INTO blobs (sha256, size, ref_count, released) VALUES (?, ?, ?, IF(? = 0, NOW(), NULL))
+                    ON DUPLICATE KEY UPDATE released = IF(VALUE(ref_count) < ref_count, NOW(), released), ref_count = VALUE(ref_count)
+                ',
+                array($sha256, $size, $ref_count, $ref_count)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Deletes the row of a blob that has been unreferenced for Blob::GRACE_SECONDS, returns false if it was referenced
+     * again in the meantime
+     */
+    public static function deleteUnreferenced(DB $db, string $sha256): bool|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->handleQueryResult($db->connection->execute_query(
+                'DELETE FROM blobs WHERE sha256 = ? AND ref_count = 0 AND (released IS NULL OR released < NOW() - INTERVAL ? SECOND)',
+                array($sha256, Blob::GRACE_SECONDS)
+            )) === null) return null;
+            return $db->connection->affected_rows === 1;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+}
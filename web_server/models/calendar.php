@@ -0,0 +1,155 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Calendar;
+
+require_once "db.php";
+require_once "models/timetable_element.php";
+
+use Config\Config;
+use DB\DB;
+use Exception;
+use Timetable\TimetableElement;
+use Timetable\TimetableOccurrence;
+
+/**
+ * The iCalendar feeds of the timetable of a group, teacher or room that calendar apps subscribe to
+ * Calendar apps can't log in so a feed is addressed by a token that carries an HMAC of the feed, the key is derived from
+ * Config::$jwt_secret so the tokens need no table and stay valid until the secret changes
+ */
+class Calendar
+{
+    /** The resources that have feeds and their tables */
+    const RESOURCES = array("group" => "group_", "teacher" => "teacher", "room" => "room");
+
+    public static function feedToken(int $intezmeny_id, string $resource, int $resource_id): string
+    {
+        $feed = "$intezmeny_id-$resource-$resource_id";
+        return $feed . "-" . Calendar::mac($feed);
+    }
+
+    /** Returns array(intezmeny_id, resource, resource_id) or false if the token is malformed or forged */
+    public static function parseFeedToken(string $token): array|false
+    {
+        if (preg_match('/^(\d{1,10})-(group|teacher|room)-(\d{1,10})-([0-9a-f]{32})$/', $token, $matches) !== 1) return false;
+        if (hash_equals(Calendar::mac("$matches[1]-$matches[2]-$matches[3]"), $matches[4]) === false) return false;
+        return array((int) $matches[1], $matches[2], (int) $matches[3]);
+    }
+
+    private static function mac(string $feed): string
+    {
+        $key = hash_hmac("sha256", "calendar feed", Config::$jwt_secret, true);
+        return substr(hash_hmac("sha256", $feed, $key), 0, 32);
+    }
+
+    /**
+     * Returns the feed as an iCalendar with one weekly recurring event per timetable element of the resource, or false if
+     * the resource doesn't exist
+     * The events are in floating local time like the timetable itself
+     */
+    public static function getFeed(DB $db, int $intezmeny_id, string $resource, int $resource_id): string|false|null
+    {
+        $table = Calendar::RESOURCES[$resource];
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                "SELECT name FROM $table WHERE id = ?",
+                array($resource_id)
+            ));
+            if ($ret === null) return null;
+            if (count($ret) === 0) return false;
+            $name = $ret[0][0];
+            $rows = $db->handleQueryResult($db->connection->execute_query(
+                "SELECT timetable.*, group_.name, lesson.name, teacher.name, room.name FROM timetable
+                LEFT JOIN group_ ON group_.id = timetable.group_id
+                LEFT JOIN lesson ON lesson.id = timetable.lesson_id
+                LEFT JOIN teacher ON teacher.id = timetable.teacher_id
+                LEFT JOIN room ON room.id = timetable.room_id
+                WHERE timetable.{$resource}_id = ? ORDER BY timetable.day, timetable.start, timetable.id",
+                array($resource_id)
+            ));
+            if ($rows === null) return null;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+
+        $stamp = gmdate("Ymd\THis\Z");
+        $lines = array(
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//Ordayna//Timetable//EN",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            "X-WR-CALNAME:" . Calendar::escape($name),
+            "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+            "X-PUBLISHED-TTL:PT1H",
+        );
+        foreach ($rows as $row) {
+            $element = new TimetableElement(
+                (int) $row[0],
+                $row[1],
+                $row[2],
+                (int) $row[3],
+                $row[4],
+                $row[5],
+                $row[6] === null ? null : (int) $row[6],
+                $row[7] === null ? null : (int) $row[7],
+                $row[8] === null ? null : (int) $row[8],
+                $row[9] === null ? null : (int) $row[9],
+            );
+            $first_date = TimetableElement::firstDate($element->from, $element->day);
+            // The element's day doesn't fall between its from_ and its until
+            if ($first_date->format("Y-m-d") > $element->until) continue;
+            $first = new TimetableOccurrence($element, $first_date);
+            list($group, $lesson, $teacher, $room) = array_slice($row, 10);
+
+            array_push(
+                $lines,
+                "BEGIN:VEVENT",
+                "UID:timetable-$intezmeny_id-$element->id@ordayna",
+                "DTSTAMP:$stamp",
+                "DTSTART:" . Calendar::dateTime($first->start),
+                "DTEND:" . Calendar::dateTime($first->end),
+                "RRULE:FREQ=WEEKLY;UNTIL=" . str_replace("-", "", $element->until) . "T235959",
+                "SUMMARY:" . Calendar::escape($lesson ?? $group ?? $name),
+            );
+            if ($room !== null) array_push($lines, "LOCATION:" . Calendar::escape($room));
+            $description = array();
+            if ($group !== null) array_push($description, $group);
+            if ($teacher !== null) array_push($description, $teacher);
+            if (count($description) !== 0) array_push($lines, "DESCRIPTION:" . Calendar::escape(implode("\n", $description)));
+            array_push($lines, "END:VEVENT");
+        }
+        array_push($lines, "END:VCALENDAR");
+
+        return implode("", array_map(fn($line) => Calendar::fold($line) . "\r\n", $lines));
+    }
+
+    /** "Y-m-d H:i:s" to an iCalendar local date-time */
+    private static function dateTime(string $date_time): string
+    {
+        return str_replace(array("-", ":", " "), array("", "", "T"), $date_time);
+    }
+
+    private static function escape(string $text): string
+    {
+        return str_replace(array("\\", ";", ",", "\r\n", "\n"), array("\\\\", "\\;", "\\,", "\\n", "\\n"), $text);
+    }
+
+    /** Lines are at most 75 bytes long, the rest continues on lines starting with a space without splitting a character */
+    private static function fold(string $line): string
+    {
+        $folded = "";
+        $limit = 75;
+        while (strlen($line) > $limit) {
+            $length = $limit;
+            // Continuation bytes of UTF-8 are 10xxxxxx
+            while ((ord($line[$length]) & 0xC0) === 0x80) $length--;
+            $folded .= substr($line, 0, $length) . "\r\n ";
+            $line = substr($line, $length);
+            $limit = 74;
+        }
+        return $folded . $line;
+    }
+}
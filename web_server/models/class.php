@@ -23,7 +23,7 @@ class Class_
     public static function classExists(DB $db, int $intezmeny_id, int $id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM class WHERE id = ?)',
                 array($id)
@@ -36,7 +36,7 @@ class Class_
     public static function classExistsViaName(DB $db, int $intezmeny_id, string $name): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM class WHERE name = ?)',
                 array($name)
@@ -49,7 +49,7 @@ class Class_
     public static function createClass(DB $db, int $intezmeny_id, string $name, int $headcount): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newClass(?, ?)',
                 array($name, $headcount)
@@ -62,7 +62,7 @@ class Class_
     public static function deleteClass(DB $db, int $intezmeny_id, int $id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delClass(?)',
                 array($id)
@@ -75,7 +75,7 @@ class Class_
     public static function updateClass(DB $db, int $intezmeny_id, int $id, string $name): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modClass(?, ?)',
                 array($id, $name)
@@ -88,7 +88,7 @@ class Class_
     public static function getClasses(DB $db, int $intezmeny_id): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             $ret = $db->handleQueryResult($db->connection->query("SELECT id, name FROM class"));
             if ($ret === null) return null;
             $arr = array();
@@ -29,7 +29,7 @@ class Group
     public static function groupExists(DB $db, int $intezmeny_id, int $id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM group_ WHERE id = ?)',
                 array($id)
@@ -42,7 +42,7 @@ class Group
     public static function groupExistsViaName(DB $db, int $intezmeny_id, string $group_name): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM group_ WHERE name = ?)',
                 array($group_name)
@@ -55,7 +55,7 @@ class Group
     public static function createGroup(DB $db, int $intezmeny_id, string $name, int $headcount, int|null $class_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newGroup(?, ?, ?)',
                 array($name, $headcount, $class_id)
@@ -68,7 +68,7 @@ class Group
     public static function deleteGroup(DB $db, int $intezmeny_id, int $id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delGroup(?)',
                 array($id)
@@ -81,7 +81,7 @@ class Group
     public static function updateGroup(DB $db, int $intezmeny_id, int $id, string $name, int $headcount, int|null $class_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modGroup(?, ?, ?, ?)',
                 array($id, $name, $headcount, $class_id)
@@ -94,7 +94,7 @@ class Group
     public static function getGroups(DB $db, int $intezmeny_id): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             $ret = $db->handleQueryResult($db->connection->query(
                 '
                     SELECT group_.id, group_.name, group_.headcount, class.id, class.name
@@ -116,4 +116,73 @@ class Group
             return $db->logError(false);
         }
     }
+
+    public static function groupMemberExists(DB $db, int $intezmeny_id, int $group_id, int $uid): bool|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return ($ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT EXISTS(SELECT * FROM group_member WHERE user_id = ? AND group_id = ?)',
+                array($uid, $group_id)
+            ))) === null ? null : $ret[0][0] === 1;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    public static function createGroupMember(DB $db, int $intezmeny_id, int $group_id, int $uid): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return $db->handleQueryResult($db->connection->execute_query(
+                'CALL newGroupMember(?, ?)',
+                array($group_id, $uid)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    public static function deleteGroupMember(DB $db, int $intezmeny_id, int $group_id, int $uid): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return $db->handleQueryResult($db->connection->execute_query(
+                'CALL delGroupMember(?, ?)',
+                array($group_id, $uid)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Removes the user from every group of the intezmeny, e.g. when they leave it */
+    public static function deleteUserGroupMembers(DB $db, int $intezmeny_id, int $uid): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return $db->handleQueryResult($db->connection->execute_query(
+                'CALL delUserGroupMembers(?)',
+                array($uid)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Returns the uids of the group's members */
+    public static function getGroupMembers(DB $db, int $intezmeny_id, int $group_id): array|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT user_id FROM group_member WHERE group_id = ? ORDER BY user_id',
+                array($group_id)
+            ));
+            if ($ret === null) return null;
+            return array_map(fn($row) => (int) $row[0], $ret);
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
 }
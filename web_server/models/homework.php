@@ -41,7 +41,7 @@ class Homework
     public static function homeworkExists(DB $db, int $intezmeny_id, int $homework_id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM homework WHERE id = ?)',
                 array($homework_id)
@@ -54,7 +54,7 @@ class Homework
     public static function createHomework(DB $db, int $intezmeny_id, string $description, string $due, int $group_id, int $lesson_id, int $teacher_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newHomework(?, ?, ?, ?, ?)',
                 array($description, $due, $group_id, $lesson_id, $teacher_id)
@@ -67,7 +67,7 @@ class Homework
     public static function deleteHomework(DB $db, int $intezmeny_id, int $homework_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delHomework(?)',
                 array($homework_id)
@@ -80,7 +80,7 @@ class Homework
     public static function updateHomework(DB $db, int $intezmeny_id, int $homework_id, string $description, string $due, int $group_id, int $lesson_id, int $teacher_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modHomework(?, ?, ?, ?, ?, ?)',
                 array($homework_id, $description, $due, $group_id, $lesson_id, $teacher_id)
@@ -90,33 +90,77 @@ class Homework
         }
     }
 
-    public static function getHomeworks(DB $db, int $intezmeny_id): array|null
-    {
+    /**
+     * Returns at most $limit homeworks newest first and the (published, id) position the next page starts after, null
+     * on the last page
+     * The page starts after $after and is read from the (published, id) indexes so its cost doesn't grow with the table,
+     * $due_from and $due_until are dates and both days are part of the window, with $member_uid only the homeworks of
+     * that user's groups are returned
+     */
+    public static function getHomeworks(
+        DB $db,
+        int $intezmeny_id,
+        int $limit,
+        array|null $after = null,
+        int|null $group_id = null,
+        int|null $lesson_id = null,
+        int|null $teacher_id = null,
+        string|null $due_from = null,
+        string|null $due_until = null,
+        int|null $member_uid = null
+    ): array|null {
+        $conditions = array();
+        $params = array();
+        foreach (array(
+            "homework.group_id = ?" => $group_id,
+            "homework.lesson_id = ?" => $lesson_id,
+            "homework.teacher_id = ?" => $teacher_id,
+            "homework.due >= ?" => $due_from,
+            "homework.due < ? + INTERVAL 1 DAY" => $due_until,
+            "homework.group_id IN (SELECT group_id FROM group_member WHERE user_id = ?)" => $member_uid,
+        ) as $condition => $param) {
+            if ($param === null) continue;
+            array_push($conditions, $condition);
+            array_push($params, $param);
+        }
+        if ($after !== null) {
+            // Spelled out as the optimiser only turns this form of (published, id) < (?, ?) into a range of the index
+            array_push($conditions, "(homework.published < ? OR (homework.published = ? AND homework.id < ?))");
+            array_push($params, $after[0], $after[0], $after[1]);
+        }
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
-            $ret = $db->handleQueryResult($db->connection->query('
-                SELECT homework.id, description, published, due, group_.id, group_.name, group_.headcount,
-                       class.id, class.name, lesson.id, lesson.name, teacher.id, teacher.name
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            // One more row than asked for tells whether there is a next page
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                "SELECT homework.id, description, published, due, group_.id, group_.name, group_.headcount,
+                        class.id, class.name, lesson.id, lesson.name, teacher.id, teacher.name
                 FROM homework
-                LEFT JOIN group_ ON group_.id = group_id
+                LEFT JOIN group_ ON group_.id = homework.group_id
                 LEFT JOIN class ON class.id = group_.class_id
-                LEFT JOIN lesson ON lesson.id = lesson_id
-                LEFT JOIN teacher ON teacher.id = teacher_id
-                ORDER BY published DESC, due DESC
-            '));
+                LEFT JOIN lesson ON lesson.id = homework.lesson_id
+                LEFT JOIN teacher ON teacher.id = homework.teacher_id" .
+                (count($conditions) === 0 ? "" : " WHERE " . implode(" AND ", $conditions)) .
+                " ORDER BY homework.published DESC, homework.id DESC LIMIT " . ($limit + 1),
+                $params
+            ));
             if ($ret === null) return null;
-            $homeworks = $ret;
-            for ($i = 0; $i < count($homeworks); $i++) {
-                $ret = $db->handleQueryResult($db->connection->execute_query(
-                    "SELECT id, file_name FROM attachments WHERE homework_id = ?",
-                    array($homeworks[$i][0])
-                ));
-                if ($ret === null) return null;
-                array_push($homeworks[$i], $ret);
+            $next = null;
+            if (count($ret) > $limit) {
+                $ret = array_slice($ret, 0, $limit);
+                $next = array($ret[$limit - 1][2], (int) $ret[$limit - 1][0]);
             }
+            $homeworks = $ret;
+            $attachments = count($homeworks) === 0 ? array() : $db->loadChildren(
+                "SELECT homework_id, id, file_name FROM attachments",
+                "homework_id",
+                array_map(fn($homework) => (int) $homework[0], $homeworks),
+                "ORDER BY id"
+            );
+            if ($attachments === null) return null;
             for ($i = 0; $i < count($homeworks); $i++) {
-                for ($j = 0; $j < count($homeworks[$i][13]); $j++) {
-                    $homeworks[$i][13][$j] = new Attachment($homeworks[$i][13][$j][0], $homeworks[$i][13][$j][1]);
+                $homework_attachments = array();
+                foreach ($attachments[(int) $homeworks[$i][0]] ?? array() as $attachment) {
+                    array_push($homework_attachments, new Attachment($attachment[0], $attachment[1]));
                 }
                 $homeworks[$i] = new Homework(
                     (int) $homeworks[$i][0],
@@ -129,10 +173,10 @@ class Homework
                     )),
                     new Lesson((int) $homeworks[$i][9], $homeworks[$i][10]),
                     new Teacher((int) $homeworks[$i][11], $homeworks[$i][12]),
-                    $homeworks[$i][13]
+                    $homework_attachments
                 );
             }
-            return $homeworks;
+            return array($homeworks, $next);
         } catch (Exception) {
             return $db->logError(false);
         }
@@ -4,13 +4,24 @@ declare(strict_types=1);
 
 namespace Intezmeny;
 
+use Cache\Cache;
+use Config\Config;
 use DB\DB;
 use Exception;
+use Job\Job;
+use User\User;
+use function Error\logError;
 
 require_once "db.php";
+require_once "cache.php";
+require_once "models/job.php";
+require_once "models/user.php";
 
 class Intezmeny
 {
+    /** The tables rowsExist may check */
+    const TABLES = array("class", "group_", "lesson", "room", "teacher", "timetable", "homework", "attachments");
+
     public int $id;
     public string $name;
 
@@ -23,7 +34,7 @@ class Intezmeny
     public static function getIntezmenys(DB $db, int $uid): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             $ret = $db->handleQueryResult($db->connection->execute_query(
                 '
                     SELECT intezmeny.id, intezmeny.name FROM intezmeny_users
@@ -43,31 +54,272 @@ class Intezmeny
         }
     }
 
+    /**
+     * Claims an empty intezmeny from the pool (see fill_intezmeny_pool.php) and only creates a new schema if the pool is
+     * empty so creating an intezmeny usually costs a few queries instead of the whole of intezmeny_sql.php
+     * An empty pool also queues a fill_intezmeny_pool job so the next ones don't have to wait for the cron job
+     */
     public static function createIntezmeny(DB $db, string $intezmeny_name, int $admin_uid): true|null
     {
-        global $intezmeny_tables, $intezmeny_procedures;
-        
+        $ret = Intezmeny::claimPooledIntezmeny($db, $intezmeny_name, $admin_uid);
+        if ($ret !== false) {
+            Cache::count("intezmeny_pool_hits");
+            return $ret;
+        }
+        Cache::count("intezmeny_pool_misses");
+        // The intezmeny is still created if the job can't be queued, the error is logged
+        Job::enqueue($db, "fill_intezmeny_pool", array(), null, unique: true);
+
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             if ($db->handleQueryResult($db->connection->execute_query(
                 'INSERT INTO intezmeny (name) VALUE (?)',
                 array($intezmeny_name)
             )) === null) return null;
             $intezmeny_id = $db->connection->insert_id;
+            User::forgetMemberships();
             if ($db->handleQueryResult($db->connection->execute_query(
                 'INSERT INTO intezmeny_users (intezmeny_id, users_id, role_, invite_accepted) VALUE (?, ?, "admin", TRUE)',
                 array($intezmeny_id, $admin_uid)
             )) === null) return null;
-            $db->connection->multi_query(
+            return Intezmeny::createSchema($db, $intezmeny_id);
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Identifies the schema intezmeny_sql.php creates, pooled intezmenys created from another version are never claimed
+     */
+    public static function templateVersion(): string
+    {
+        global $intezmeny_tables, $intezmeny_procedures;
+
+        return hash("xxh64", $intezmeny_tables . $intezmeny_procedures);
+    }
+
+    /**
+     * Creates an empty intezmeny for the pool, its placeholder row reserves the id its schema is named after
+     * The pool row exists from the start so the orphan cleanup leaves the placeholder alone but it only gets its template
+     * version, and with it becomes claimable, once the schema is complete
+     * Returns the new intezmeny's id
+     */
+    public static function createPooledIntezmeny(DB $db): int|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            if (
+                $db->handleQueryResult($db->connection->query('INSERT INTO intezmeny (name) VALUE ("")')) === null
+                or ($intezmeny_id = $db->connection->insert_id) === 0
+                or $db->handleQueryResult($db->connection->execute_query(
+                    'INSERT INTO intezmeny_pool (intezmeny_id) VALUE (?)',
+                    array($intezmeny_id)
+                )) === null
+            ) {
+                $db->connection->rollback();
+                return null;
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+
+            if (Intezmeny::createSchema($db, $intezmeny_id) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->handleQueryResult($db->connection->execute_query(
+                'UPDATE intezmeny_pool SET template_version = ? WHERE intezmeny_id = ?',
+                array(Intezmeny::templateVersion(), $intezmeny_id)
+            )) === null) return null;
+            return $intezmeny_id;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Config::$intezmeny_pool_size or 10 */
+    public static function poolSize(): int
+    {
+        return isset(Config::$intezmeny_pool_size) ? Config::$intezmeny_pool_size : 10;
+    }
+
+    /**
+     * Deletes the stale pooled intezmenys and tops the pool up to $size claimable intezmenys
+     * Returns array(deleted, created)
+     */
+    public static function fillPool(DB $db, int $size): array|null
+    {
+        $deleted = Intezmeny::deleteStalePooledIntezmenys($db);
+        if ($deleted === null) return null;
+        $pooled = Intezmeny::countPooledIntezmenys($db);
+        if ($pooled === null) return null;
+        $created = 0;
+        for (; $pooled + $created < $size; $created++) {
+            if (Intezmeny::createPooledIntezmeny($db) === null) return null;
+        }
+        return array($deleted, $created);
+    }
+
+    /** Returns the number of claimable intezmenys in the pool */
+    public static function countPooledIntezmenys(DB $db): int|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT COUNT(*) FROM intezmeny_pool WHERE template_version = ?',
+                array(Intezmeny::templateVersion())
+            ));
+            if ($ret === null) return null;
+            return (int) $ret[0][0];
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Deletes the pooled intezmenys created from an older intezmeny_sql.php and the ones whose creation was abandoned
+     * Returns the number of deleted intezmenys
+     */
+    public static function deleteStalePooledIntezmenys(DB $db): int|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            $ids = $db->handleQueryResult($db->connection->execute_query(
                 '
-                    -- db allows us to replace the database without encountering foreign key errors
-                    SET FOREIGN_KEY_CHECKS = 0;
-                    CREATE OR REPLACE DATABASE ordayna_intezmeny_' . $intezmeny_id . ' CHARACTER SET = "utf8mb4" COLLATE = "utf8mb4_uca1400_ai_ci";
-                    SET FOREIGN_KEY_CHECKS = 1;
-
-                    USE ordayna_intezmeny_' . $intezmeny_id . ';
-                ' . $intezmeny_tables . $intezmeny_procedures,
-            );
+                    SELECT intezmeny_id FROM intezmeny_pool
+                    WHERE template_version != ? OR (template_version IS NULL AND created < NOW() - INTERVAL 1 HOUR)
+                    FOR UPDATE SKIP LOCKED
+                ',
+                array(Intezmeny::templateVersion())
+            ));
+            if ($ids === null) {
+                $db->connection->rollback();
+                return null;
+            }
+            foreach ($ids as $row) {
+                // Cascades to the pool
+                if ($db->handleQueryResult($db->connection->execute_query('DELETE FROM intezmeny WHERE id = ?', array($row[0]))) === null) {
+                    $db->connection->rollback();
+                    return null;
+                }
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+            // DROP DATABASE commits implicitly so the schemas are only dropped once their rows are gone
+            foreach ($ids as $row) {
+                if ($db->handleQueryResult($db->connection->query('DROP DATABASE IF EXISTS ordayna_intezmeny_' . (int) $row[0])) === null) return null;
+            }
+            return count($ids);
+        } catch (Exception) {
+            $db->connection->rollback();
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Names the oldest claimable pooled intezmeny and makes $admin_uid its admin in one transaction
+     * SKIP LOCKED lets concurrent requests claim different intezmenys instead of waiting for each other
+     * Returns false if the pool is empty
+     */
+    private static function claimPooledIntezmeny(DB $db, string $intezmeny_name, int $admin_uid): true|false|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT intezmeny_id FROM intezmeny_pool WHERE template_version = ? ORDER BY intezmeny_id LIMIT 1 FOR UPDATE SKIP LOCKED',
+                array(Intezmeny::templateVersion())
+            ));
+            if ($ret === null or count($ret) === 0) {
+                $db->connection->rollback();
+                return $ret === null ? null : false;
+            }
+            $intezmeny_id = (int) $ret[0][0];
+            User::forgetMemberships();
+            if (
+                $db->handleQueryResult($db->connection->execute_query('DELETE FROM intezmeny_pool WHERE intezmeny_id = ?', array($intezmeny_id))) === null
+                or $db->handleQueryResult($db->connection->execute_query(
+                    'UPDATE intezmeny SET name = ? WHERE id = ?',
+                    array($intezmeny_name, $intezmeny_id)
+                )) === null
+                or $db->handleQueryResult($db->connection->execute_query(
+                    'INSERT INTO intezmeny_users (intezmeny_id, users_id, role_, invite_accepted) VALUE (?, ?, "admin", TRUE)',
+                    array($intezmeny_id, $admin_uid)
+                )) === null
+            ) {
+                $db->connection->rollback();
+                return null;
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+            return true;
+        } catch (Exception) {
+            $db->connection->rollback();
+            return $db->logError(false);
+        }
+    }
+
+    /** Creates the intezmeny's schema with the tables and procedures of intezmeny_sql.php */
+    private static function createSchema(DB $db, int $intezmeny_id): true|null
+    {
+        global $intezmeny_tables, $intezmeny_procedures;
+
+        $db->forgetSelectedSchema();
+        $db->connection->multi_query(
+            '
+                -- db allows us to replace the database without encountering foreign key errors
+                SET FOREIGN_KEY_CHECKS = 0;
+                CREATE OR REPLACE DATABASE ordayna_intezmeny_' . $intezmeny_id . ' CHARACTER SET = "utf8mb4" COLLATE = "utf8mb4_uca1400_ai_ci";
+                SET FOREIGN_KEY_CHECKS = 1;
+
+                USE ordayna_intezmeny_' . $intezmeny_id . ';
+            ' . $intezmeny_tables . $intezmeny_procedures,
+        );
+        if ($db->connection->errno !== 0) return null;
+        while ($db->connection->next_result() !== false) {
+            if ($db->connection->errno !== 0) return null;
+        }
+        return true;
+    }
+
+    /**
+     * Returns the version of the intezmeny's data, it is bumped by every procedure that changes the data
+     * Only reads ordayna_main_db so it's cheap enough to call before every read
+     */
+    public static function intezmenyExists(DB $db, int $intezmeny_id): bool|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            return ($ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT EXISTS(SELECT * FROM intezmeny WHERE id = ?)',
+                array($intezmeny_id)
+            ))) === null ? null : $ret[0][0] === 1;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    public static function getDataVersion(DB $db, int $intezmeny_id): int|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT data_version FROM intezmeny WHERE id = ?',
+                array($intezmeny_id)
+            ));
+            if ($ret === null or count($ret) === 0) return null;
+            return (int) $ret[0][0];
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Recreates the procedures of an existing intezmeny's schema from intezmeny_sql.php
+     */
+    public static function updateProcedures(DB $db, int $intezmeny_id): true|null
+    {
+        global $intezmeny_procedures;
+
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $db->connection->multi_query($intezmeny_procedures);
             if ($db->connection->errno !== 0) return null;
             while ($db->connection->next_result() !== false) {
                 if ($db->connection->errno !== 0) return null;
@@ -78,42 +330,139 @@ class Intezmeny
         }
     }
 
-    public static function deleteIntezmeny(DB $db, int $intezmeny_id): bool|null
+    /**
+     * Returns the id of the row the connection's last create procedure made in $table (e.g. "class", "timetable_element")
+     * newClass also creates the class's group so the class is found through that group
+     */
+    public static function lastCreatedId(DB $db, int $intezmeny_id, string $table): int|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            if ($db->handleQueryResult($db->connection->execute_query(
-                'DELETE FROM intezmeny WHERE id = ?',
-                array($intezmeny_id)
-            )) === null) return null;
-            return $db->handleQueryResult($db->connection->query("DROP DATABASE ordayna_intezmeny_" . $intezmeny_id));
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->query(
+                $table === "class" ? "SELECT class_id FROM group_ WHERE id = LAST_INSERT_ID()" : "SELECT LAST_INSERT_ID()"
+            ));
+            if ($ret === null or count($ret) === 0 or $ret[0][0] === null) return null;
+            return (int) $ret[0][0];
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Checks that every referenced row exists with a single query
+     * $rows is a list of array(table, id) pairs, pairs with a null id are skipped
+     */
+    public static function rowsExist(DB $db, int $intezmeny_id, array $rows): bool|null
+    {
+        $conditions = array();
+        $ids = array();
+        foreach ($rows as list($table, $id)) {
+            if ($id === null) continue;
+            if (in_array($table, Intezmeny::TABLES, true) === false) {
+                logError("Intezmeny::rowsExist called with unknown table: " . $table);
+                return null;
+            }
+            array_push($conditions, "EXISTS(SELECT * FROM $table WHERE id = ?)");
+            array_push($ids, $id);
+        }
+        if (count($conditions) === 0) return true;
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            return ($ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT ' . implode(' AND ', $conditions),
+                $ids
+            ))) === null ? null : $ret[0][0] === 1;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
+    /**
+     * The intezmeny is gone for its users at once, its schema is dropped by a delete_intezmeny job (see dropSchema)
+     * Returns the job's id
+     */
+    public static function deleteIntezmeny(DB $db, int $intezmeny_id, int $uid): int|null
+    {
+        try {
+            User::forgetMemberships();
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            if (
+                $db->handleQueryResult($db->connection->execute_query(
+                    'DELETE FROM intezmeny WHERE id = ?',
+                    array($intezmeny_id)
+                )) === null
+                or ($job_id = Job::enqueue($db, "delete_intezmeny", array("intezmeny_id" => $intezmeny_id), $uid)) === null
+            ) {
+                $db->connection->rollback();
+                return null;
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+            return $job_id;
+        } catch (Exception) {
+            $db->connection->rollback();
+            return $db->logError(false);
+        }
+    }
+
     /**
     * The second worst thing to happen to those orphans
+    * Their schemas are dropped by delete_intezmeny jobs like deleteIntezmeny's
     * Returns deleted intezmeny's ids
     */
     public static function deleteOrphanedIntezmenys(DB $db): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             $ids = $db->handleQueryResult($db->connection->query("CALL getOrphanedIntezmenys()"));
             if ($ids === null) return null;
             for ($i = 0; $i < count($ids); $i++) {
                 $ids[$i] = $ids[$i][0];
             }
             for ($i = 0; $i < count($ids); $i++) {
-                if ($db->handleQueryResult($db->connection->execute_query(
-                    'DELETE FROM intezmeny WHERE id = ?',
-                    array($ids[$i])
-                )) === null) return null;
-                if ($db->handleQueryResult($db->connection->query('DROP DATABASE ordayna_intezmeny_' . $ids[$i][0])) === null) return null;
+                if ($db->logError($db->connection->begin_transaction()) === null) return null;
+                if (
+                    $db->handleQueryResult($db->connection->execute_query(
+                        'DELETE FROM intezmeny WHERE id = ?',
+                        array($ids[$i])
+                    )) === null
+                    or Job::enqueue($db, "delete_intezmeny", array("intezmeny_id" => (int) $ids[$i]), null) === null
+                ) {
+                    $db->connection->rollback();
+                    return null;
+                }
+                if ($db->logError($db->connection->commit()) === null) return null;
             }
             return $ids;
         } catch (Exception) {
+            $db->connection->rollback();
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Releases the blobs of a deleted intezmeny's attachments and drops its schema, can be run again after a failure
+     * The procedure runs in its own schema so the main schema stays selected
+     */
+    public static function dropSchema(DB $db, int $intezmeny_id): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT EXISTS(SELECT * FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = ?)',
+                array('ordayna_intezmeny_' . $intezmeny_id)
+            ));
+            if ($ret === null) return null;
+            if ($ret[0][0] === 0) return true;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            if ($db->handleQueryResult($db->connection->query('CALL ordayna_intezmeny_' . $intezmeny_id . '.releaseAllBlobs()')) === null) {
+                $db->connection->rollback();
+                return null;
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+            return $db->handleQueryResult($db->connection->query('DROP DATABASE IF EXISTS ordayna_intezmeny_' . $intezmeny_id));
+        } catch (Exception) {
+            $db->connection->rollback();
             return $db->logError(false);
         }
     }
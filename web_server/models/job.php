@@ -0,0 +1,157 @@
+<?php
+
+declare(strict_types=1);
+
+namespace Job;
+
+require_once "db.php";
+
+use DB\DB;
+use Exception;
+
+/**
+ * Work that is too slow for a request, queued in ordayna_main_db.jobs and run by job_worker.php
+ * A job may run more than once (a failed attempt is retried and a worker may die halfway) so every job has to be safe
+ * to run again
+ */
+class Job
+{
+    const MAX_ATTEMPTS = 5;
+    /** A running job that isn't finished in this long is taken to be abandoned by its worker and is run again */
+    const LEASE_SECONDS = 900;
+    /** The first retry waits this long and every further one twice as long as the one before */
+    const RETRY_SECONDS = 30;
+
+    public int $id;
+    public string $type;
+    public string $status;
+    public int $attempts;
+    public string $created;
+    public ?string $finished;
+
+    public function __construct(int $id, string $type, string $status, int $attempts, string $created, ?string $finished)
+    {
+        $this->id = $id;
+        $this->type = $type;
+        $this->status = $status;
+        $this->attempts = $attempts;
+        $this->created = $created;
+        $this->finished = $finished;
+    }
+
+    /**
+     * Has to be called in the transaction of the change that needs the job so the job is queued if and only if the
+     * change is committed
+     * A $unique job isn't queued again while one of its type is still queued, its id is returned instead
+     * Returns the job's id
+     */
+    public static function enqueue(DB $db, string $type, array $payload, ?int $uid, bool $unique = false): int|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($unique) {
+                $ret = $db->handleQueryResult($db->connection->execute_query(
+                    'SELECT id FROM jobs WHERE type = ? AND status = "queued" LIMIT 1',
+                    array($type)
+                ));
+                if ($ret === null) return null;
+                if (count($ret) !== 0) return (int) $ret[0][0];
+            }
+            if ($db->handleQueryResult($db->connection->execute_query(
+                'INSERT INTO jobs (type, payload, uid) VALUE (?, ?, ?)',
+                array($type, json_encode((object) $payload), $uid)
+            )) === null) return null;
+            return $db->connection->insert_id;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Returns false if the job doesn't exist or wasn't queued by $uid */
+    public static function getJob(DB $db, int $job_id, int $uid): Job|false|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT id, type, status, attempts, created, finished FROM jobs WHERE id = ? AND uid = ?',
+                array($job_id, $uid)
+            ));
+            if ($ret === null) return null;
+            if (count($ret) === 0) return false;
+            return new Job((int) $ret[0][0], $ret[0][1], $ret[0][2], (int) $ret[0][3], $ret[0][4], $ret[0][5]);
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Takes the oldest job that is due and marks it running for Job::LEASE_SECONDS
+     * SKIP LOCKED lets concurrent workers take different jobs instead of waiting for each other
+     * Returns array(id, type, payload, attempt) or false if no job is due
+     */
+    public static function claim(DB $db): array|false|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($db->logError($db->connection->begin_transaction()) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->query(
+                '
+                    SELECT id, type, payload, attempts FROM jobs
+                    WHERE status IN ("queued", "running") AND run_after <= NOW()
+                    ORDER BY run_after, id LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                '
+            ));
+            if ($ret === null or count($ret) === 0) {
+                $db->connection->rollback();
+                return $ret === null ? null : false;
+            }
+            $job = array((int) $ret[0][0], $ret[0][1], json_decode($ret[0][2], true), (int) $ret[0][3] + 1);
+            if ($db->handleQueryResult($db->connection->execute_query(
+                'UPDATE jobs SET status = "running", attempts = ?, run_after = NOW() + INTERVAL ? SECOND WHERE id = ?',
+                array($job[3], Job::LEASE_SECONDS, $job[0])
+            )) === null) {
+                $db->connection->rollback();
+                return null;
+            }
+            if ($db->logError($db->connection->commit()) === null) return null;
+            return $job;
+        } catch (Exception) {
+            $db->connection->rollback();
+            return $db->logError(false);
+        }
+    }
+
+    public static function finish(DB $db, int $job_id): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            return $db->handleQueryResult($db->connection->execute_query(
+                'UPDATE jobs SET status = "done", error = NULL, finished = NOW() WHERE id = ?',
+                array($job_id)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /** Queues the job again with an exponential backoff or gives up on it after Job::MAX_ATTEMPTS attempts */
+    public static function fail(DB $db, int $job_id, int $attempt, string $error): true|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            if ($attempt >= Job::MAX_ATTEMPTS) {
+                return $db->handleQueryResult($db->connection->execute_query(
+                    'UPDATE jobs SET status = "failed", error = ?, finished = NOW() WHERE id = ?',
+                    array(mb_substr($error, 0, 1000), $job_id)
+                ));
+            }
+            return $db->handleQueryResult($db->connection->execute_query(
+                'UPDATE jobs SET status = "queued", error = ?, run_after = NOW() + INTERVAL ? SECOND WHERE id = ?',
+                array(mb_substr($error, 0, 1000), Job::RETRY_SECONDS << ($attempt - 1), $job_id)
+            ));
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+}
@@ -23,7 +23,7 @@ class Lesson
     public static function lessonExists(DB $db, int $intezmeny_id, int $lesson_id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM lesson WHERE id = ?)',
                 array($lesson_id)
@@ -36,7 +36,7 @@ class Lesson
     public static function lessonExistsViaName(DB $db, int $intezmeny_id, string $lesson_name): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM lesson WHERE name = ?);',
                 array($lesson_name)
@@ -49,7 +49,7 @@ class Lesson
     public static function createLesson(DB $db, int $intezmeny_id, string $name): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newLesson(?)',
                 array($name)
@@ -62,7 +62,7 @@ class Lesson
     public static function deleteLesson(DB $db, int $intezmeny_id, int $lesson_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delLesson(?)',
                 array($lesson_id)
@@ -75,7 +75,7 @@ class Lesson
     public static function updateLesson(DB $db, int $intezmeny_id, int $lesson_id, string $name): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modLesson(?, ?)',
                 array($lesson_id, $name)
@@ -88,7 +88,7 @@ class Lesson
     public static function getLessons(DB $db, int $intezmeny_id): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             $ret = $db->handleQueryResult($db->connection->query("SELECT id, name FROM lesson"));
             if ($ret === null) return null;
             $arr = array();
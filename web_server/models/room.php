@@ -27,7 +27,7 @@ class Room
     public static function roomExists(DB $db, int $intezmeny_id, int $id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM room WHERE id = ?)',
                 array($id)
@@ -40,7 +40,7 @@ class Room
     public static function roomExistsViaName(DB $db, int $intezmeny_id, string $room_name): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM room WHERE name = ?)',
                 array($room_name)
@@ -53,7 +53,7 @@ class Room
     public static function createRoom(DB $db, int $intezmeny_id, string $name, string|null $type, int $space): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newRoom(?, ?, ?)',
                 array($name, $type, $space)
@@ -66,7 +66,7 @@ class Room
     public static function deleteRoom(DB $db, int $intezmeny_id, int $id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delRoom(?)',
                 array($id)
@@ -79,7 +79,7 @@ class Room
     public static function updateRoom(DB $db, int $intezmeny_id, int $id, string $name, string|null $type, int $space): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modRoom(?, ?, ?, ?)',
                 array($id, $name, $type, $space)
@@ -92,7 +92,7 @@ class Room
     public static function getRooms(DB $db, int $intezmeny_id): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             $ret = $db->handleQueryResult($db->connection->query("SELECT id, name, type, space FROM room"));
             if ($ret === null) return null;
             $arr = array();
@@ -6,6 +6,8 @@ namespace Timetable;
 
 require_once "db.php";
 
+use DateTimeImmutable;
+use DateTimeZone;
 use DB\DB;
 use Exception;
 
@@ -46,10 +48,119 @@ class TimetableElement
         $this->room_id = $room_id;
     }
 
+    /**
+     * Returns the elements that book the same group, teacher or room on $day in a time slot overlapping start + duration
+     * on at least one common date, $element_id is the element being updated (null when creating one) and is never a clash
+     * Every resource is looked up with its own (resource_id, day, start) index range instead of scanning the day
+     */
+    public static function findClashes(
+        DB $db,
+        int $intezmeny_id,
+        int|null $element_id,
+        string $start,
+        string $duration,
+        int $day,
+        string $from,
+        string $until,
+        int|null $group_id,
+        int|null $teacher_id,
+        int|null $room_id
+    ): array|null {
+        $selects = array();
+        $params = array();
+        foreach (array("group" => $group_id, "teacher" => $teacher_id, "room" => $room_id) as $resource => $resource_id) {
+            if ($resource_id === null) continue;
+            array_push(
+                $selects,
+                "SELECT '$resource', {$resource}_id, id FROM timetable
+                WHERE {$resource}_id = ? AND day = ? AND start < ADDTIME(CAST(? AS TIME), CAST(? AS TIME))
+                AND ADDTIME(start, duration) > CAST(? AS TIME) AND from_ <= ? AND until >= ? AND id <> ?"
+            );
+            array_push($params, $resource_id, $day, $start, $duration, $start, $until, $from, $element_id ?? 0);
+        }
+        if (count($selects) === 0) return array();
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                implode(" UNION ALL ", $selects) . " ORDER BY 1, 3",
+                $params
+            ));
+            if ($ret === null) return null;
+            $arr = array();
+            foreach ($ret as $row) {
+                array_push($arr, new TimetableClash($row[0], (int) $row[1], (int) $row[2], $element_id));
+            }
+            return $arr;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
+    /**
+     * Returns every clash of the intezmeny's timetable, each clashing pair of elements is reported once per shared resource
+     * The elements are read once ordered by (day, start) and every (resource, day) is swept from the earliest start keeping
+     * only the elements that haven't ended yet, so the work grows with the number of elements and clashes, not their square
+     */
+    public static function auditClashes(DB $db, int $intezmeny_id): array|null
+    {
+        try {
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT id, TIME_TO_SEC(start), TIME_TO_SEC(duration), day, from_, until, group_id, teacher_id, room_id
+                FROM timetable ORDER BY day, start, id'
+            ));
+            if ($ret === null) return null;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+
+        $clashes = array();
+        foreach (array("group" => 6, "teacher" => 7, "room" => 8) as $resource => $column) {
+            // The rows stay ordered by start within every bucket
+            $buckets = array();
+            foreach ($ret as $row) {
+                if ($row[$column] === null) continue;
+                $buckets[$row[$column] . ":" . $row[3]][] = $row;
+            }
+            foreach ($buckets as $bucket) {
+                $active = array();
+                foreach ($bucket as $row) {
+                    $start = (int) $row[1];
+                    $active = array_filter($active, fn($other) => (int) $other[1] + (int) $other[2] > $start);
+                    foreach ($active as $other) {
+                        // Dates are Y-m-d strings so they compare in order
+                        if ($other[4] > $row[5] or $other[5] < $row[4]) continue;
+                        array_push($clashes, new TimetableClash($resource, (int) $row[$column], (int) $other[0], (int) $row[0]));
+                    }
+                    if ((int) $row[2] > 0) array_push($active, $row);
+                }
+            }
+        }
+        usort($clashes, fn($a, $b) => array($a->resource, $a->resource_id, $a->element_id, $a->other_element_id) <=> array($b->resource, $b->resource_id, $b->element_id, $b->other_element_id));
+        return $clashes;
+    }
+
+    /**
+     * Locks the intezmeny's row (the one bumpDataVersion updates) until the transaction ends so the clash check and the
+     * write of concurrent timetable writes run one after the other
+     * It has to be the transaction's first read, the reads after it then see everything the writes before it committed
+     */
+    public static function lockTimetable(DB $db, int $intezmeny_id): true|null
+    {
+        try {
+            return $db->handleQueryResult($db->connection->execute_query(
+                'SELECT data_version FROM ordayna_main_db.intezmeny WHERE id = ? FOR UPDATE',
+                array($intezmeny_id)
+            )) === null ? null : true;
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
     public static function timetableElementExists(DB $db, int $intezmeny_id, int $timetable_element_id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM timetable WHERE id = ?)',
                 array($timetable_element_id)
@@ -73,7 +184,7 @@ class TimetableElement
         int|null $room_id
     ): true|null {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL newTimetableElement(?, ?, ?, ?, ?, ?, ?, ?, ?)',
                 array($start, $duration, $day, $from, $until, $group_id, $lesson_id, $teacher_id, $room_id)
@@ -86,7 +197,7 @@ class TimetableElement
     public static function deleteTimetableElement(DB $db, int $intezmeny_id, int $timetable_element_id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL delTimetableElement(?)',
                 array($timetable_element_id)
@@ -111,7 +222,7 @@ class TimetableElement
         int|null $room_id
     ): true|null {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'CALL modTimetableElement(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
                 array($element_id, $start, $duration, $day, $from, $until, $group_id, $lesson_id, $teacher_id, $room_id)
@@ -121,11 +232,42 @@ class TimetableElement
         }
     }
 
-    public static function getTimetable(DB $db, int $intezmeny_id): array|null
-    {
+    /**
+     * Every filter is optional (null), $from and $until select the elements that are valid on at least one day of the window
+     * $member_uid selects the elements of the groups that user is a member of
+     */
+    public static function getTimetable(
+        DB $db,
+        int $intezmeny_id,
+        string|null $from = null,
+        string|null $until = null,
+        int|null $group_id = null,
+        int|null $teacher_id = null,
+        int|null $room_id = null,
+        int|null $day = null,
+        int|null $member_uid = null
+    ): array|null {
+        $conditions = array();
+        $params = array();
+        foreach (array(
+            "until >= ?" => $from,
+            "from_ <= ?" => $until,
+            "group_id = ?" => $group_id,
+            "teacher_id = ?" => $teacher_id,
+            "room_id = ?" => $room_id,
+            "day = ?" => $day,
+            "group_id IN (SELECT group_id FROM group_member WHERE user_id = ?)" => $member_uid,
+        ) as $condition => $param) {
+            if ($param === null) continue;
+            array_push($conditions, $condition);
+            array_push($params, $param);
+        }
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
-            $ret = $db->handleQueryResult($db->connection->query("SELECT * FROM timetable ORDER BY day, start"));
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                "SELECT * FROM timetable" . (count($conditions) === 0 ? "" : " WHERE " . implode(" AND ", $conditions)) . " ORDER BY day, start",
+                $params
+            ));
             if ($ret === null) return null;
             $arr = array();
             for ($i = 0; $i < count($ret); $i++) {
@@ -147,4 +289,78 @@ class TimetableElement
             return $db->logError(false);
         }
     }
+
+    /**
+     * Expands the weekly elements into their dated occurrences between $from and $until (Y-m-d, both inclusive) ordered
+     * by start, an element occurs on every date of its day (0 is monday) from its from_ until its until
+     */
+    public static function expand(array $elements, string $from, string $until): array
+    {
+        $occurrences = array();
+        foreach ($elements as $element) {
+            $last = min($until, $element->until);
+            // Dates are Y-m-d strings so they compare in order
+            for ($date = TimetableElement::firstDate(max($from, $element->from), $element->day); $date->format("Y-m-d") <= $last; $date = $date->modify("+7 days")) {
+                array_push($occurrences, new TimetableOccurrence($element, $date));
+            }
+        }
+        usort($occurrences, fn($a, $b) => array($a->start, $a->element_id) <=> array($b->start, $b->element_id));
+        return $occurrences;
+    }
+
+    /**
+     * The first date on or after $from (Y-m-d) that falls on $day
+     * The times of the timetable are local times, in UTC there are no daylight saving shifts to move them
+     */
+    public static function firstDate(string $from, int $day): DateTimeImmutable
+    {
+        $date = new DateTimeImmutable($from, new DateTimeZone("UTC"));
+        return $date->modify("+" . (($day - (int) $date->format("N") + 1 + 7) % 7) . " days");
+    }
+}
+
+class TimetableClash
+{
+    /** "group", "teacher" or "room" */
+    public string $resource;
+    public int $resource_id;
+    public int $element_id;
+    /** Null when the clash is with an element that is being created */
+    public ?int $other_element_id;
+
+    public function __construct(string $resource, int $resource_id, int $element_id, ?int $other_element_id)
+    {
+        $this->resource = $resource;
+        $this->resource_id = $resource_id;
+        $this->element_id = $element_id;
+        $this->other_element_id = $other_element_id;
+    }
+}
+
+/** One dated occurrence of a timetable element, start and end are "Y-m-d H:i:s" */
+class TimetableOccurrence
+{
+    public int $element_id;
+    public string $date;
+    public string $start;
+    public string $end;
+    public ?int $group_id;
+    public ?int $lesson_id;
+    public ?int $teacher_id;
+    public ?int $room_id;
+
+    public function __construct(TimetableElement $element, DateTimeImmutable $date)
+    {
+        list($hours, $minutes, $seconds) = array_map("intval", explode(":", $element->start));
+        $start = $date->setTime($hours, $minutes, $seconds);
+        list($hours, $minutes, $seconds) = array_map("intval", explode(":", $element->duration));
+        $this->element_id = $element->id;
+        $this->date = $date->format("Y-m-d");
+        $this->start = $start->format("Y-m-d H:i:s");
+        $this->end = $start->modify("+" . ($hours * 3600 + $minutes * 60 + $seconds) . " seconds")->format("Y-m-d H:i:s");
+        $this->group_id = $element->group_id;
+        $this->lesson_id = $element->lesson_id;
+        $this->teacher_id = $element->teacher_id;
+        $this->room_id = $element->room_id;
+    }
 }
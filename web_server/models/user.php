@@ -5,8 +5,11 @@ declare(strict_types=1);
 namespace User;
 
 require_once "db.php";
+require_once "cache.php";
 
+use Cache\Cache;
 use DateTimeImmutable;
+use DateTimeZone;
 use DB\DB;
 use Exception;
 
@@ -19,6 +22,9 @@ class User
     public ?string $role;
     // Hash is intentionally not stored here
 
+    /** Memberships loaded during this request, keyed by "intezmeny_id:uid", false if the user is not part of the intezmeny */
+    private static array $memberships = array();
+
     public function __construct(int $id, string $display_name, string $email, ?string $phone_number, ?string $role)
     {
         $this->id = $id;
@@ -31,7 +37,7 @@ class User
     public static function getUser(DB $db, int $id): User|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT id, display_name, email, phone_number FROM users WHERE id = ?',
                 array($id)
@@ -43,26 +49,44 @@ class User
 
     public static function getRole(DB $db, int $intezmeny_id, int $uid): string|null
     {
+        $membership = User::getMembership($db, $intezmeny_id, $uid);
+        if ($membership === null) return null;
+        return $membership === false ? null : $membership[0];
+    }
+
+    /**
+     * Returns the user's role and whether they accepted the invite as array(role, invite_accepted)
+     * or false if the user is not part of the intezmeny
+     * The result is remembered for the rest of the request so the permission checks of an endpoint cost one query
+     */
+    public static function getMembership(DB $db, int $intezmeny_id, int $id): array|false|null
+    {
+        if (array_key_exists("$intezmeny_id:$id", User::$memberships)) return User::$memberships["$intezmeny_id:$id"];
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                '
-                    SELECT role_ FROM intezmeny_users
-                    LEFT JOIN users ON users.id = intezmeny_users.users_id
-                    WHERE users_id = ? AND intezmeny_id = ?
-                ',
-                array($uid, $intezmeny_id)
-            ))) === null ? null : $ret[0][0];
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT role_, invite_accepted FROM intezmeny_users WHERE intezmeny_id = ? AND users_id = ?',
+                array($intezmeny_id, $id)
+            ));
+            if ($ret === null) return null;
+            User::$memberships["$intezmeny_id:$id"] = count($ret) === 0 ? false : array($ret[0][0], $ret[0][1] === 1);
+            return User::$memberships["$intezmeny_id:$id"];
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
+    /** Has to be called by everything that changes intezmeny_users */
+    public static function forgetMemberships(): void
+    {
+        User::$memberships = array();
+    }
+
     // This shit might be slow
     public static function getUserViaEmail(DB $db, string $email): User|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT id, display_name, email, phone_number FROM users WHERE email = ?',
                 array($email)
@@ -75,7 +99,7 @@ class User
     public static function getAllIntezmenyUsers(DB $db, int $intezmeny_id): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             $ret = $db->handleQueryResult($db->connection->execute_query(
                 '
                     SELECT users.id, users.display_name, users.email, users.phone_number, intezmeny_users.role_ FROM intezmeny_users
@@ -95,10 +119,29 @@ class User
         }
     }
 
+    /**
+     * Returns the id, password hash and token generation of the user with the email or false if there is no such user
+     * Login only needs these so they are read with a single lookup of the email's unique index
+     */
+    public static function getLoginCredentials(DB $db, string $email): array|false|null
+    {
+        try {
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT id, password_hash, token_generation FROM users WHERE email = ?',
+                array($email)
+            ));
+            if ($ret === null) return null;
+            return count($ret) === 0 ? false : array((int) $ret[0][0], $ret[0][1], (int) $ret[0][2]);
+        } catch (Exception) {
+            return $db->logError(false);
+        }
+    }
+
     public static function getUserPasswordHash(DB $db, int $id): string|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT password_hash FROM users WHERE id = ?',
                 array($id)
@@ -110,12 +153,17 @@ class User
 
     public static function userExists(DB $db, int $id): bool|null
     {
+        $cached = Cache::fetchUserValue($id, "user_exists", "", $generation);
+        if ($cached !== null) return $cached;
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM users WHERE id = ?)',
                 array($id)
-            ))) === null ? null : $ret[0][0] === 1;
+            ));
+            if ($ret === null) return null;
+            Cache::storeUserValue($id, "user_exists", "", $ret[0][0] === 1, $generation);
+            return $ret[0][0] === 1;
         } catch (Exception) {
             return $db->logError(false);
         }
@@ -124,7 +172,7 @@ class User
     public static function userExistsViaEmail(DB $db, string $email): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS(SELECT * FROM users WHERE email = ?)',
                 array($email)
@@ -137,7 +185,7 @@ class User
     public static function createUser(DB $db, string $display_name, string $email, string|null $phone_number, string $password_hash): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'INSERT INTO ordayna_main_db.users (display_name, email, phone_number, password_hash) VALUE (?,?,?,?)',
                 array($display_name, $email, $phone_number, $password_hash)
@@ -150,11 +198,14 @@ class User
     public static function deleteUser(DB $db, int $id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return $db->handleQueryResult($db->connection->execute_query(
+            User::forgetMemberships();
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
                 'DELETE FROM users WHERE id = ?',
                 array($id),
             ));
+            Cache::bumpUserGeneration($id);
+            return $ret;
         } catch (Exception) {
             return $db->logError(false);
         }
@@ -163,7 +214,7 @@ class User
     public static function changeDisplayName(DB $db, int $id, string $new_disp_name): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'UPDATE users SET display_name = ? WHERE id = ?',
                 array($new_disp_name, $id)
@@ -176,7 +227,7 @@ class User
     public static function changePhoneNumber(DB $db, int $id, string|null $new_phone_number): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'UPDATE users SET phone_number = ? WHERE id = ?',
                 array($new_phone_number, $id)
@@ -189,7 +240,7 @@ class User
     public static function changePasswordHash(DB $db, int $id, string $new_pass_hash): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'UPDATE users SET password_hash = ? WHERE id = ?',
                 array($new_pass_hash, $id)
@@ -199,80 +250,117 @@ class User
         }
     }
 
-    public static function newToken(DB $db, int $id, string $token_uuid, DateTimeImmutable $expires_after): true|null
+    /**
+     * Returns the user's token generation or false if the user doesn't exist
+     * Every token carries the generation it was issued in (gen claim) and is only valid while it is the user's current one
+     */
+    public static function getTokenGeneration(DB $db, int $id): int|false|null
     {
+        $cached = Cache::fetchUserValue($id, "token_generation", "", $generation);
+        if ($cached !== null) return $cached;
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return $db->handleQueryResult($db->connection->execute_query(
-                'INSERT INTO tokens (uid, token_uuid, expires_after) VALUE (?, ?, ?)',
-                array($id, $token_uuid, $expires_after->format("Y-m-d H:i:s"))
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'SELECT token_generation FROM users WHERE id = ?',
+                array($id)
             ));
+            if ($ret === null) return null;
+            $token_generation = count($ret) === 0 ? false : (int) $ret[0][0];
+            Cache::storeUserValue($id, "token_generation", "", $token_generation, $generation);
+            return $token_generation;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
-    public static function isRevokedToken(DB $db, int $id, string $token_uuid): bool|null
+    /** Returns whether the refresh token or its family was revoked */
+    public static function isRevokedToken(DB $db, int $id, string $token_uuid, string $family): bool|null
     {
+        $cached = Cache::fetchUserValue($id, "revoked_token", $token_uuid, $generation);
+        if ($cached !== null) return $cached;
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                'SELECT EXISTS (SELECT * FROM tokens WHERE uid = ? AND token_uuid = ? AND is_revoked = TRUE)',
-                array($id, $token_uuid)
-            ))) === null ? null : $ret[0][0] === 1;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                '
+                    SELECT EXISTS (SELECT * FROM revoked_tokens WHERE token_uuid = ?)
+                    OR EXISTS (SELECT * FROM revoked_token_families WHERE family = ?)
+                ',
+                array($token_uuid, $family)
+            ));
+            if ($ret === null) return null;
+            Cache::storeUserValue($id, "revoked_token", $token_uuid, $ret[0][0] === 1, $generation);
+            return $ret[0][0] === 1;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
-    public static function revokeToken(DB $db, int $id, string $token_uuid): true|null
+    /**
+     * Returns false if the token was already revoked, which means that it was used twice
+     * $expires_after is the token's expiration, its row is deleted after that by the revoked_tokens_cleanup event
+     */
+    public static function revokeToken(DB $db, int $id, string $token_uuid, DateTimeImmutable $expires_after): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return $db->handleQueryResult($db->connection->execute_query(
-                'UPDATE tokens SET is_revoked=TRUE WHERE uid = ? AND token_uuid = ?',
-                array($id, $token_uuid)
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'INSERT IGNORE INTO revoked_tokens (token_uuid, expires_after) VALUE (?, ?)',
+                array($token_uuid, $expires_after->setTimezone(new DateTimeZone("UTC"))->format("Y-m-d H:i:s"))
             ));
+            Cache::bumpUserGeneration($id);
+            if ($ret === null) return null;
+            return $db->connection->affected_rows === 1;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
-    public static function revokeAllTokens(DB $db, int $id): true|null
+    /**
+     * Revokes every refresh token that was rotated from the same login
+     * $expires_after has to be at least the expiration of the family's newest token
+     */
+    public static function revokeTokenFamily(DB $db, int $id, string $family, DateTimeImmutable $expires_after): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return $db->handleQueryResult($db->connection->execute_query(
-                'UPDATE tokens SET is_revoked=TRUE WHERE uid = ?',
-                array($id)
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'INSERT IGNORE INTO revoked_token_families (family, expires_after) VALUE (?, ?)',
+                array($family, $expires_after->setTimezone(new DateTimeZone("UTC"))->format("Y-m-d H:i:s"))
             ));
+            Cache::bumpUserGeneration($id);
+            return $ret;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
-    public static function partOfIntezmeny(DB $db, int $intezmeny_id, int $id, bool $invite_must_be_accepted): bool|null
+    /** Invalidates every token of the user by moving on to the next token generation */
+    public static function revokeAllTokens(DB $db, int $id): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                '
-                    SELECT EXISTS(
-                        SELECT * FROM intezmeny_users
-                        WHERE intezmeny_id = ? AND users_id = ?' . ($invite_must_be_accepted === true ? ' AND invite_accepted = TRUE' : '') . '
-                    )
-                ',
-                array($intezmeny_id, $id)
-            ))) === null ? null : $ret[0][0] === 1;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
+            $ret = $db->handleQueryResult($db->connection->execute_query(
+                'UPDATE users SET token_generation = token_generation + 1 WHERE id = ?',
+                array($id)
+            ));
+            Cache::bumpUserGeneration($id);
+            return $ret;
         } catch (Exception) {
             return $db->logError(false);
         }
     }
 
+    public static function partOfIntezmeny(DB $db, int $intezmeny_id, int $id, bool $invite_must_be_accepted): bool|null
+    {
+        $membership = User::getMembership($db, $intezmeny_id, $id);
+        if ($membership === null) return null;
+        return $membership !== false and ($invite_must_be_accepted === false or $membership[1] === true);
+    }
+
     public static function isThisTeacher(DB $db, int $intezmeny_id, int $teacher_id, int $id): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_intezmeny_' . $intezmeny_id)) === null) return null;
+            if ($db->selectDb('ordayna_intezmeny_' . $intezmeny_id) === null) return null;
             return ($ret = $db->handleQueryResult($db->connection->execute_query(
                 'SELECT EXISTS (SELECT * FROM teacher WHERE id = ? AND user_id = ?)',
                 array($teacher_id, $id)
@@ -282,36 +370,26 @@ class User
         }
     }
 
+    /** Admins count as teachers */
     public static function isTeacher(DB $db, int $intezmeny_id, int $id): bool|null
     {
-        try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                'CALL isTeacher(?, ?)',
-                array($id, $intezmeny_id)
-            ))) === null ? null : $ret[0][0] === 1;
-        } catch (Exception) {
-            return $db->logError(false);
-        }
+        $membership = User::getMembership($db, $intezmeny_id, $id);
+        if ($membership === null) return null;
+        return $membership !== false and ($membership[0] === "teacher" or $membership[0] === "admin");
     }
 
     public static function isAdmin(DB $db, int $intezmeny_id, int $id): bool|null
     {
-        try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
-            return ($ret = $db->handleQueryResult($db->connection->execute_query(
-                'CALL isAdmin(?, ?)',
-                array($id, $intezmeny_id)
-            ))) === null ? null : $ret[0][0] === 1;
-        } catch (Exception) {
-            return $db->logError(false);
-        }
+        $membership = User::getMembership($db, $intezmeny_id, $id);
+        if ($membership === null) return null;
+        return $membership !== false and $membership[0] === "admin";
     }
 
     public static function inviteUser(DB $db, int $intezmeny_id, int $uid): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            User::forgetMemberships();
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'INSERT INTO intezmeny_users (intezmeny_id, users_id, role_, invite_accepted) VALUE (? ,?, "student", FALSE)',
                 array($intezmeny_id, $uid)
@@ -324,7 +402,8 @@ class User
     public static function fireUser(DB $db, int $intezmeny_id, int $uid): bool|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            User::forgetMemberships();
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 '
                     DELETE FROM intezmeny_users
@@ -340,7 +419,8 @@ class User
     public static function acceptInvite(DB $db, int $intezmeny_id, int $uid): true|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            User::forgetMemberships();
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             return $db->handleQueryResult($db->connection->execute_query(
                 'UPDATE intezmeny_users SET invite_accepted=TRUE WHERE intezmeny_id = ? AND users_id = ?',
                 array($intezmeny_id, $uid)
@@ -353,7 +433,7 @@ class User
     public static function getInvites(DB $db, int $uid): array|null
     {
         try {
-            if ($db->logError($db->connection->select_db('ordayna_main_db')) === null) return null;
+            if ($db->selectDb('ordayna_main_db') === null) return null;
             $ret = $db->handleQueryResult($db->connection->execute_query(
                 '
                     SELECT intezmeny_users.intezmeny_id, intezmeny.name FROM intezmeny_users
@@ -0,0 +1,77 @@
+<?php
+
+// Measures how long hashing a password takes on this machine with increasing costs and prints the config.php settings
+// of the most expensive one that still fits the target time (default 100 ms)
+// Every login verifies a hash so the target is also the cpu time a login costs, see tests/login_benchmark.py
+// Should be run on the web server itself as the times depend on its cpu
+// Usage: php password_cost.php [target ms] [bcrypt|argon2id]
+
+declare(strict_types=1);
+
+namespace PasswordCost;
+
+if (PHP_SAPI !== "cli") exit(1);
+
+const USAGE = "Usage: php password_cost.php [target ms] [bcrypt|argon2id]\n";
+// How many hashes are timed per cost, the median is used
+const SAMPLES = 5;
+
+$target_ms = 100;
+if (isset($argv[1])) {
+    if (ctype_digit($argv[1]) === false or (int) $argv[1] === 0) {
+        fwrite(STDERR, USAGE);
+        exit(1);
+    }
+    $target_ms = (int) $argv[1];
+}
+$algorithm = $argv[2] ?? "bcrypt";
+
+switch ($algorithm) {
+    case "bcrypt":
+        $algo = PASSWORD_BCRYPT;
+        $algo_name = "PASSWORD_BCRYPT";
+        // bcrypt's cost is logarithmic, every step doubles the time
+        $candidates = array();
+        for ($cost = 8; $cost <= 16; $cost++) $candidates[] = array("cost" => $cost);
+        break;
+    case "argon2id":
+        if (defined("PASSWORD_ARGON2ID") === false) {
+            fwrite(STDERR, "This php was built without argon2\n");
+            exit(1);
+        }
+        $algo = PASSWORD_ARGON2ID;
+        $algo_name = "PASSWORD_ARGON2ID";
+        // The memory cost is kept at 64 MiB (in KiB) and only the number of passes grows
+        $candidates = array();
+        for ($time_cost = 1; $time_cost <= 10; $time_cost++) $candidates[] = array("memory_cost" => 65536, "time_cost" => $time_cost, "threads" => 1);
+        break;
+    default:
+        fwrite(STDERR, USAGE);
+        exit(1);
+}
+
+$chosen = null;
+foreach ($candidates as $options) {
+    $times = array();
+    for ($i = 0; $i < SAMPLES; $i++) {
+        $started = hrtime(true);
+        password_hash("benchmark password", $algo, $options);
+        $times[] = (hrtime(true) - $started) / 1e6;
+    }
+    sort($times);
+    $ms = $times[intdiv(SAMPLES, 2)];
+    echo str_pad(json_encode($options), 56) . sprintf("%10.1f ms", $ms) . "\n";
+    if ($ms > $target_ms) break;
+    $chosen = $options;
+}
+
+if ($chosen === null) {
+    fwrite(STDERR, "Even the cheapest setting takes longer than $target_ms ms\n");
+    exit(1);
+}
+echo "\nThe most expensive setting within $target_ms ms, add it to config.php (existing hashes are replaced at their next login):\n";
+echo "    public static ?string \$password_algo = $algo_name;\n";
+$pairs = array();
+foreach ($chosen as $name => $value) $pairs[] = "\"$name\" => $value";
+echo "    public static array \$password_options = array(" . implode(", ", $pairs) . ");\n";
+exit(0);
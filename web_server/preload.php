@@ -0,0 +1,61 @@
+<?php
+
+// OPcache preload script of the php-fpm setups (see config/php/ordayna.ini), run once when php-fpm starts
+// The web server's classes and functions and the JWT and UUID libraries are compiled, linked and kept in shared memory
+// so requests don't load them again, php-fpm has to be restarted for changes to these files (including config.php)
+// The libraries are only preloaded if composer's class map is generated: composer dump-autoload --optimize
+
+declare(strict_types=1);
+
+namespace Preload;
+
+const FILES = array(
+    "config.php",
+    "error.php",
+    "cache.php",
+    "metrics.php",
+    "db.php",
+    "jwt.php",
+    "controller.php",
+    "models/attachment.php",
+    "models/availability.php",
+    "models/blob.php",
+    "models/calendar.php",
+    "models/class.php",
+    "models/group.php",
+    "models/homework.php",
+    "models/intezmeny.php",
+    "models/job.php",
+    "models/lesson.php",
+    "models/room.php",
+    "models/teacher.php",
+    "models/timetable_element.php",
+    "models/user.php",
+);
+const LIBRARIES = array("Lcobucci\\JWT\\", "Lcobucci\\Clock\\", "Psr\\Clock\\", "Ramsey\\Uuid\\", "Ramsey\\Collection\\", "Brick\\Math\\");
+
+if (function_exists("opcache_compile_file") === false) return;
+
+// Compiling doesn't run the files so their relative require_onces don't matter here
+// config.php and the libraries are missing until the setup finished, php-fpm still has to start before that
+foreach (FILES as $file) {
+    if (is_file(__DIR__ . "/" . $file)) opcache_compile_file(__DIR__ . "/" . $file);
+}
+if (is_file(__DIR__ . "/vendor/autoload.php") === false) return;
+require_once __DIR__ . "/vendor/autoload.php";
+
+$class_map = require __DIR__ . "/vendor/composer/autoload_classmap.php";
+$preloaded = 0;
+foreach ($class_map as $class => $path) {
+    foreach (LIBRARIES as $prefix) {
+        if (str_starts_with($class, $prefix) === false) continue;
+        // Loading through the autoloader declares the parents and interfaces first so the class can be linked
+        try {
+            if (class_exists($class) or interface_exists($class) or trait_exists($class) or enum_exists($class)) $preloaded++;
+        } catch (\Throwable) {
+            // Classes of optional integrations (e.g. ones needing an extension that isn't installed) are skipped
+        }
+        break;
+    }
+}
+if ($preloaded === 0) error_log("preload.php: no library classes were preloaded, run composer dump-autoload --optimize");
@@ -32,3 +32,86 @@ async function getAccessToken() {
 setInterval(getAccessToken, 1000 * 60);
 
 await getAccessToken();
+
+// Collections read by fetchSnapshot that the next fetchVersioned of their intezmeny/get/ endpoint returns instead of fetching them
+const preloaded = new Map();
+
+// Reads the chosen collections of the intezmeny/get/snapshot endpoint in a single request, returns them by name or null
+// The intezmeny's collections are also handed to the page's next fetchVersioned of them so its load functions stay as they are
+export async function fetchSnapshot(intezmeny_id, collections) {
+  const response = await fetch(url + "intezmeny/get/snapshot", {
+    method: "POST",
+    body: JSON.stringify({
+      intezmeny_id: intezmeny_id,
+      collections: collections,
+    })
+  });
+  if (response.ok !== true) {
+    return null;
+  }
+  const snapshot = await response.json();
+  for (const collection of collections) {
+    if (collection === "users" || collection === "profile") continue;
+    preloaded.set("versioned:" + url + "intezmeny/get/" + collection + ":" + JSON.stringify({ intezmeny_id: intezmeny_id }), {
+      body: JSON.stringify(snapshot[collection]),
+      // Only the first page of the homeworks is in the snapshot
+      next_cursor: snapshot[collection + "_next_cursor"] ?? null,
+    });
+  }
+  return snapshot;
+}
+
+// Like fetch but for the intezmeny/get/ endpoints, their responses are kept for the session and revalidated with their ETag
+// so unchanged data is not sent again, a 304 is turned back into the kept response
+export async function fetchVersioned(resource, options) {
+  const key = "versioned:" + resource + ":" + (options.body ?? "");
+  if (preloaded.has(key)) {
+    const kept = preloaded.get(key);
+    preloaded.delete(key);
+    return keptResponse(kept);
+  }
+  const kept = JSON.parse(sessionStorage.getItem(key));
+  const headers = new Headers(options.headers);
+  if (kept !== null) headers.set("If-None-Match", kept.etag);
+  const response = await fetch(resource, { ...options, headers: headers });
+  if (response.status === 304 && kept !== null) {
+    return keptResponse(kept);
+  }
+  if (response.ok === true && response.headers.has("ETag")) {
+    try {
+      sessionStorage.setItem(key, JSON.stringify({
+        etag: response.headers.get("ETag"),
+        body: await response.clone().text(),
+        next_cursor: response.headers.get("X-Next-Cursor"),
+      }));
+    } catch {
+      // The storage is full, the response is just not kept
+    }
+  }
+  return response;
+}
+
+function keptResponse(kept) {
+  const headers = new Headers({ "Content-Type": "application/json" });
+  if ((kept.next_cursor ?? null) !== null) headers.set("X-Next-Cursor", kept.next_cursor);
+  return new Response(kept.body, { status: 200, headers: headers });
+}
+
+// Reads every page of a paged intezmeny/get/ endpoint (e.g. homeworks) with fetchVersioned by following the pages'
+// X-Next-Cursor header, returns the items of all pages or null
+export async function fetchAllPages(resource, fields) {
+  let items = [];
+  let cursor = null;
+  do {
+    const response = await fetchVersioned(resource, {
+      method: "POST",
+      body: JSON.stringify(cursor === null ? fields : { ...fields, cursor: cursor }),
+    });
+    if (response.ok !== true) {
+      return null;
+    }
+    items = items.concat(await response.json());
+    cursor = response.headers.get("X-Next-Cursor");
+  } while (cursor !== null);
+  return items;
+}
@@ -1,5 +1,5 @@
 import { validateNumber, validateString } from "./validate.js";
-import { url, getCookie } from "./cookie.js";
+import { url, getCookie, fetchVersioned, fetchSnapshot } from "./cookie.js";
 
 let intezmeny_id = getCookie("intezmeny_id");
 if (intezmeny_id === null) location.href = "profile.html";
@@ -72,7 +72,7 @@ async function prepareClass() {
       </div>
     `;
   } else if (val === "modify") {
-    const response = await fetch(url + "intezmeny/get/classes", {
+    const response = await fetchVersioned(url + "intezmeny/get/classes", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -98,7 +98,7 @@ async function prepareClass() {
     `;
     document.getElementById("actual_form").innerHTML = data;
   } else if (val === "delete") {
-    const response = await fetch(url + "intezmeny/get/classes", {
+    const response = await fetchVersioned(url + "intezmeny/get/classes", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -156,7 +156,7 @@ async function modifyClassUpdate() {
     return;
   }
   const class_id = document.getElementById("orig").options[document.getElementById("orig").selectedIndex].getAttribute("value");
-  const response = await fetch(url + "intezmeny/get/classes", {
+  const response = await fetchVersioned(url + "intezmeny/get/classes", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -227,7 +227,7 @@ async function prepareGroup() {
   }
   const val = document.getElementById("another_choice").options[document.getElementById("another_choice").selectedIndex].getAttribute("value");
   if (val === "create") {
-    const response = await fetch(url + "intezmeny/get/classes", {
+    const response = await fetchVersioned(url + "intezmeny/get/classes", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -256,26 +256,12 @@ async function prepareGroup() {
     `;
     document.getElementById("actual_form").innerHTML = html;
   } else if (val === "modify") {
-    const response = await fetch(url + "intezmeny/get/groups", {
-      method: "POST",
-      body: JSON.stringify({
-        intezmeny_id: intezmeny_id,
-      })
-    });
-    if (response.ok !== true) {
+    const snapshot = await fetchSnapshot(intezmeny_id, ["groups", "classes"]);
+    if (snapshot === null) {
       return;
     }
-    let groups = await response.json();
-    const response_2 = await fetch(url + "intezmeny/get/classes", {
-      method: "POST",
-      body: JSON.stringify({
-        intezmeny_id: intezmeny_id,
-      })
-    });
-    if (response_2.ok !== true) {
-      return;
-    }
-    let classes = await response_2.json();
+    let groups = snapshot.groups;
+    let classes = snapshot.classes;
     let html = `<select id="orig" size="3" onchange="modifyGroupUpdate()">`;
     for (let i = 0; i < groups.length; i++) {
       html += `<option value="${groups[i].id}">${groups[i].name}</option>`;
@@ -300,7 +286,7 @@ async function prepareGroup() {
     `;
     document.getElementById("actual_form").innerHTML = html;
   } else if (val === "delete") {
-    const response = await fetch(url + "intezmeny/get/groups", {
+    const response = await fetchVersioned(url + "intezmeny/get/groups", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -368,7 +354,7 @@ async function modifyGroupUpdate() {
     return;
   }
   const group_id = document.getElementById("orig").options[document.getElementById("orig").selectedIndex].getAttribute("value");
-  const response = await fetch(url + "intezmeny/get/groups", {
+  const response = await fetchVersioned(url + "intezmeny/get/groups", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -473,7 +459,7 @@ async function prepareLesson() {
       </div>
     `;
   } else if (val === "modify") {
-    const response = await fetch(url + "intezmeny/get/lessons", {
+    const response = await fetchVersioned(url + "intezmeny/get/lessons", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -499,7 +485,7 @@ async function prepareLesson() {
     `;
     document.getElementById("actual_form").innerHTML = data;
   } else if (val === "delete") {
-    const response = await fetch(url + "intezmeny/get/lessons", {
+    const response = await fetchVersioned(url + "intezmeny/get/lessons", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -554,7 +540,7 @@ async function modifyLessonUpdate() {
     return;
   }
   const lesson_id = document.getElementById("orig").options[document.getElementById("orig").selectedIndex].getAttribute("value");
-  const response = await fetch(url + "intezmeny/get/lessons", {
+  const response = await fetchVersioned(url + "intezmeny/get/lessons", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -637,7 +623,7 @@ async function prepareRoom() {
       </div>
     `;
   } else if (val === "modify") {
-    const response = await fetch(url + "intezmeny/get/rooms", {
+    const response = await fetchVersioned(url + "intezmeny/get/rooms", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -667,7 +653,7 @@ async function prepareRoom() {
     `;
     document.getElementById("actual_form").innerHTML = data;
   } else if (val === "delete") {
-    const response = await fetch(url + "intezmeny/get/rooms", {
+    const response = await fetchVersioned(url + "intezmeny/get/rooms", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -724,7 +710,7 @@ async function modifyRoomUpdate() {
     return;
   }
   const room_id = document.getElementById("orig").options[document.getElementById("orig").selectedIndex].getAttribute("value");
-  const response = await fetch(url + "intezmeny/get/rooms", {
+  const response = await fetchVersioned(url + "intezmeny/get/rooms", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -833,26 +819,12 @@ async function prepareTeacher() {
     `;
     document.getElementById("actual_form").innerHTML = html;
   } else if (val === "modify") {
-    const response_2 = await fetch(url + "intezmeny/user/get_all", {
-      method: "POST",
-      body: JSON.stringify({
-        intezmeny_id: intezmeny_id,
-      })
-    });
-    if (response_2.ok !== true) {
+    const snapshot = await fetchSnapshot(intezmeny_id, ["users", "teachers"]);
+    if (snapshot === null) {
       return;
     }
-    let users = await response_2.json();
-    const response = await fetch(url + "intezmeny/get/teachers", {
-      method: "POST",
-      body: JSON.stringify({
-        intezmeny_id: intezmeny_id,
-      })
-    });
-    if (response.ok !== true) {
-      return;
-    }
-    let teachers = await response.json();
+    let users = snapshot.users;
+    let teachers = snapshot.teachers;
     let data = `
       <select id="orig" size="3" onchange="modifyTeacherUpdate()">
     `;
@@ -880,7 +852,7 @@ async function prepareTeacher() {
     `;
     document.getElementById("actual_form").innerHTML = data;
   } else if (val === "delete") {
-    const response = await fetch(url + "intezmeny/get/teachers", {
+    const response = await fetchVersioned(url + "intezmeny/get/teachers", {
       method: "POST",
       body: JSON.stringify({
         intezmeny_id: intezmeny_id,
@@ -953,7 +925,7 @@ async function modifyTeacherUpdate() {
     return;
   }
   let users = await response_2.json();
-  const response = await fetch(url + "intezmeny/get/teachers", {
+  const response = await fetchVersioned(url + "intezmeny/get/teachers", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -1063,21 +1035,12 @@ async function prepareUser() {
       </div>
     `;
   } else if (val === "fire") {
-    const response = await fetch(url + "intezmeny/user/get_all", {
-      method: "POST",
-      body: JSON.stringify({
-        intezmeny_id: intezmeny_id,
-      })
-    });
-    if (response.ok !== true) {
-      return;
-    }
-    let users = await response.json();
-    const response_2 = await fetch(url + "user/profile", { method: "GET" });
-    if (response_2.ok !== true) {
+    const snapshot = await fetchSnapshot(intezmeny_id, ["users", "profile"]);
+    if (snapshot === null) {
       return;
     }
-    let profile = await response_2.json();
+    let users = snapshot.users;
+    let profile = snapshot.profile;
     let data = `
       <select id="orig" size="3">
     `;
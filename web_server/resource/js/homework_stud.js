@@ -1,4 +1,4 @@
-import { url, getCookie } from "./cookie.js";
+import { url, getCookie, fetchVersioned, fetchSnapshot, fetchAllPages } from "./cookie.js";
 
 const intezmeny_id = getCookie("intezmeny_id");
 if (intezmeny_id === null) location.href = "profile.html";
@@ -22,7 +22,7 @@ function returnHome() {
 }
 
 async function loadGroups() {
-  const response = await fetch(url + "intezmeny/get/groups", {
+  const response = await fetchVersioned(url + "intezmeny/get/groups", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -41,7 +41,7 @@ async function loadGroups() {
 }
 
 async function loadLessons() {
-  const response = await fetch(url + "intezmeny/get/lessons", {
+  const response = await fetchVersioned(url + "intezmeny/get/lessons", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -60,16 +60,11 @@ async function loadLessons() {
 }
 
 async function loadHomeworks() {
-  const response = await fetch(url + "intezmeny/get/homeworks", {
-    method: "POST",
-    body: JSON.stringify({
-      intezmeny_id: intezmeny_id,
-    })
-  });
-  if (response.ok !== true) {
+  const pages = await fetchAllPages(url + "intezmeny/get/my_homeworks", { intezmeny_id: intezmeny_id });
+  if (pages === null) {
     return;
   }
-  homeworks = await response.json();
+  homeworks = pages;
 
   updateHomeworks();
 }
@@ -106,6 +101,7 @@ function expandDescription(homework_array_id) {
   document.getElementById("feladatok_leiras").value = homeworks[homework_array_id].description;
 }
 
+await fetchSnapshot(intezmeny_id, ["lessons", "groups"]);
 await loadLessons();
 await loadGroups();
 await loadHomeworks();
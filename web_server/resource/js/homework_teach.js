@@ -1,4 +1,4 @@
-import { url, getCookie } from "./cookie.js";
+import { url, getCookie, fetchVersioned, fetchSnapshot, fetchAllPages } from "./cookie.js";
 import { validateDateTime, validateString } from "./validate.js";
 
 const intezmeny_id = getCookie("intezmeny_id");
@@ -24,7 +24,7 @@ function returnHome() {
 }
 
 async function loadGroups() {
-  const response = await fetch(url + "intezmeny/get/groups", {
+  const response = await fetchVersioned(url + "intezmeny/get/groups", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -42,7 +42,7 @@ async function loadGroups() {
 }
 
 async function loadLessons() {
-  const response = await fetch(url + "intezmeny/get/lessons", {
+  const response = await fetchVersioned(url + "intezmeny/get/lessons", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -60,7 +60,7 @@ async function loadLessons() {
 }
 
 async function loadTeachers() {
-  const response = await fetch(url + "intezmeny/get/teachers", {
+  const response = await fetchVersioned(url + "intezmeny/get/teachers", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -78,16 +78,11 @@ async function loadTeachers() {
 }
 
 async function loadHomeworks() {
-  const response = await fetch(url + "intezmeny/get/homeworks", {
-    method: "POST",
-    body: JSON.stringify({
-      intezmeny_id: intezmeny_id,
-    })
-  });
-  if (response.ok !== true) {
+  const pages = await fetchAllPages(url + "intezmeny/get/homeworks", { intezmeny_id: intezmeny_id });
+  if (pages === null) {
     return;
   }
-  homeworks = await response.json();
+  homeworks = pages;
 
   let choice_html = `<option value="-1">Új</option>`;
   for (let i = 0; i < homeworks.length; i++) {
@@ -256,6 +251,7 @@ async function deleteHomework() {
   await loadHomeworks();
 }
 
+await fetchSnapshot(intezmeny_id, ["groups", "homeworks", "lessons", "teachers"]);
 await loadGroups();
 await loadHomeworks();
 await loadLessons();
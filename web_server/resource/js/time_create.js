@@ -1,5 +1,5 @@
 import { validateDate, validateTime } from "./validate.js";
-import { url, getCookie } from "./cookie.js";
+import { url, getCookie, fetchVersioned, fetchSnapshot } from "./cookie.js";
 
 let intezmeny_id = getCookie("intezmeny_id");
 if (intezmeny_id === null) location.href = "profile.html";
@@ -24,7 +24,7 @@ function returnHome() {
 }
 
 async function loadTeachers() {
-  const response = await fetch(url + "intezmeny/get/teachers", {
+  const response = await fetchVersioned(url + "intezmeny/get/teachers", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -42,7 +42,7 @@ async function loadTeachers() {
 }
 
 async function loadLessons() {
-  const response = await fetch(url + "intezmeny/get/lessons", {
+  const response = await fetchVersioned(url + "intezmeny/get/lessons", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -60,7 +60,7 @@ async function loadLessons() {
 }
 
 async function loadRooms() {
-  const response = await fetch(url + "intezmeny/get/rooms", {
+  const response = await fetchVersioned(url + "intezmeny/get/rooms", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -78,7 +78,7 @@ async function loadRooms() {
 }
 
 async function loadGroups() {
-  const response = await fetch(url + "intezmeny/get/groups", {
+  const response = await fetchVersioned(url + "intezmeny/get/groups", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -98,7 +98,7 @@ async function loadGroups() {
 let timetable = [];
 
 async function loadTimetable() {
-  const response = await fetch(url + "intezmeny/get/timetable", {
+  const response = await fetchVersioned(url + "intezmeny/get/timetable", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -289,6 +289,7 @@ async function deleteData() {
   await loadTimetable();
 }
 
+await fetchSnapshot(intezmeny_id, ["teachers", "lessons", "rooms", "groups"]);
 await loadTeachers();
 await loadLessons();
 await loadRooms();
@@ -1,13 +1,15 @@
-import { getCookie, url } from "./cookie.js";
+import { getCookie, url, fetchVersioned, fetchSnapshot } from "./cookie.js";
 
-let intezmeny_id = getCookie("intezmeny_id");
-if (intezmeny_id === null) location.href = "profile.html";
+let intezmeny_id = getCookie("intezmeny_id");
+if (intezmeny_id === null) location.href = "profile.html";
 let intezmeny_name = getCookie("intezmeny_name");
 if (intezmeny_name === null) location.href = "profile.html";
 let user_role = getCookie("user_role");
 if (user_role === null) location.href = "profile.html";
 document.getElementById("i-name").innerHTML = `${intezmeny_name} ${user_role}`;
-let timetable = [];
+let occurrences = [];
+// The dates of the displayed week from monday, day_N shows the occurrences of week_dates[N]
+let week_dates = [];
 let teachers = [];
 let lessons = [];
 let rooms = [];
@@ -24,7 +26,7 @@ function returnHome() {
 }
 
 async function loadTeachers() {
-  const response = await fetch(url + "intezmeny/get/teachers", {
+  const response = await fetchVersioned(url + "intezmeny/get/teachers", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -37,7 +39,7 @@ async function loadTeachers() {
 }
 
 async function loadLessons() {
-  const response = await fetch(url + "intezmeny/get/lessons", {
+  const response = await fetchVersioned(url + "intezmeny/get/lessons", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -50,7 +52,7 @@ async function loadLessons() {
 }
 
 async function loadRooms() {
-  const response = await fetch(url + "intezmeny/get/rooms", {
+  const response = await fetchVersioned(url + "intezmeny/get/rooms", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -63,7 +65,7 @@ async function loadRooms() {
 }
 
 async function loadGroups() {
-  const response = await fetch(url + "intezmeny/get/groups", {
+  const response = await fetchVersioned(url + "intezmeny/get/groups", {
     method: "POST",
     body: JSON.stringify({
       intezmeny_id: intezmeny_id,
@@ -76,97 +78,108 @@ async function loadGroups() {
 
   let html = "";
   for (let i = 0; i < groups.length; i++) {
-    html += `<div>${groups[i].name.length <= 15 ? groups[i].name : (groups[i].name.slice(0, 15) + "...")}<input type="checkbox" onchange="updateTimetable()" id=${"group_" + groups[i].id}></div>`
+    html += `<div>${groups[i].name.length <= 15 ? groups[i].name : (groups[i].name.slice(0, 15) + "...")}<input type="checkbox" onchange="loadTimetable()" id=${"group_" + groups[i].id}></div>`
   }
   document.getElementById("classes_").innerHTML = html;
 }
-
-async function loadTimetable() {
-  const response = await fetch(url + "intezmeny/get/timetable", {
-    method: "POST",
-    body: JSON.stringify({
-      intezmeny_id: intezmeny_id,
-    })
-  });
-  if (response.ok !== true) {
-    return;
-  }
-  timetable = await response.json();
-  updateTimetable();
-}
-
-function updateTimetable() {
+
+function formatDate(date) {
+  return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, "0")}-${String(date.getDate()).padStart(2, "0")}`;
+}
+
+// The server expands the selected groups' elements into the current week's occurrences, until a group is selected
+// students see the occurrences of their own groups
+async function loadTimetable() {
   let group_ids = [];
   for (let i = 0; i < groups.length; i++) {
     if (document.getElementById("group_" + groups[i].id).checked !== false) {
       group_ids[group_ids.length] = groups[i].id;
     }
   }
-
-  for (let day_id = 0; day_id < 7; day_id++) {
-    let html = "";
-    for (let i = 0; i < timetable.length; i++) {
-      if (timetable[i].day !== day_id) continue;
-      let group_selected = false;
-      for (let k = 0; k < group_ids.length; k++) {
-        if (group_ids[k] === timetable[i].group_id) {
-          group_selected = true;
-          break;
-        }
-      }
-      if (group_selected === false) continue;
+
+  const monday = new Date();
+  monday.setDate(monday.getDate() - (monday.getDay() + 6) % 7);
+  let new_week_dates = [];
+  for (let i = 0; i < 7; i++) {
+    const date = new Date(monday);
+    date.setDate(monday.getDate() + i);
+    new_week_dates[i] = formatDate(date);
+  }
+
+  let responses;
+  if (group_ids.length === 0 && user_role === "Diák") {
+    responses = [await fetchVersioned(url + "intezmeny/get/occurrences", {
+      method: "POST",
+      body: JSON.stringify({
+        intezmeny_id: intezmeny_id,
+        from: new_week_dates[0],
+        until: new_week_dates[6],
+        mine: true,
+      })
+    })];
+  } else {
+    responses = await Promise.all(group_ids.map((group_id) => fetchVersioned(url + "intezmeny/get/occurrences", {
+      method: "POST",
+      body: JSON.stringify({
+        intezmeny_id: intezmeny_id,
+        group_id: String(group_id),
+        from: new_week_dates[0],
+        until: new_week_dates[6],
+      })
+    })));
+  }
+  let new_occurrences = [];
+  for (let i = 0; i < responses.length; i++) {
+    if (responses[i].ok !== true) {
+      return;
+    }
+    new_occurrences = new_occurrences.concat(await responses[i].json());
+  }
+  occurrences = new_occurrences.sort((a, b) => a.start.localeCompare(b.start) || a.element_id - b.element_id);
+  week_dates = new_week_dates;
+  updateTimetable();
+}
+
+function updateTimetable() {
+  for (let day_id = 0; day_id < 7; day_id++) {
+    let html = "";
+    for (let i = 0; i < occurrences.length; i++) {
+      if (occurrences[i].date !== week_dates[day_id]) continue;
       html += `<div class="ora-card">`
       for (let k = 0; k < lessons.length; k++) {
-        if (lessons[k].id === timetable[i].lesson_id) {
+        if (lessons[k].id === occurrences[i].lesson_id) {
           html += `<div>${lessons[k].name.length <= 15 ? lessons[k].name : (lessons[k].name.slice(0, 15) + "...")}</div>`;
           break;
         }
       }
       for (let k = 0; k < teachers.length; k++) {
-        if (teachers[k].id === timetable[i].teacher_id) {
+        if (teachers[k].id === occurrences[i].teacher_id) {
           html += `<div>${teachers[k].name.length <= 15 ? teachers[k].name : (teachers[k].name.slice(0, 15) + "...")}</div>`;
           break;
         }
       }
       for (let k = 0; k < rooms.length; k++) {
-        if (rooms[k].id === timetable[i].room_id) {
+        if (rooms[k].id === occurrences[i].room_id) {
           html += `<div>${rooms[k].name.length <= 15 ? rooms[k].name : (rooms[k].name.slice(0, 15) + "...")}</div>`;
           break;
         }
       }
 
-      // I love javascript
-      // There has to be a better way right?
-      let start_date = new Date("2000-02-02 " + timetable[i].start);
-      let duration_date = new Date("2000-02-02 " + timetable[i].duration);
-      let end_hour = start_date.getHours() + duration_date.getHours();
-      let end_minute = start_date.getMinutes() + duration_date.getMinutes();
-      let end_second = start_date.getSeconds() + duration_date.getSeconds();
-      if (end_second >= 60) {
-        end_second -= 60;
-        end_minute += 1;
-      }
-      if (end_minute >= 60) {
-        end_minute -= 60;
-        end_hour += 1;
-      }
-      if (end_hour >= 24) end_hour -= 24;
-      if (end_second < 10) end_second = "0" + end_second;
-      if (end_minute < 10) end_minute = "0" + end_minute;
-      if (end_hour < 10) end_hour = "0" + end_hour;
-      html += `<div>${timetable[i].start}-${end_hour}:${end_minute}:${end_second}</div>`
+      // Both are "Y-m-d H:i:s", the end is computed by the server
+      html += `<div>${occurrences[i].start.slice(11)}-${occurrences[i].end.slice(11)}</div>`
       html += "</div>"
     }
-    document.getElementById("day_" + day_id).innerHTML = html;
-  }
+    document.getElementById("day_" + day_id).innerHTML = html;
+  }
 }
 
+await fetchSnapshot(intezmeny_id, ["teachers", "lessons", "rooms", "groups"]);
 await loadTeachers();
 await loadLessons();
 await loadRooms();
 await loadGroups();
-await loadTimetable();
-
-window.loadTimetable = loadTimetable;
+await loadTimetable();
+
+window.loadTimetable = loadTimetable;
 window.updateTimetable = updateTimetable;
 window.returnHome = returnHome;
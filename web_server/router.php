@@ -4,15 +4,21 @@ declare(strict_types=1);
 
 namespace Router;
 
-require 'vendor/autoload.php';
+require_once "autoload.php";
 require_once "controller.php";
 
 use Controller\Controller;
+use Error\Log;
+use Metrics\Metrics;
+
+Metrics::init();
+Log::init();
 
 $controller = new Controller();
 
-function route(string $method, callable $function): never
+function route(string $method, callable $function, string|null $metrics_route = null): never
 {
+    if ($metrics_route !== null) Metrics::setRoute($metrics_route);
     if ($_SERVER["REQUEST_METHOD"] === $method) {
         call_user_func($function);
     } else {
@@ -32,6 +38,8 @@ if (explode("/", explode("?", $_SERVER["REQUEST_URI"])[0])[1] === 'resource') {
 }
 
 $req_uri = explode("?", $_SERVER["REQUEST_URI"])[0];
+// Paths that are not in the match table are relabeled by the default arm
+Metrics::setRoute($req_uri);
 
 if ($req_uri === '/' or $req_uri === '') {
     route("GET", function () {
@@ -54,6 +62,7 @@ match ($req_uri) {
     '/create_intezmeny' => route('POST', [$controller, 'createIntezmeny']),
     '/delete_intezmeny' => route('DELETE', [$controller, 'deleteIntezmeny']),
     '/get_intezmenys' => route('GET', [$controller, 'getIntezmenys']),
+    '/get_job' => route('POST', [$controller, 'getJob']),
     '/intezmeny/user/invite' => route('POST', [$controller, 'inviteToIntezmeny']),
     '/intezmeny/user/fire' => route('POST', [$controller, 'fireUser']),
     '/intezmeny/user/accept_invite' => route('POST', [$controller, 'acceptInviteToIntezmeny']),
@@ -62,14 +71,17 @@ match ($req_uri) {
     '/intezmeny/create/class' => route('POST', [$controller, 'createClass']),
     '/intezmeny/create/lesson' => route('POST', [$controller, 'createLesson']),
     '/intezmeny/create/group' => route('POST', [$controller, 'createGroup']),
+    '/intezmeny/create/group_member' => route('POST', [$controller, 'createGroupMember']),
     '/intezmeny/create/room' => route('POST', [$controller, 'createRoom']),
     '/intezmeny/create/teacher' => route('POST', [$controller, 'createTeacher']),
     '/intezmeny/create/timetable_element' => route('POST', [$controller, 'createTimetableElement']),
     '/intezmeny/create/homework' => route('POST', [$controller, 'createHomework']),
     '/intezmeny/create/attachment' => route('POST', [$controller, 'createAttachment']),
+    '/intezmeny/upload/attachment' => route('POST', [$controller, 'uploadAttachment']),
     '/intezmeny/delete/class' => route('DELETE', [$controller, 'deleteClass']),
     '/intezmeny/delete/lesson' => route('DELETE', [$controller, 'deleteLesson']),
     '/intezmeny/delete/group' => route('DELETE', [$controller, 'deleteGroup']),
+    '/intezmeny/delete/group_member' => route('DELETE', [$controller, 'deleteGroupMember']),
     '/intezmeny/delete/room' => route('DELETE', [$controller, 'deleteRoom']),
     '/intezmeny/delete/teacher' => route('DELETE', [$controller, 'deleteTeacher']),
     '/intezmeny/delete/timetable_element' => route('DELETE', [$controller, 'deleteTimetableElement']),
@@ -82,15 +94,26 @@ match ($req_uri) {
     '/intezmeny/update/teacher' => route('POST', [$controller, 'updateTeacher']),
     '/intezmeny/update/timetable_element' => route('POST', [$controller, 'updateTimetableElement']),
     '/intezmeny/update/homework' => route('POST', [$controller, 'updateHomework']),
+    '/intezmeny/batch' => route('POST', [$controller, 'batch']),
     '/intezmeny/get/classes' => route('POST', [$controller, 'getClasses']),
     '/intezmeny/get/lessons' => route('POST', [$controller, 'getLessons']),
     '/intezmeny/get/groups' => route('POST', [$controller, 'getGroups']),
+    '/intezmeny/get/group_members' => route('POST', [$controller, 'getGroupMembers']),
     '/intezmeny/get/rooms' => route('POST', [$controller, 'getRooms']),
     '/intezmeny/get/teachers' => route('POST', [$controller, 'getTeachers']),
     '/intezmeny/get/timetable' => route('POST', [$controller, 'getTimetable']),
+    '/intezmeny/get/timetable_clashes' => route('POST', [$controller, 'getTimetableClashes']),
+    '/intezmeny/get/occurrences' => route('POST', [$controller, 'getOccurrences']),
+    '/intezmeny/get/calendar_feed' => route('POST', [$controller, 'getCalendarFeed']),
     '/intezmeny/get/homeworks' => route('POST', [$controller, 'getHomeworks']),
+    '/intezmeny/get/my_homeworks' => route('POST', [$controller, 'getMyHomeworks']),
+    '/intezmeny/get/my_timetable' => route('POST', [$controller, 'getMyTimetable']),
+    '/intezmeny/get/snapshot' => route('POST', [$controller, 'getSnapshot']),
     '/intezmeny/get/attachment' => route('POST', [$controller, 'getAttachment']),
+    '/calendar.ics' => route('GET', [$controller, 'getCalendar']),
+    '/stats' => route('GET', [$controller, 'getStats']),
+    '/metrics' => route('GET', [$controller, 'getMetrics']),
     default => route("GET", function () {
         header("Location: /resource/login.html", true, 308);
-    }),
+    }, Metrics::OTHER_ROUTE),
 };
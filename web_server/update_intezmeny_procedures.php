@@ -0,0 +1,38 @@
+<?php
+
+// Recreates the procedures of every existing intezmeny's schema from intezmeny_sql.php
+// Has to be run after the procedures in intezmeny_sql.php change, new intezmenys already get the current ones
+// Usage: php update_intezmeny_procedures.php
+
+declare(strict_types=1);
+
+namespace UpdateIntezmenyProcedures;
+
+chdir(__DIR__);
+
+require_once "db.php";
+require_once "models/intezmeny.php";
+
+use DB\DB;
+use Intezmeny\Intezmeny;
+
+if (PHP_SAPI !== "cli") exit(1);
+
+$db = DB::init();
+if ($db === null) {
+    fwrite(STDERR, "Could not connect to the database\n");
+    exit(1);
+}
+if ($db->selectDb('ordayna_main_db') === null) exit(1);
+$ids = $db->handleQueryResult($db->connection->query("SELECT id FROM intezmeny ORDER BY id"));
+if ($ids === null) exit(1);
+
+$failed = 0;
+foreach ($ids as $row) {
+    if (Intezmeny::updateProcedures($db, (int) $row[0]) === null) {
+        fwrite(STDERR, "Updating the procedures of intezmeny $row[0] failed\n");
+        $failed++;
+    }
+}
+echo "Updated " . (count($ids) - $failed) . " of " . count($ids) . " intezmenys\n";
+exit($failed === 0 ? 0 : 1);